@@ -1,7 +1,6 @@
 import streamlit as st
-import nest_asyncio
-nest_asyncio.apply()
 from src.config import AppConfig
+from src.vector_manager import VectorStoreManager
 
 def main():
     st.set_page_config(
@@ -10,6 +9,9 @@ def main():
         layout=AppConfig.LAYOUT
     )
 
+    # Open the most-used knowledgebases ahead of the first chat (AppConfig.KB_PREWARM_COUNT)
+    VectorStoreManager().prewarm()
+
     st.title("🧠 NIMbleRAG: Agentic RAG System")
     
     st.markdown("""
@@ -0,0 +1,91 @@
+"""
+Recall-vs-latency benchmark: HNSW and IVF-PQ FAISS indexes against the exact flat baseline.
+
+Vectors are clustered, low-rank and unit-normalized like sentence embeddings (384 dims for all-MiniLM-L6-v2).
+Recall@k is the overlap of each index's top-k with the flat index's top-k.
+
+Usage (from the repo root):
+    python -m benchmarks.ann_benchmark --vectors 200000 --queries 200
+"""
+import argparse
+import time
+import numpy as np
+import faiss
+from src.ann_index import IndexSpec, build_index, apply_search_params
+
+def make_vectors(n_vectors: int, n_queries: int, dim: int, seed: int = 0, latent_dim: int = 64):
+    # Sentence embeddings have a much lower intrinsic dimension than their width: sample clustered
+    # points in a latent space, project them to `dim` and add a little isotropic noise.
+    rng = np.random.default_rng(seed)
+    latent_dim = min(latent_dim, dim)
+    centers = rng.standard_normal((max(n_vectors // 500, 16), latent_dim)).astype(np.float32)
+    assignments = rng.integers(len(centers), size=n_vectors + n_queries)
+    latent = centers[assignments] + 0.5 * rng.standard_normal((n_vectors + n_queries, latent_dim)).astype(np.float32)
+    projection = np.linalg.qr(rng.standard_normal((dim, latent_dim)))[0].T.astype(np.float32)
+    data = latent @ projection + 0.02 * rng.standard_normal((n_vectors + n_queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:n_vectors], data[n_vectors:]
+
+def index_bytes(index: faiss.Index) -> int:
+    return len(faiss.serialize_index(index))
+
+def run_queries(index: faiss.Index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    for query in queries:
+        _, ids = index.search(query[None, :], k)
+    per_query_ms = (time.perf_counter() - start) / len(queries) * 1000
+    _, ids = index.search(queries, k)
+    return ids, per_query_ms
+
+def recall(ids: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(ids, truth)]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=48)
+    args = parser.parse_args()
+
+    vectors, queries = make_vectors(args.vectors, args.queries, args.dim)
+    print(f"Corpus: {len(vectors)} vectors x {args.dim} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<28}{'build (s)':>11}{'size (MB)':>11}{'query (ms)':>12}{'recall@k':>10}")
+
+    def report(name, build_seconds, index, ids, query_ms, truth):
+        print(f"{name:<28}{build_seconds:>11.2f}{index_bytes(index) / 2**20:>11.1f}{query_ms:>12.3f}{recall(ids, truth):>10.3f}")
+
+    start = time.perf_counter()
+    flat = build_index(IndexSpec(index_type="flat"), vectors)
+    flat_build = time.perf_counter() - start
+    truth, flat_ms = run_queries(flat, queries, args.k)
+    report("Flat (exact)", flat_build, flat, truth, flat_ms, truth)
+
+    hnsw_spec = IndexSpec(index_type="hnsw", hnsw_m=args.hnsw_m)
+    start = time.perf_counter()
+    hnsw = build_index(hnsw_spec, vectors)
+    hnsw_build = time.perf_counter() - start
+    for ef_search in (16, 32, 64, 128, 256):
+        hnsw_spec.ef_search = ef_search
+        apply_search_params(hnsw, hnsw_spec)
+        ids, query_ms = run_queries(hnsw, queries, args.k)
+        report(f"HNSW{args.hnsw_m} efSearch={ef_search}", hnsw_build, hnsw, ids, query_ms, truth)
+
+    ivf_spec = IndexSpec(index_type="ivfpq", nlist=args.nlist, pq_m=args.pq_m)
+    if len(vectors) < ivf_spec.min_training_vectors():
+        print(f"IVF-PQ skipped: needs at least {ivf_spec.min_training_vectors()} vectors to train.")
+        return
+    start = time.perf_counter()
+    ivf = build_index(ivf_spec, vectors)
+    ivf_build = time.perf_counter() - start
+    for nprobe in (1, 4, 16, 64, 128):
+        ivf_spec.nprobe = nprobe
+        apply_search_params(ivf, ivf_spec)
+        ids, query_ms = run_queries(ivf, queries, args.k)
+        report(f"IVF{args.nlist},PQ{args.pq_m} nprobe={nprobe}", ivf_build, ivf, ids, query_ms, truth)
+
+if __name__ == "__main__":
+    main()
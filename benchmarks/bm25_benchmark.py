@@ -0,0 +1,63 @@
+"""
+Micro-benchmark: vectorized BM25Index vs. the rank_bm25-backed BM25Retriever.
+
+Usage (from the repo root):
+    python -m benchmarks.bm25_benchmark --docs 20000 --queries 50
+"""
+import argparse
+import random
+import time
+from langchain_community.retrievers import BM25Retriever
+from langchain.docstore.document import Document
+from src.bm25_index import BM25Index, BM25IndexRetriever, tokenize
+
+def make_corpus(n_docs: int, vocab_size: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    # Zipf-like term distribution, ~150 tokens per chunk (about a 1000-char chunk)
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    docs = [
+        Document(page_content=" ".join(rng.choices(vocab, weights=weights, k=rng.randint(100, 200))), metadata={"id": i})
+        for i in range(n_docs)
+    ]
+    queries = [" ".join(rng.choices(vocab[:2000], k=rng.randint(2, 6))) for _ in range(200)]
+    return docs, queries
+
+def time_queries(retriever, queries):
+    start = time.perf_counter()
+    for q in queries:
+        retriever.invoke(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--vocab", type=int, default=30000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    docs, queries = make_corpus(args.docs, args.vocab)
+    queries = queries[:args.queries]
+    print(f"Corpus: {len(docs)} docs, {len(queries)} queries, k={args.k}")
+
+    start = time.perf_counter()
+    baseline = BM25Retriever.from_documents(docs, preprocess_func=tokenize, k=args.k)
+    baseline_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = BM25Index()
+    index.add_documents(docs)
+    vectorized = BM25IndexRetriever(index=index, k=args.k)
+    vectorized_build = time.perf_counter() - start
+
+    baseline_ms = time_queries(baseline, queries)
+    vectorized_ms = time_queries(vectorized, queries)
+
+    print(f"{'engine':<28}{'build (s)':>12}{'query (ms)':>14}")
+    print(f"{'BM25Retriever (rank_bm25)':<28}{baseline_build:>12.2f}{baseline_ms:>14.2f}")
+    print(f"{'BM25Index (CSR arrays)':<28}{vectorized_build:>12.2f}{vectorized_ms:>14.2f}")
+    print(f"Speed-up per query: {baseline_ms / vectorized_ms:.1f}x")
+
+if __name__ == "__main__":
+    main()
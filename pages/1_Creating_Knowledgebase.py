@@ -1,11 +1,13 @@
 import streamlit as st
-import nest_asyncio
-nest_asyncio.apply()
 import time
 from src.config import AppConfig
 from src.document_processor import DocumentProcessor
 from src.retrieval_engine import RetrievalEngine
 from src.vector_manager import VectorStoreManager
+from src.ingestion import IngestionPipeline
+from src.ann_index import IndexSpec
+from src.compaction import get_compactor
+from src.ui import render_loaded_models
 
 def main():
     st.set_page_config("Create Knowledgebase", page_icon="📂", layout="wide")
@@ -14,6 +16,7 @@ def main():
     doc_processor = DocumentProcessor()
     retrieval_engine = RetrievalEngine()
     vector_manager = VectorStoreManager()
+    pipeline = IngestionPipeline(doc_processor, retrieval_engine, vector_manager)
 
     # Sidebar
     dbs = vector_manager.list_dbs()
@@ -24,6 +27,8 @@ def main():
         else:
             st.info("No databases found.")
 
+        render_loaded_models()
+
     # Main Area
     st.subheader("🆕 Create or Update a Knowledgebase")
     
@@ -37,6 +42,20 @@ def main():
             accept_multiple_files=True,
             type=['pdf', 'docx', 'pptx', 'xlsx', 'txt']
         )
+
+        with st.expander("⚙️ Vector Index (new knowledgebases)"):
+            index_labels = {
+                "flat": "Flat (exact, best for small KBs)",
+                "hnsw": "HNSW (fast approximate search, more RAM)",
+                "ivfpq": "IVF-PQ (compressed, for millions of chunks)",
+            }
+            index_type = st.selectbox(
+                "Index type",
+                options=list(index_labels),
+                index=list(index_labels).index(AppConfig.FAISS_INDEX_TYPE),
+                format_func=index_labels.get,
+                help="Existing knowledgebases keep the index type they were created with.",
+            )
         
         if st.button("🚀 Process & Create/Update", type="primary"):
             if not db_name:
@@ -49,8 +68,15 @@ def main():
                  
                  with st.spinner(f"⏳ Processing into '{safe_name}'..."):
                      try:
-                        # 1. Process Files
-                        raw_docs = doc_processor.process_files(uploaded_files)
+                        # Streaming pipeline: extract -> chunk -> embed in batches -> append,
+                        # skipping uploads whose content hash matches the manifest
+                        progress = st.progress(0.0, text="Starting ingestion...")
+                        result = pipeline.run(
+                            safe_name,
+                            uploaded_files,
+                            progress_callback=lambda fraction, message: progress.progress(fraction, text=message),
+                            index_spec=None if safe_name in dbs else IndexSpec.from_config(index_type),
+                        )
                         
                         # Show Data Engineering Logs
                         with st.status("🛠️ Data Engineering Log", expanded=True):
@@ -62,27 +88,43 @@ def main():
                                 else:
                                     st.write(f"**[{log['step']}]** {log['file']}: {log['details']}")
                         
-                        if not raw_docs:
+                        if not result.files_processed and result.unchanged_files:
+                            st.info("All uploaded files are unchanged. Nothing to update.")
+                        elif not result.chunks_total:
                             st.warning("No valid text extracted from uploaded files.")
                         else:
-                            # 2. Chunk Documents
-                            text_chunks = doc_processor.chunk_documents(raw_docs)
-                            st.info(f"Generated {len(text_chunks)} chunks from {len(raw_docs)} extracted segments.")
-                            
-                            # 3. Get Path
-                            db_path = vector_manager.create_db_dir(safe_name)
-                            
-                            # 4. Initialize/Update Vector Store
-                            retrieval_engine.initialize_vector_store(text_chunks, save_path=db_path)
-                            
+                            st.info(
+                                f"Generated {result.chunks_total} chunks from {len(result.files_processed)} files "
+                                f"({result.chunks_added} new, {result.chunks_removed} outdated chunks removed)."
+                            )
                             st.success(f"✅ Successfully updated knowledgebase: **{safe_name}**")
                             time.sleep(1)
                             st.rerun()
                      except Exception as e:
                          st.error(f"❌ Error: {str(e)}")
 
+        st.divider()
+        st.subheader("🗑️ Remove Documents")
+        delete_db = st.selectbox("Knowledgebase", options=dbs, index=None, placeholder="Select a knowledgebase")
+        if delete_db:
+            sources = st.multiselect("Documents to remove", options=vector_manager.list_sources(delete_db))
+            if st.button("Remove selected documents", disabled=not sources):
+                with st.spinner("⏳ Removing documents..."):
+                    removed = vector_manager.delete_sources(delete_db, sources)
+                st.success(f"✅ Removed {len(sources)} documents ({removed} chunks) from **{delete_db}**.")
+                time.sleep(1)
+                st.rerun()
+            compaction = get_compactor().stats()
+            st.caption(
+                "Removed chunks are hidden immediately; the indexes are compacted in the background once "
+                f"{AppConfig.COMPACTION_TOMBSTONE_RATIO:.0%} of a knowledgebase is deleted "
+                f"({compaction['completed']} compacted since startup)."
+            )
+            if compaction["last_error"]:
+                st.warning(f"Last compaction failed: {compaction['last_error']}")
+
     with col2:
-         st.warning("⚠️ **Note**: Updating an existing database with the same name will merge new documents into it.")
+         st.warning("⚠️ **Note**: Updating an existing database with the same name will merge new documents into it. Unchanged files are skipped, changed files replace their previous version, and an interrupted upload resumes where it stopped.")
          st.markdown("""
          ### Supported Formats:
          - **PDF** (.pdf)
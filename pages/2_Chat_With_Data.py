@@ -1,17 +1,11 @@
 import streamlit as st
-import nest_asyncio
-nest_asyncio.apply()
-import time
 from src.config import AppConfig, ModelConfig
-from src.retrieval_engine import RetrievalEngine
 from src.vector_manager import VectorStoreManager
-from src.agent_graph import build_graph
-
-def stream_text(text):
-    """Yields text one character at a time for streaming effect."""
-    for char in text:
-        yield char
-        time.sleep(0.005)
+from src.agent_graph import build_graph, stream_agent
+from src.ui import render_loaded_models
+from src.answer_cache import get_answer_cache
+from src.kb_pool import get_knowledgebase_pool
+from src.nim_client import get_nim_client
 
 def initialize_chat_state():
     if "messages" not in st.session_state:
@@ -20,24 +14,34 @@ def initialize_chat_state():
         st.session_state.current_db = None
     if "agent_app" not in st.session_state:
         st.session_state.agent_app = None
+    if "answer_cache" not in st.session_state:
+        st.session_state.answer_cache = None
+    if "kb_lease" not in st.session_state:
+        st.session_state.kb_lease = None
 
-def load_agent(db_name, vector_manager, retrieval_engine):
+def load_agent(db_name, vector_manager):
     """Loads the agent for the selected DB."""
     try:
-        db_path = vector_manager.get_db_path(db_name)
-        
-        # Initialize Vector Store/Retriever components (Load existing)
-        retrieval_engine.initialize_vector_store(text_chunks=None, save_path=db_path)
+        # Shared, read-only knowledgebase (memory-mapped FAISS + BM25), loaded once per process
+        release_knowledgebase()
+        lease = vector_manager.open_knowledgebase(db_name)
+        st.session_state.kb_lease = lease
         
         # Build Hybrid Retriever
-        retriever = retrieval_engine.get_hybrid_retriever()
+        retriever = lease.engine.get_hybrid_retriever()
         
-        # Build Graph
-        return build_graph(retriever)
+        # Build Graph (cross-encoder rerank between retrieval and grading)
+        return build_graph(retriever, reranker=lease.engine.rerank_documents)
     except Exception as e:
         st.error(f"Error loading database '{db_name}': {e}")
         return None
 
+def release_knowledgebase():
+    """Releases this session's hold on its current knowledgebase version."""
+    if st.session_state.get("kb_lease") is not None:
+        st.session_state.kb_lease.release()
+        st.session_state.kb_lease = None
+
 def main():
     st.set_page_config("Chat With Data", page_icon="💬", layout="wide")
     st.title("💬 Chat With Agent")
@@ -45,7 +49,7 @@ def main():
     initialize_chat_state()
     
     vector_manager = VectorStoreManager()
-    retrieval_engine = RetrievalEngine()
+    vector_manager.prewarm()  # No-op after the first run in this process
 
     dbs = vector_manager.list_dbs()
 
@@ -66,13 +70,37 @@ def main():
             st.session_state.messages = []
             st.rerun()
 
+        render_loaded_models()
+
+        with st.expander("📦 Knowledgebase Pool"):
+            pool_metrics = get_knowledgebase_pool().metrics()
+            st.caption(
+                f"{pool_metrics['cached']} open, {pool_metrics['resident_mb']:.0f}/{pool_metrics['budget_mb']:.0f} MB, "
+                f"hit rate {pool_metrics['hit_rate']:.0%} ({pool_metrics['hits']} hits / {pool_metrics['misses']} loads), "
+                f"avg load {pool_metrics['avg_load_seconds']:.2f}s, {pool_metrics['evictions']} evicted"
+            )
+
+        with st.expander("🌐 NIM Client"):
+            nim_stats = get_nim_client().stats()
+            st.caption(
+                f"{nim_stats['requests']} requests, {nim_stats['coalesced']} coalesced, {nim_stats['retries']} retried, "
+                f"{nim_stats['throttled']} throttled, {nim_stats['failed']} failed; "
+                f"concurrency {nim_stats['in_flight']}/{nim_stats['concurrency_limit']}"
+            )
+
     # Handle DB Switch
     if selected_db:
         if selected_db != st.session_state.current_db:
             st.session_state.current_db = selected_db
             st.session_state.messages = [] # Clear history on switch
             with st.spinner(f"Loading Agent for '{selected_db}'..."):
-                 st.session_state.agent_app = load_agent(selected_db, vector_manager, retrieval_engine)
+                 st.session_state.agent_app = load_agent(selected_db, vector_manager)
+                 # Answers to (near-)repeated questions, shared by every session and invalidated whenever this KB is re-ingested
+                 st.session_state.answer_cache = get_answer_cache(vector_manager.get_db_path(selected_db))
+        elif st.session_state.kb_lease is not None and st.session_state.kb_lease.is_stale():
+            # A newer version was published by ingestion; switch to it, keeping the conversation
+            with st.spinner(f"Loading the latest version of '{selected_db}'..."):
+                 st.session_state.agent_app = load_agent(selected_db, vector_manager)
     
     # Check Agent Availability
     if not st.session_state.agent_app:
@@ -111,23 +139,23 @@ def main():
                 steps_display = st.status("🧠 Agent Thinking...", expanded=True)
                 
                 try:
-                    # Invoke Agent
+                    # Stream Agent: steps and answer tokens are rendered as they arrive
                     inputs = {"question": user_question}
-                    final_state = st.session_state.agent_app.invoke(inputs)
+                    final_state = {}
+                    for kind, payload in stream_agent(st.session_state.agent_app, inputs, answer_cache=st.session_state.answer_cache):
+                        if kind == "step":
+                            steps_display.write(f"- {payload}")
+                        elif kind == "token":
+                            full_response += payload
+                            message_placeholder.markdown(full_response + "▌")
+                        else:
+                            final_state = payload
                     
-                    answer_text = final_state.get("generation", "I couldn't generate an answer.")
+                    # The final state is authoritative (e.g. error messages or non-streamed answers)
+                    full_response = final_state.get("generation") or full_response or "I couldn't generate an answer."
                     source_docs = final_state.get("documents", [])
                     steps = final_state.get("steps", [])
-                    
-                    # Update status with steps
-                    for step in steps:
-                         steps_display.write(f"- {step}")
                     steps_display.update(label="🧠 Agent Finished Thinking", state="complete", expanded=False)
-
-                    # Stream Response
-                    for char in stream_text(answer_text):
-                        full_response += char
-                        message_placeholder.markdown(full_response + "▌")
                     
                     message_placeholder.markdown(full_response)
 
@@ -1,38 +1,71 @@
-from typing import List, Annotated, Dict, TypedDict, Any
+from typing import List, Dict, TypedDict, Any, AsyncIterator, Iterator, Tuple
 from langgraph.graph import StateGraph, END
 
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.output_parsers import StrOutputParser
 from langchain.docstore.document import Document
-from src.config import ModelConfig
-import json
+from src.config import AppConfig, ModelConfig
+from src.grading import DocumentGrader
+from src.verdict_cache import get_verdict_cache
+from src.routing import QueryRouter
+from src.model_registry import get_embeddings
+from src.context_packing import pack_context
+from src.compression import get_compressor
+from src.nim_client import ChatNIM
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by all graphs so concurrent sessions reuse threads for speculative retrieval
+_speculation_pool = ThreadPoolExecutor(max_workers=AppConfig.SPECULATIVE_WORKERS, thread_name_prefix="speculative-retrieval")
+
+GENERATE_PROMPT = PromptTemplate(
+    template="""You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. \n
+    If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise. \n
+    
+    Question: {question} \n
+    Context: {context} \n
+    
+    Answer:""",
+    input_variables=["question", "context"],
+)
 
 # --- State Definition ---
 class AgentState(TypedDict):
     question: str
     documents: List[Document]
     generation: str
+    route: str  # 'retrieve' or 'generate_no_rag'
     steps: List[str]  # Trace of agent thoughts
 
 # --- Nodes ---
 
 class AgentNodes:
-    def __init__(self, retriever):
+    def __init__(self, retriever, reranker=None, compressor=None):
         self.retriever = retriever
-        self.llm = ChatNVIDIA(
+        self.reranker = reranker
+        self.compressor = compressor
+        # Both share the process-wide NIM client (pooled connections, rate limiting, retries, coalescing)
+        self.llm = ChatNIM(
             base_url=ModelConfig.NVIDIA_BASE_URL,
-            model_name=ModelConfig.LLM_MODEL,
+            model=ModelConfig.LLM_MODEL,
             temperature=0, # Low temp for reasoning
             max_tokens=1024,
+            # Router/grader verdicts are only used whole; unstreamed calls can be coalesced
+            disable_streaming=True,
         )
-        self.gen_llm = ChatNVIDIA(
+        self.gen_llm = ChatNIM(
             base_url=ModelConfig.NVIDIA_BASE_URL,
-            model_name=ModelConfig.LLM_MODEL,
+            model=ModelConfig.LLM_MODEL,
             temperature=0.3, # Slight creep for generation
             max_tokens=1024,
         )
+        self.grader = DocumentGrader(
+            self.llm,
+            verdict_cache=get_verdict_cache() if AppConfig.GRADER_CACHE_ENABLED else None,
+        )
+        self.router = QueryRouter(get_embeddings, llm=self.llm)
 
     def retrieve(self, state: AgentState):
         """
@@ -48,6 +81,107 @@ class AgentNodes:
         steps.append(f"Retrieved {len(documents)} documents.")
         return {"documents": documents, "question": question, "steps": steps}
 
+    async def aretrieve(self, state: AgentState):
+        question = state["question"]
+        steps = state.get("steps", [])
+        steps.append("Retrieving documents from Vector DB...")
+        documents = await self.retriever.ainvoke(question)
+        steps.append(f"Retrieved {len(documents)} documents.")
+        return {"documents": documents, "question": question, "steps": steps}
+
+    def rerank(self, state: AgentState):
+        """
+        Rerank retrieved documents with the cross-encoder and keep the best ones.
+        """
+        question = state["question"]
+        documents = state["documents"]
+        steps = state.get("steps", [])
+        steps.append("Reranking documents with Cross-Encoder...")
+
+        reranked = self.reranker(question, documents)
+
+        steps.append(f"Reranking complete. Kept top {len(reranked)}/{len(documents)} documents.")
+        return {"documents": reranked, "question": question, "steps": steps}
+
+    async def arerank(self, state: AgentState):
+        question = state["question"]
+        documents = state["documents"]
+        steps = state.get("steps", [])
+        steps.append("Reranking documents with Cross-Encoder...")
+        # The cross-encoder is CPU-bound; keep it off the event loop
+        reranked = await asyncio.to_thread(self.reranker, question, documents)
+        steps.append(f"Reranking complete. Kept top {len(reranked)}/{len(documents)} documents.")
+        return {"documents": reranked, "question": question, "steps": steps}
+
+    def route_and_retrieve(self, state: AgentState):
+        """
+        Speculative mode: starts hybrid retrieval (and reranking) as soon as the question arrives,
+        concurrently with the router. The retrieved documents are discarded if the router picks chat.
+        """
+        question = state["question"]
+        steps = state.get("steps", [])
+        if not steps:
+            steps = ["Agent started."]
+        steps.append("Retrieving documents from Vector DB while routing...")
+
+        # Copy the context so callbacks/tracing of the graph run also cover the speculative branch
+        context = contextvars.copy_context()
+        future = _speculation_pool.submit(context.run, self._retrieve_and_rerank, question)
+
+        try:
+            routed = self.document_router({"question": question, "steps": steps})
+        except BaseException:
+            future.cancel()
+            raise
+        if routed["route"] != "retrieve":
+            future.cancel()  # No-op if retrieval already started; its result is simply dropped
+            steps.append("Speculative retrieval discarded.")
+            return {"route": routed["route"], "documents": [], "steps": steps}
+
+        documents, retrieve_steps = future.result()
+        steps.extend(retrieve_steps)
+        return {"route": routed["route"], "documents": documents, "question": question, "steps": steps}
+
+    async def aroute_and_retrieve(self, state: AgentState):
+        question = state["question"]
+        steps = state.get("steps", [])
+        if not steps:
+            steps = ["Agent started."]
+        steps.append("Retrieving documents from Vector DB while routing...")
+
+        retrieval = asyncio.ensure_future(self._aretrieve_and_rerank(question))
+        try:
+            routed = await self.adocument_router({"question": question, "steps": steps})
+        except BaseException:
+            retrieval.cancel()  # Also when this node itself is cancelled, so the task is never left pending
+            raise
+        if routed["route"] != "retrieve":
+            retrieval.cancel()  # A rerank already running on a worker thread finishes; its result is dropped
+            steps.append("Speculative retrieval discarded.")
+            return {"route": routed["route"], "documents": [], "steps": steps}
+
+        documents, retrieve_steps = await retrieval
+        steps.extend(retrieve_steps)
+        return {"route": routed["route"], "documents": documents, "question": question, "steps": steps}
+
+    async def _aretrieve_and_rerank(self, question: str):
+        documents = await self.retriever.ainvoke(question)
+        steps = [f"Retrieved {len(documents)} documents."]
+        if self.reranker is not None:
+            reranked = await asyncio.to_thread(self.reranker, question, documents)
+            steps.append(f"Reranking complete. Kept top {len(reranked)}/{len(documents)} documents.")
+            documents = reranked
+        return documents, steps
+
+    def _retrieve_and_rerank(self, question: str):
+        documents = self.retriever.invoke(question)
+        steps = [f"Retrieved {len(documents)} documents."]
+        if self.reranker is not None:
+            reranked = self.reranker(question, documents)
+            steps.append(f"Reranking complete. Kept top {len(reranked)}/{len(documents)} documents.")
+            documents = reranked
+        return documents, steps
+
     def grade_documents(self, state: AgentState):
         """
         Determines whether the retrieved documents are relevant to the question.
@@ -57,34 +191,58 @@ class AgentNodes:
         steps = state.get("steps", [])
         steps.append("Grading retrieved documents for relevance...")
 
-        # Grader Prompt
-        prompt = PromptTemplate(
-            template="""You are a grader assessing relevance of a retrieved document to a user question. \n 
-            Here is the retrieved document: \n\n {document} \n\n
-            Here is the user question: {question} \n
-            If the document contains keywords or semantic meaning related to the question, grade it as relevant. \n
-            Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question. \n
-            Provide the binary score as a JSON with a single key 'score' and no premable or explanation.""",
-            input_variables=["question", "document"],
-        )
-        
-        chain = prompt | self.llm | JsonOutputParser()
-        
-        filtered_docs = []
-        for d in documents:
-            try:
-                score = chain.invoke({"question": question, "document": d.page_content})
-                grade = score.get("score", "no")
-            except:
-                grade = "yes" # Fallback to keeping it if parsing fails
-            
-            if grade == "yes":
-                filtered_docs.append(d)
-        
-        steps.append(f"Grading complete. {len(filtered_docs)}/{len(documents)} documents relevant.")
-        
+        cache_stats = {}
+        filtered_docs = self.grader.filter(question, documents, stats=cache_stats)
+        self._grading_steps(steps, documents, filtered_docs, cache_stats)
+        return {"documents": filtered_docs, "question": question, "steps": steps}
+
+    async def agrade_documents(self, state: AgentState):
+        question = state["question"]
+        documents = state["documents"]
+        steps = state.get("steps", [])
+        steps.append("Grading retrieved documents for relevance...")
+        cache_stats = {}
+        filtered_docs = await self.grader.afilter(question, documents, stats=cache_stats)
+        self._grading_steps(steps, documents, filtered_docs, cache_stats)
         return {"documents": filtered_docs, "question": question, "steps": steps}
 
+    def _grading_steps(self, steps: List[str], documents: List[Document], filtered_docs: List[Document], cache_stats: Dict[str, int]):
+        steps.append(f"Grading complete. {len(filtered_docs)}/{len(documents)} documents relevant.")
+        if self.grader.verdict_cache is not None:
+            totals = self.grader.verdict_cache.stats()
+            steps.append(
+                f"Grader cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                f"(process total {totals['hits']} hits / {totals['misses']} misses, {totals['entries']} verdicts stored)."
+            )
+
+    def compress(self, state: AgentState):
+        """
+        Keep only the sentences of the graded documents most relevant to the question.
+        """
+        question = state["question"]
+        documents = state["documents"]
+        steps = state.get("steps", [])
+        steps.append(f"Compressing context ({self.compressor.method})...")
+
+        compressed = self.compressor.compress(question, documents)
+        self._compression_steps(steps, documents, compressed)
+        return {"documents": compressed, "question": question, "steps": steps}
+
+    async def acompress(self, state: AgentState):
+        question = state["question"]
+        documents = state["documents"]
+        steps = state.get("steps", [])
+        steps.append(f"Compressing context ({self.compressor.method})...")
+        compressed = await asyncio.to_thread(self.compressor.compress, question, documents)
+        self._compression_steps(steps, documents, compressed)
+        return {"documents": compressed, "question": question, "steps": steps}
+
+    @staticmethod
+    def _compression_steps(steps: List[str], documents: List[Document], compressed: List[Document]):
+        before = sum(len(d.page_content) for d in documents)
+        after = sum(len(d.page_content) for d in compressed)
+        steps.append(f"Compression complete. Kept {after}/{before} characters from {len(compressed)}/{len(documents)} documents.")
+
     def generate(self, state: AgentState):
         """
         Generate answer.
@@ -94,82 +252,112 @@ class AgentNodes:
         steps = state.get("steps", [])
         steps.append("Generating final answer...")
 
-        # Generator Prompt
-        prompt = PromptTemplate(
-            template="""You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. \n
-            If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise. \n
-            
-            Question: {question} \n
-            Context: {context} \n
-            
-            Answer:""",
-            input_variables=["question", "context"],
-        )
-        
-        # Format context
-        context = "\n\n".join([d.page_content for d in documents])
+        context = self._pack_context(documents, steps)
+        rag_chain = GENERATE_PROMPT | self.gen_llm | StrOutputParser()
         
-        rag_chain = prompt | self.gen_llm | StrOutputParser()
-        
-        try:
-            generation = rag_chain.invoke({"context": context, "question": question})
-        except Exception as e:
-            generation = f"Error during generation: {e}"
+        # Stream from the endpoint so each token reaches graph.stream(stream_mode="messages")
+        # callers as soon as it arrives, instead of after the whole answer is generated.
+        # NIM failures (after the client's retries) propagate to the caller rather than becoming the answer.
+        generation = ""
+        for token in rag_chain.stream({"context": context, "question": question}):
+            generation += token
             
         steps.append("Generation complete.")
         return {"documents": documents, "question": question, "generation": generation, "steps": steps}
 
+    async def agenerate(self, state: AgentState):
+        question = state["question"]
+        documents = state["documents"]
+        steps = state.get("steps", [])
+        steps.append("Generating final answer...")
+
+        context = self._pack_context(documents, steps)
+        rag_chain = GENERATE_PROMPT | self.gen_llm | StrOutputParser()
+        generation = ""
+        async for token in rag_chain.astream({"context": context, "question": question}):
+            generation += token
+
+        steps.append("Generation complete.")
+        return {"documents": documents, "question": question, "generation": generation, "steps": steps}
+
+    @staticmethod
+    def _pack_context(documents: List[Document], steps: List[str]) -> str:
+        # Best chunks first, overlapping neighbours merged, within the prompt's token budget
+        packed = pack_context(documents)
+        steps.append(
+            f"Packed {packed.chunks_in} chunks into {len(packed.passages)} passages "
+            f"(~{packed.tokens}/{AppConfig.CONTEXT_TOKEN_BUDGET} tokens; {packed.chunks_merged} merged, "
+            f"{packed.duplicates_dropped} duplicates and {packed.passages_dropped} over budget dropped)."
+        )
+        return packed.text
 
     def document_router(self, state: AgentState):
         """
         Route question to Retrieval or End (if chat).
+        Rules and prototype-embedding similarity decide most questions locally;
+        only ambiguous ones escalate to the LLM.
         """
-        # For this implementation, we will assume all inputs in "Chat with Data" are meant for RAG 
-        # unless explicitly just "hi".
-        # We can make this smarter later.
-        # But per requirements, let's keep it simple: Always Retrieve for now, 
-        # or implement a simple check.
-        
-        # Let's implement a simple router using the LLM for the "Agentic" requirement
         question = state["question"]
         steps = state.get("steps", [])
         if not steps:
             steps = ["Agent started."] # Initialize steps if empty
-        
-        prompt = PromptTemplate(
-            template="""You are an expert at routing a user question to a vectorstore or general chat. \n
-            Use the vectorstore for questions on specific topics or documents. \n
-            Query: {question} \n
-            Return a JSON with a single key 'datasource' and value 'vectorstore' or 'chat'.""",
-            input_variables=["question"]
-        )
-        
-        chain = prompt | self.llm | JsonOutputParser()
-        try:
-            source = chain.invoke({"question": question})
-            decision = source.get("datasource", "vectorstore")
-        except:
-            decision = "vectorstore" # Default default
-            
-        if decision == "vectorstore":
-            steps.append("Router: Routing to Vector Store.")
-            # We can't return state here effectively in conditional edge, 
-            # so we just return the decision string
-            return "retrieve"
-        else:
-            steps.append("Router: Routing to General Chat (skip retrieval).")
-            return "generate_no_rag"
+
+        decision = self.router.route(question)
+        return {"route": self._route_step(decision, steps), "steps": steps}
+
+    async def adocument_router(self, state: AgentState):
+        question = state["question"]
+        steps = state.get("steps", [])
+        if not steps:
+            steps = ["Agent started."]
+        decision = await self.router.aroute(question)
+        return {"route": self._route_step(decision, steps), "steps": steps}
+
+    @staticmethod
+    def _route_step(decision, steps: List[str]) -> str:
+        target = "Vector Store" if decision.datasource == "vectorstore" else "General Chat (skip retrieval)"
+        steps.append(f"Router: Routing to {target} via {decision.method} in {decision.latency_ms:.1f} ms.")
+        return "retrieve" if decision.datasource == "vectorstore" else "generate_no_rag"
+
+    @staticmethod
+    def route_decision(state: AgentState) -> str:
+        return state.get("route", "retrieve")
 
 # --- Graph Construction ---
 
-def build_graph(retriever):
+def _node(func, afunc) -> RunnableLambda:
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+def build_graph(retriever, reranker=None, speculative: bool = None, compressor=None):
+    """
+    Builds the agent graph. If a reranker callable (query, documents) -> documents is given,
+    a rerank stage runs between retrieval and grading.
+    If a compressor (ExtractiveCompressor; default: the shared one when AppConfig.COMPRESSION_ENABLED)
+    is given, a compression stage runs between grading and generation.
+    With speculative=True (default: AppConfig.SPECULATIVE_RETRIEVAL), retrieval and reranking run
+    concurrently with routing, taking the router off the critical path of document questions.
+    The graph runs with invoke/stream (nodes block on their calls) or ainvoke/astream (nodes await
+    them, so one event loop can serve many conversations at once).
+    """
+    if speculative is None:
+        speculative = AppConfig.SPECULATIVE_RETRIEVAL
+    if compressor is None:
+        compressor = get_compressor()
     workflow = StateGraph(AgentState)
-    nodes = AgentNodes(retriever)
+    nodes = AgentNodes(retriever, reranker=reranker, compressor=compressor)
 
-    # Define Nodes
-    workflow.add_node("retrieve", nodes.retrieve)
-    workflow.add_node("grade_documents", nodes.grade_documents)
-    workflow.add_node("generate", nodes.generate)
+    # Define Nodes (each with a sync and an async implementation, for invoke/stream and ainvoke/astream)
+    if speculative:
+        workflow.add_node("route", _node(nodes.route_and_retrieve, nodes.aroute_and_retrieve))
+    else:
+        workflow.add_node("route", _node(nodes.document_router, nodes.adocument_router))
+        workflow.add_node("retrieve", _node(nodes.retrieve, nodes.aretrieve))
+        if reranker is not None:
+            workflow.add_node("rerank", _node(nodes.rerank, nodes.arerank))
+    workflow.add_node("grade_documents", _node(nodes.grade_documents, nodes.agrade_documents))
+    if compressor is not None:
+        workflow.add_node("compress", _node(nodes.compress, nodes.acompress))
+    workflow.add_node("generate", _node(nodes.generate, nodes.agenerate))
     
     # Simple direct generation node for non-RAG
     def generate_chat(state):
@@ -180,18 +368,115 @@ def build_graph(retriever):
     workflow.add_node("generate_no_rag", generate_chat)
 
     # Define Edges
-    workflow.set_conditional_entry_point(
-        nodes.document_router,
+    workflow.set_entry_point("route")
+    workflow.add_conditional_edges(
+        "route",
+        nodes.route_decision,
         {
-            "retrieve": "retrieve",
+            # Speculative mode has already retrieved (and reranked) by the time routing is done
+            "retrieve": "grade_documents" if speculative else "retrieve",
             "generate_no_rag": "generate_no_rag"
         }
     )
     
-    workflow.add_edge("retrieve", "grade_documents")
-    workflow.add_edge("grade_documents", "generate")
+    if not speculative:
+        if reranker is not None:
+            workflow.add_edge("retrieve", "rerank")
+            workflow.add_edge("rerank", "grade_documents")
+        else:
+            workflow.add_edge("retrieve", "grade_documents")
+    if compressor is not None:
+        workflow.add_edge("grade_documents", "compress")
+        workflow.add_edge("compress", "generate")
+    else:
+        workflow.add_edge("grade_documents", "generate")
     workflow.add_edge("generate", END)
     workflow.add_edge("generate_no_rag", END)
 
     app = workflow.compile()
     return app
+
+def stream_agent(app, inputs: Dict[str, Any], answer_cache=None) -> Iterator[Tuple[str, Any]]:
+    """
+    Runs the compiled graph and yields events as they happen:
+    ("step", str) for each new agent step, ("token", str) for each generated answer token,
+    and a final ("final", state) with the merged graph state.
+    With an answer_cache (SemanticAnswerCache), a similar earlier question is answered from the
+    cache without running the graph, and fresh answers are added to it.
+    """
+    question = inputs["question"]
+    if answer_cache is not None:
+        embedding = answer_cache.embed(question)
+        cached = answer_cache.lookup(question, embedding=embedding)
+        version = answer_cache.version
+        if cached is not None:
+            yield from _cached_answer_events(question, cached)
+            return
+
+    state = dict(inputs)
+    steps_seen = [0]
+    for mode, payload in app.stream(inputs, stream_mode=["updates", "messages"]):
+        yield from _graph_events(state, mode, payload, steps_seen)
+
+    if answer_cache is not None and _is_answer(state):
+        answer_cache.put(question, state, embedding=embedding, version=version)
+    yield "final", state
+
+async def astream_agent(app, inputs: Dict[str, Any], answer_cache=None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Async `stream_agent`: the graph runs with astream, so a single event loop can serve many
+    conversations concurrently. Yields the same events.
+    """
+    question = inputs["question"]
+    if answer_cache is not None:
+        # Embedding the question and persisting the cache are blocking; keep them off the event loop
+        embedding = await asyncio.to_thread(answer_cache.embed, question)
+        cached = answer_cache.lookup(question, embedding=embedding)
+        version = answer_cache.version
+        if cached is not None:
+            for event in _cached_answer_events(question, cached):
+                yield event
+            return
+
+    state = dict(inputs)
+    steps_seen = [0]
+    async for mode, payload in app.astream(inputs, stream_mode=["updates", "messages"]):
+        for event in _graph_events(state, mode, payload, steps_seen):
+            yield event
+
+    if answer_cache is not None and _is_answer(state):
+        await asyncio.to_thread(answer_cache.put, question, state, embedding=embedding, version=version)
+    yield "final", state
+
+def _cached_answer_events(question: str, cached: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    step = f"Answer served from semantic cache (similarity {cached['similarity']:.3f})."
+    yield "step", step
+    yield "token", cached["generation"]
+    yield "final", {
+        "question": question,
+        "generation": cached["generation"],
+        "documents": cached["documents"],
+        "steps": [step] + cached["steps"],
+    }
+
+def _graph_events(state: Dict[str, Any], mode: str, payload: Any, steps_seen: List[int]) -> Iterator[Tuple[str, Any]]:
+    """Turns one graph stream item into agent events, merging updates into `state`."""
+    if mode == "messages":
+        chunk, metadata = payload
+        # Router and grader calls stream too; only the answer tokens are forwarded
+        if metadata.get("langgraph_node") == "generate" and chunk.content:
+            yield "token", chunk.content
+        return
+
+    for update in payload.values():
+        if not update:
+            continue
+        state.update(update)
+        steps = update.get("steps", [])
+        for step in steps[steps_seen[0]:]:
+            yield "step", step
+        steps_seen[0] = max(steps_seen[0], len(steps))
+
+def _is_answer(state: Dict[str, Any]) -> bool:
+    """Only answers grounded in the knowledgebase are cached; chat replies and ungrounded answers are not."""
+    return bool(state.get("generation")) and state.get("route") == "retrieve" and bool(state.get("documents"))
@@ -0,0 +1,217 @@
+import os
+import json
+import pickle
+from dataclasses import dataclass, asdict, fields
+from typing import Iterable, List, Optional
+import numpy as np
+import faiss
+from langchain_community.vectorstores import FAISS
+from src.config import AppConfig
+
+INDEX_CONFIG_FILE = "index_config.json"
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+@dataclass
+class IndexSpec:
+    """
+    FAISS index layout of one knowledgebase. All types use L2 distance, like the default LangChain FAISS store.
+    - flat: exact brute-force search.
+    - hnsw: graph index; `ef_search` trades recall for latency at query time.
+    - ivfpq: inverted lists with product-quantized vectors (`pq_m` bytes per vector at 8 bits);
+      `nprobe` lists are scanned per query. Needs training, so a KB stays flat until it holds
+      `min_training_vectors()` chunks.
+    """
+    index_type: str = "flat"
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    nlist: int = 1024
+    pq_m: int = 48
+    pq_bits: int = 8
+    nprobe: int = 16
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{self.index_type}'. Expected one of {INDEX_TYPES}.")
+
+    @classmethod
+    def from_config(cls, index_type: str = None) -> "IndexSpec":
+        """Builds a spec from the AppConfig defaults."""
+        return cls(
+            index_type=index_type or AppConfig.FAISS_INDEX_TYPE,
+            hnsw_m=AppConfig.HNSW_M,
+            ef_construction=AppConfig.HNSW_EF_CONSTRUCTION,
+            ef_search=AppConfig.HNSW_EF_SEARCH,
+            nlist=AppConfig.IVF_NLIST,
+            pq_m=AppConfig.PQ_M,
+            pq_bits=AppConfig.PQ_BITS,
+            nprobe=AppConfig.IVF_NPROBE,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndexSpec":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def min_training_vectors(self) -> int:
+        # FAISS recommends ~39 training points per centroid, for both the coarse and the PQ codebooks
+        return 39 * max(self.nlist, 2 ** self.pq_bits)
+
+def load_index_spec(db_path: str) -> Optional[IndexSpec]:
+    path = os.path.join(db_path, INDEX_CONFIG_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return IndexSpec.from_dict(json.load(f))
+
+def save_index_spec(db_path: str, spec: IndexSpec):
+    path = os.path.join(db_path, INDEX_CONFIG_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(spec.to_dict(), f, indent=2)
+    os.replace(tmp_path, path)
+
+def index_type_of(index: faiss.Index) -> str:
+    """Returns the IndexSpec type an existing FAISS index corresponds to."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+def is_ready(spec: IndexSpec, n_vectors: int) -> bool:
+    """Whether an index of the spec's type can be built over n_vectors (IVF-PQ needs enough to train)."""
+    return spec.index_type != "ivfpq" or n_vectors >= spec.min_training_vectors()
+
+def apply_search_params(index: faiss.Index, spec: IndexSpec):
+    """Sets the query-time knobs (efSearch / nprobe); they are not tied to how the index was built."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = spec.ef_search
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = spec.nprobe
+
+def matches_spec(index: faiss.Index, spec: IndexSpec) -> bool:
+    """Whether the index was built with the spec's type and build parameters (search knobs are ignored)."""
+    index_type = index_type_of(index)
+    if index_type != spec.index_type:
+        return False
+    if index_type == "hnsw":
+        return index.hnsw.nb_neighbors(1) == spec.hnsw_m  # Upper layers hold M links, layer 0 holds 2*M
+    if index_type == "ivfpq":
+        pq = faiss.downcast_index(index).pq
+        return index.nlist == spec.nlist and pq.M == _pq_subquantizers(index.d, spec.pq_m) and pq.nbits == spec.pq_bits
+    return True
+
+def build_index(spec: IndexSpec, vectors: np.ndarray, trained: Optional[faiss.Index] = None) -> faiss.Index:
+    """
+    Builds an index of the spec's type over `vectors`, training it first if needed.
+    A trained IVF-PQ index of the same type can be passed as `trained` to reuse its codebooks.
+    Falls back to flat while there are too few vectors to train IVF-PQ.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dim = vectors.shape[1]
+    if spec.index_type == "hnsw":
+        index = faiss.index_factory(dim, f"HNSW{spec.hnsw_m},Flat")
+        index.hnsw.efConstruction = spec.ef_construction
+    elif spec.index_type == "ivfpq" and trained is not None and matches_spec(trained, spec):
+        index = faiss.clone_index(trained)
+        index.reset()
+    elif spec.index_type == "ivfpq" and is_ready(spec, len(vectors)):
+        index = faiss.index_factory(dim, f"IVF{spec.nlist},PQ{_pq_subquantizers(dim, spec.pq_m)}x{spec.pq_bits}")
+        # Training cost grows with the sample; a few hundred points per centroid is plenty
+        sample_size = min(len(vectors), 256 * max(spec.nlist, 2 ** spec.pq_bits))
+        sample = vectors[np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)]
+        index.train(sample)
+    else:
+        index = faiss.IndexFlatL2(dim)
+    apply_search_params(index, spec)
+    if len(vectors):
+        index.add(vectors)
+    return index
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Returns every stored vector in position order (approximate for IVF-PQ, which keeps only codes)."""
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def rebuild_store(vector_store, spec: IndexSpec, exclude_ids: Iterable[str] = ()):
+    """
+    Rebuilds a LangChain FAISS store's index in place as `spec` describes, dropping `exclude_ids`.
+    Used to switch index types and to delete from HNSW/IVF indexes, which cannot remove vectors
+    while keeping positions aligned with `index_to_docstore_id`.
+    IVF-PQ only keeps lossy codes: compacting one copies the kept codes as they are, and switching away
+    from one re-embeds the chunks (through the embedding cache) instead of re-quantizing decoded vectors.
+    """
+    exclude = set(exclude_ids)
+    positions = sorted(vector_store.index_to_docstore_id)
+    keep = [p for p in positions if vector_store.index_to_docstore_id[p] not in exclude]
+
+    source = vector_store.index
+    if index_type_of(source) == "ivfpq" and matches_spec(source, spec):
+        vector_store.index = _ivf_subset(source, keep)
+        apply_search_params(vector_store.index, spec)
+    else:
+        trained = source if index_type_of(source) == spec.index_type else None
+        vector_store.index = build_index(spec, _kept_vectors(vector_store, keep), trained=trained)
+    kept = set(keep)
+    removed = [vector_store.index_to_docstore_id[p] for p in positions if p not in kept]
+    vector_store.index_to_docstore_id = {i: vector_store.index_to_docstore_id[p] for i, p in enumerate(keep)}
+    if removed:
+        vector_store.docstore.delete(removed)
+    return vector_store
+
+def _kept_vectors(vector_store, keep: List[int]) -> np.ndarray:
+    """Full-precision vectors at the `keep` positions: read back from exact indexes, re-embedded from IVF-PQ codes."""
+    index = vector_store.index
+    if not keep:
+        return np.empty((0, index.d), dtype=np.float32)
+    if index_type_of(index) == "ivfpq" and vector_store.embeddings is not None:
+        texts = [vector_store.docstore.search(vector_store.index_to_docstore_id[p]).page_content for p in keep]
+        return np.asarray(vector_store.embeddings.embed_documents(texts), dtype=np.float32)
+    return reconstruct_all(index)[keep]
+
+def _ivf_subset(index: faiss.Index, keep: List[int]) -> faiss.Index:
+    """An empty copy of a trained IVF index filled with the codes at the `keep` positions, renumbered 0..n-1."""
+    subset = faiss.clone_index(index)
+    subset.reset()
+    subset.make_direct_map(False)  # Entries are added to the lists directly; the map is rebuilt on demand
+    new_positions = np.full(index.ntotal, -1, dtype=np.int64)
+    new_positions[keep] = np.arange(len(keep), dtype=np.int64)
+    invlists, code_size = index.invlists, index.invlists.code_size
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if size == 0:
+            continue
+        ids = new_positions[faiss.rev_swig_ptr(invlists.get_ids(list_no), size)]
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * code_size).reshape(size, code_size)
+        kept = ids >= 0
+        if kept.any():
+            kept_ids = np.ascontiguousarray(ids[kept])
+            kept_codes = np.ascontiguousarray(codes[kept])
+            subset.invlists.add_entries(list_no, len(kept_ids), faiss.swig_ptr(kept_ids), faiss.swig_ptr(kept_codes))
+    subset.ntotal = len(keep)
+    return subset
+
+# Vectors stay in the page cache instead of the process heap; readers of the same file share them
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+def load_store_readonly(save_path: str, embeddings, index_name: str = "index"):
+    """Loads a LangChain FAISS store for querying only, with the index file memory-mapped."""
+    index = faiss.read_index(os.path.join(save_path, f"{index_name}.faiss"), MMAP_FLAGS)
+    with open(os.path.join(save_path, f"{index_name}.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    apply_search_params(index, load_index_spec(save_path) or IndexSpec.from_config())
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def _pq_subquantizers(dim: int, pq_m: int) -> int:
+    # PQ needs the dimension to split evenly; use the largest divisor of dim not above pq_m
+    for m in range(min(pq_m, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
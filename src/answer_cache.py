@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.model_registry import get_embeddings
+
+ANSWER_CACHE_FILE = "answer_cache.sqlite"
+KB_VERSION_FILE = "kb_version"
+
+def read_kb_version(db_path: str) -> str:
+    """Returns the knowledgebase version token, or '' if the KB was never versioned."""
+    try:
+        with open(os.path.join(db_path, KB_VERSION_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_kb_version(db_path: str) -> str:
+    """Marks the knowledgebase as changed: writes a new version token and drops its cached answers."""
+    version = uuid.uuid4().hex
+    path = os.path.join(db_path, KB_VERSION_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    cache_path = os.path.join(db_path, ANSWER_CACHE_FILE)
+    if os.path.exists(cache_path):
+        # Rows are deleted rather than the file, which other sessions and processes keep open
+        conn = sqlite3.connect(cache_path, timeout=30)
+        try:
+            with conn:
+                conn.execute("DELETE FROM answers WHERE version != ?", (version,))
+        except sqlite3.Error:
+            pass  # Entries of older versions are never served anyway
+        finally:
+            conn.close()
+    return version
+
+class SemanticAnswerCache:
+    """
+    Caches final agent answers per knowledgebase, matched by query-embedding cosine similarity.
+    Entries are tied to the KB version; any ingestion bumps the version and invalidates them.
+    Eviction is LRU (bounded by max_entries) plus a TTL. Answers are rows of a SQLite file next to
+    the FAISS index, so every session and process sharing the knowledgebase sees the others' answers:
+    the query vectors are held in memory and reloaded whenever another connection changed the file.
+    Lookups never write: expired rows are skipped and only deleted by `put`, and hits are recorded
+    in memory and written back in one batch by `put` or every ANSWER_CACHE_TOUCH_INTERVAL_SECONDS,
+    so a read-heavy workload does not make every other process reload its vectors.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        embeddings_provider: Callable[[], Any],
+        threshold: float = None,
+        ttl_seconds: float = None,
+        max_entries: int = None,
+    ):
+        self.db_path = db_path
+        self.path = os.path.join(db_path, ANSWER_CACHE_FILE)
+        self.embeddings_provider = embeddings_provider
+        self.threshold = AppConfig.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl_seconds = AppConfig.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = max_entries or AppConfig.ANSWER_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inode = None
+        self._data_version = None
+        self._keys: List[str] = []
+        self._vectors: Optional[np.ndarray] = None  # One normalized query embedding per key
+        self._created = np.zeros(0, dtype=np.float64)  # created_at per key
+        self._touched: Dict[str, float] = {}  # last_used of hits not yet written back
+        self._touch_flushed_at = time.time()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, question: str, embedding: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached state ({generation, documents, steps, similarity}) of the most similar
+        earlier question, or None if none clears the similarity threshold.
+        """
+        if embedding is None:
+            embedding = self.embed(question)
+        with self._lock:
+            conn = self._sync()
+            row = None
+            if conn is not None and self._keys:
+                now = time.time()
+                scores = self._vectors @ embedding
+                if self.ttl_seconds:
+                    scores = np.where(self._created >= now - self.ttl_seconds, scores, -np.inf)
+                best = int(np.argmax(scores))
+                best_score = float(scores[best])
+                if best_score >= self.threshold:
+                    row = conn.execute("SELECT payload FROM answers WHERE key = ?", (self._keys[best],)).fetchone()
+                    if row is not None:
+                        self._touched[self._keys[best]] = now
+                if now - self._touch_flushed_at >= AppConfig.ANSWER_CACHE_TOUCH_INTERVAL_SECONDS:
+                    with conn:
+                        self._flush_touches(conn, now)
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        entry = json.loads(row[0])
+        return {
+            "generation": entry["generation"],
+            "documents": [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in entry["documents"]],
+            "steps": list(entry["steps"]),
+            "similarity": best_score,
+        }
+
+    def put(self, question: str, state: Dict[str, Any], embedding: Optional[np.ndarray] = None, version: Optional[str] = None):
+        """
+        Stores a final agent state for the question as one row.
+        If `version` is given and the KB changed since then, the (possibly stale) answer is not stored.
+        """
+        if embedding is None:
+            embedding = self.embed(question)
+        payload = json.dumps({
+            "question": question,
+            "generation": state.get("generation", ""),
+            "documents": [{"page_content": d.page_content, "metadata": d.metadata} for d in state.get("documents", [])],
+            "steps": list(state.get("steps", [])),
+        }, default=lambda o: o.item() if hasattr(o, "item") else str(o))  # Metadata may hold numpy scalars (e.g. rerank scores)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            conn = self._sync()
+            if conn is None or (version is not None and version != self.version):
+                return
+            key = uuid.uuid4().hex
+            now = time.time()
+            with conn:
+                self._flush_touches(conn, now)
+                expired = self.ttl_seconds and conn.execute(
+                    "DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).rowcount
+                conn.execute(
+                    "INSERT INTO answers (key, version, payload, embedding, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, self.version, payload, vector.tobytes(), now, now),
+                )
+                count = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+                evicted = count > self.max_entries
+                if evicted:
+                    conn.execute(
+                        "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used ASC, rowid ASC LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            if evicted or expired:
+                self._load(conn)
+            else:
+                self._append(key, vector, now)
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings_provider().embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._keys), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Opens the store, reopening it if the file was replaced (knowledgebase deleted and recreated)."""
+        if not os.path.isdir(self.db_path):
+            return None
+        if self._conn is not None:
+            try:
+                stale = os.stat(self.path).st_ino != self._inode
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                self._conn.close()
+                self._conn = None
+        if self._conn is None:
+            # One connection shared across threads, serialized by the lock
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS answers ("
+                    " key TEXT PRIMARY KEY, version TEXT NOT NULL, payload TEXT NOT NULL, embedding BLOB NOT NULL,"
+                    " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+            self._inode = os.stat(self.path).st_ino
+            self._data_version = None
+        return self._conn
+
+    def _sync(self) -> Optional[sqlite3.Connection]:
+        """Reloads the query vectors if the KB version or the store changed."""
+        conn = self._connection()
+        if conn is None:
+            return None
+        version = read_kb_version(self.db_path)
+        # data_version changes whenever another connection (session or process) commits to the file
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.version or data_version != self._data_version:
+            self.version = version
+            self._data_version = data_version
+            self._load(conn)
+        return conn
+
+    def _flush_touches(self, conn: sqlite3.Connection, now: float):
+        """Writes back the recency of the hits since the last flush (inside the caller's transaction)."""
+        if self._touched:
+            conn.executemany("UPDATE answers SET last_used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched = {}
+        self._touch_flushed_at = now
+
+    def _load(self, conn: sqlite3.Connection):
+        rows = conn.execute("SELECT key, embedding, created_at FROM answers WHERE version = ? ORDER BY rowid", (self.version,)).fetchall()
+        self._keys = [key for key, _, _ in rows]
+        self._vectors = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows]) if rows else None
+        self._created = np.array([created for _, _, created in rows], dtype=np.float64)
+
+    def _append(self, key: str, vector: np.ndarray, created_at: float):
+        self._keys.append(key)
+        self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector])
+        self._created = np.append(self._created, created_at)
+
+_shared_caches: Dict[str, SemanticAnswerCache] = {}
+_shared_lock = threading.Lock()
+
+def get_answer_cache(db_path: str) -> SemanticAnswerCache:
+    """Returns the process-wide answer cache of the knowledgebase at `db_path`, shared by every session and request."""
+    key = os.path.abspath(db_path)
+    with _shared_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = SemanticAnswerCache(db_path, get_embeddings)
+            _shared_caches[key] = cache
+    return cache
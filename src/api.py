@@ -0,0 +1,236 @@
+import io
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.agent_graph import astream_agent, build_graph
+from src.answer_cache import SemanticAnswerCache, get_answer_cache
+from src.ann_index import IndexSpec
+from src.document_processor import DocumentProcessor
+from src.ingestion import IngestionPipeline
+from src.kb_pool import KnowledgebaseLease, get_knowledgebase_pool
+from src.model_registry import get_registry
+from src.nim_client import NIMError, NIMRateLimitError, get_nim_client
+from src.retrieval_engine import RetrievalEngine
+from src.snapshots import current_generation
+from src.vector_manager import VectorStoreManager
+
+_DB_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+UPLOAD_BLOCK_SIZE = 1 << 20  # Bytes copied at a time when spooling uploads to disk
+
+class QueryRequest(BaseModel):
+    question: str
+    use_cache: bool = True  # Answer near-repeated questions from the knowledgebase's semantic cache
+
+class AgentService:
+    """
+    Question answering and ingestion for the HTTP API, shared by every request in the process.
+    Knowledgebases come from the process-wide pool (one memory-mapped copy per generation) and each
+    generation's compiled graph is built once and reused until the pool drops that generation.
+    Every question holds a lease for its whole run, so a concurrent ingestion never swaps the
+    indexes under it; the next question picks up the newly published generation.
+    """
+
+    def __init__(self, vector_manager: VectorStoreManager = None):
+        self._vector_manager = vector_manager
+        self._lock = threading.Lock()
+        self._graphs = weakref.WeakKeyDictionary()  # Knowledgebase -> compiled graph
+        self._ingest_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def vector_manager(self) -> VectorStoreManager:
+        # Created on first use, so importing the module does not create AppConfig.VECTOR_DB_DIR
+        if self._vector_manager is None:
+            self._vector_manager = VectorStoreManager()
+        return self._vector_manager
+
+    def exists(self, db_name: str) -> bool:
+        return db_name in self.vector_manager.list_dbs()
+
+    async def astream(self, db_name: str, question: str, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+        """Runs the agent on the latest generation of the knowledgebase, yielding `stream_agent` events."""
+        # Opening a generation (first use) and building its graph block; the agent run itself is awaited
+        lease = await run_in_threadpool(self.vector_manager.open_knowledgebase, db_name)
+        try:
+            graph = await run_in_threadpool(self._graph, lease)
+            answer_cache = self._answer_cache(db_name) if use_cache else None
+            async for event in astream_agent(graph, {"question": question}, answer_cache=answer_cache):
+                yield event
+        finally:
+            lease.release()
+
+    async def aask(self, db_name: str, question: str, use_cache: bool = True) -> Dict[str, Any]:
+        final_state: Dict[str, Any] = {}
+        async for kind, payload in self.astream(db_name, question, use_cache=use_cache):
+            if kind == "final":
+                final_state = payload
+        return final_state
+
+    def ingest(self, db_name: str, files: List[Any], index_type: Optional[str] = None) -> Dict[str, Any]:
+        """Ingests uploads like the Knowledgebase Manager page. Ingestions into the same knowledgebase run one at a time."""
+        with self._lock:
+            ingest_lock = self._ingest_locks.setdefault(db_name, threading.Lock())
+        with ingest_lock:
+            doc_processor = DocumentProcessor()
+            pipeline = IngestionPipeline(doc_processor, RetrievalEngine(), self.vector_manager)
+            index_spec = None if self.exists(db_name) else IndexSpec.from_config(index_type or AppConfig.FAISS_INDEX_TYPE)
+            result = pipeline.run(db_name, files, index_spec=index_spec)
+        return {**asdict(result), "log": doc_processor.logger.logs}
+
+    def _graph(self, lease: KnowledgebaseLease):
+        knowledgebase = lease.knowledgebase
+        with self._lock:
+            graph = self._graphs.get(knowledgebase)
+        if graph is None:
+            # Built outside the lock; two first requests may both build, and one graph is kept
+            graph = build_graph(lease.engine.get_hybrid_retriever(), reranker=lease.engine.rerank_documents)
+            with self._lock:
+                graph = self._graphs.setdefault(knowledgebase, graph)
+        return graph
+
+    def _answer_cache(self, db_name: str) -> SemanticAnswerCache:
+        # Entries are tied to the KB version, so one cache per knowledgebase serves every generation
+        return get_answer_cache(self.vector_manager.get_db_path(db_name))
+
+def serialize_document(doc: Document) -> Dict[str, Any]:
+    return {
+        "source": doc.metadata.get("source"),
+        "page": doc.metadata.get("page", doc.metadata.get("sheet")),
+        "score": doc.metadata.get("score"),
+        "content": doc.page_content,
+    }
+
+def serialize_answer(state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "question": state.get("question"),
+        "answer": state.get("generation") or "",
+        "sources": [serialize_document(d) for d in state.get("documents", [])],
+        "steps": state.get("steps", []),
+    }
+
+async def _server_sent_events(events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """Formats agent events as SSE: `step` and `token` carry text, `answer` the final serialized answer."""
+    try:
+        async for kind, payload in events:
+            if kind == "final":
+                kind, payload = "answer", serialize_answer(payload)
+            yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+def _nim_error_response(error: NIMError) -> JSONResponse:
+    """Passes NIM back-pressure on to the caller: throttling becomes 503 + Retry-After, other failures 502."""
+    if isinstance(error, NIMRateLimitError):
+        headers = {"Retry-After": str(max(1, round(error.retry_after or AppConfig.NIM_BACKOFF_MAX_SECONDS)))}
+        return JSONResponse(status_code=503, content={"detail": str(error)}, headers=headers)
+    return JSONResponse(status_code=502, content={"detail": str(error)})
+
+def _check_name(db_name: str):
+    if not _DB_NAME.match(db_name):
+        raise HTTPException(status_code=400, detail="Knowledgebase names may only contain letters, digits, '_' and '-'.")
+
+def create_app(service: AgentService = None) -> FastAPI:
+    """
+    Builds the headless HTTP API. Questions run as async graph executions on the server's event loop,
+    so one process serves many conversations concurrently; ingestion and other blocking work run in
+    the worker thread pool.
+    """
+    service = service or AgentService()
+
+    @asynccontextmanager
+    async def lifespan(_):
+        yield
+        await get_nim_client().aclose()  # Pooled NIM connections opened on this server's event loop
+
+    api = FastAPI(title=AppConfig.APP_TITLE, lifespan=lifespan)
+    api.state.service = service
+
+    @api.exception_handler(NIMError)
+    async def nim_error(_: Request, error: NIMError):
+        return _nim_error_response(error)
+
+    def require_kb(db_name: str):
+        _check_name(db_name)
+        if not service.exists(db_name):
+            raise HTTPException(status_code=404, detail=f"Knowledgebase '{db_name}' not found.")
+
+    @api.get("/health")
+    def health():
+        return {"status": "ok", "models": get_registry().get_stats(), "knowledgebase_pool": get_knowledgebase_pool().metrics()}
+
+    @api.get("/knowledgebases")
+    def list_knowledgebases():
+        manager = service.vector_manager
+        return {
+            "knowledgebases": [
+                {"name": name, "generation": current_generation(manager.get_db_path(name))}
+                for name in manager.list_dbs()
+            ]
+        }
+
+    @api.get("/knowledgebases/{db_name}/sources")
+    def list_sources(db_name: str):
+        require_kb(db_name)
+        return {"sources": service.vector_manager.list_sources(db_name)}
+
+    @api.post("/knowledgebases/{db_name}/documents")
+    async def ingest_documents(db_name: str, files: List[UploadFile] = File(...), index_type: Optional[str] = Form(None)):
+        _check_name(db_name)
+        if index_type is not None and index_type not in ("flat", "hnsw", "ivfpq"):
+            raise HTTPException(status_code=400, detail=f"Unknown index type '{index_type}'.")
+        return await run_in_threadpool(_ingest_spooled, service, db_name, files, index_type)
+
+    @api.post("/knowledgebases/{db_name}/query")
+    async def query(db_name: str, request: QueryRequest):
+        require_kb(db_name)
+        state = await service.aask(db_name, request.question, use_cache=request.use_cache)
+        return serialize_answer(state)
+
+    @api.post("/knowledgebases/{db_name}/query/stream")
+    async def query_stream(db_name: str, request: QueryRequest):
+        require_kb(db_name)
+        events = service.astream(db_name, request.question, use_cache=request.use_cache)
+        return StreamingResponse(_server_sent_events(events), media_type="text/event-stream")
+
+    return api
+
+def _ingest_spooled(service: AgentService, db_name: str, files: List[UploadFile], index_type: Optional[str]) -> Dict[str, Any]:
+    """Copies each upload to a temporary file in blocks and ingests from those, so a batch is never held in memory."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        uploads = []
+        try:
+            for i, upload in enumerate(files):
+                path = os.path.join(tmp_dir, str(i))
+                upload.file.seek(0)
+                with open(path, "wb") as out:
+                    shutil.copyfileobj(upload.file, out, UPLOAD_BLOCK_SIZE)
+                file = io.FileIO(path)
+                file.name = os.path.basename(upload.filename or "upload")
+                file.size = os.path.getsize(path)
+                uploads.append(file)
+            return service.ingest(db_name, uploads, index_type)
+        finally:
+            for file in uploads:
+                file.close()
+
+app = create_app()
+
+def main():
+    import uvicorn
+    # One process per worker, each with its own models and knowledgebase pool; scale out behind a load balancer
+    uvicorn.run("src.api:app", host=AppConfig.API_HOST, port=AppConfig.API_PORT, workers=AppConfig.API_WORKERS)
+
+if __name__ == "__main__":
+    main()
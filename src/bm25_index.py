@@ -0,0 +1,426 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, List, Dict, Any, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.hashing import chunk_id
+
+TOKEN_PATTERN = re.compile(r"\w+")
+FORMAT_VERSION = 6
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first (argpartition, then sort only the k winners)."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Packs strings into one UTF-8 byte blob plus an offsets array (len(values) + 1 entries)."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def _id_keys(ids: List[str]) -> np.ndarray:
+    """64-bit hashes of document IDs, the sort keys of a segment's ID index."""
+    return np.array([int.from_bytes(hashlib.blake2b(i.encode("utf-8"), digest_size=8).digest(), "little") for i in ids], dtype=np.uint64)
+
+def _open_blob(path: str) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+class _PackedStrings:
+    """Read-only sequence view over a byte blob + offsets pair; items are returned as bytes."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+class BM25Segment:
+    """
+    An immutable batch of documents stored as CSR arrays (rows = terms, columns = documents).
+    On disk every array is a flat `.npy`/`.bin` file opened with mmap, so opening a segment is O(1) and
+    its pages are shared between processes; a query only touches the postings of its own terms.
+    The vocabulary is a sorted UTF-8 blob searched with bisection, so row i is the i-th term in byte order.
+    Document IDs are indexed the same way (sorted ID hashes plus the positions they belong to), so finding
+    a batch of IDs costs a bisection per ID instead of decoding every ID of the segment.
+    """
+
+    ARRAYS = ("indptr", "indices", "data", "doc_lens", "vocab_offsets", "text_offsets", "metadata_offsets", "id_offsets", "id_keys", "id_order")
+    BLOBS = ("vocab", "texts", "metadata", "ids")
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.data = arrays["data"]
+        self.doc_lens = arrays["doc_lens"]
+        self.vocab = _PackedStrings(arrays["vocab"], arrays["vocab_offsets"])
+        self.texts = _PackedStrings(arrays["texts"], arrays["text_offsets"])
+        self.metadata = _PackedStrings(arrays["metadata"], arrays["metadata_offsets"])
+        self.ids = _PackedStrings(arrays["ids"], arrays["id_offsets"])
+        self.id_keys = arrays["id_keys"]
+        self.id_order = arrays["id_order"]
+        self._arrays = arrays
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    @classmethod
+    def from_documents(cls, docs: List[Document], ids: List[str]) -> "BM25Segment":
+        term_counts = [Counter(tokenize(doc.page_content)) for doc in docs]
+        terms = sorted({t for counts in term_counts for t in counts}, key=lambda t: t.encode("utf-8"))
+        rows_by_term = {t: i for i, t in enumerate(terms)}
+
+        rows, cols, counts = [], [], []
+        for doc_id, doc_counts in enumerate(term_counts):
+            for term, tf in doc_counts.items():
+                rows.append(rows_by_term[term])
+                cols.append(doc_id)
+                counts.append(tf)
+        tf_matrix = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(terms), len(docs)),
+        )
+        tf_matrix.sort_indices()
+
+        vocab, vocab_offsets = _pack_strings(terms)
+        texts, text_offsets = _pack_strings([d.page_content for d in docs])
+        metadata, metadata_offsets = _pack_strings([json.dumps(d.metadata) for d in docs])
+        id_blob, id_offsets = _pack_strings(ids)
+        keys = _id_keys(ids)
+        order = np.argsort(keys, kind="stable")
+        return cls({
+            "indptr": tf_matrix.indptr.astype(np.int64),
+            "indices": tf_matrix.indices.astype(np.int32),
+            "data": tf_matrix.data.astype(np.float32),
+            "doc_lens": np.array([sum(c.values()) for c in term_counts], dtype=np.int32),
+            "vocab": vocab, "vocab_offsets": vocab_offsets,
+            "texts": texts, "text_offsets": text_offsets,
+            "metadata": metadata, "metadata_offsets": metadata_offsets,
+            "ids": id_blob, "id_offsets": id_offsets,
+            "id_keys": keys[order], "id_order": order.astype(np.int64),
+        })
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), self._arrays[name])
+        for name in self.BLOBS:
+            with open(os.path.join(path, f"{name}.bin"), "wb") as f:
+                f.write(self._arrays[name].tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Segment":
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS}
+        arrays.update({name: _open_blob(os.path.join(path, f"{name}.bin")) for name in cls.BLOBS})
+        return cls(arrays)
+
+    def row(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        i = bisect_left(self.vocab, key)
+        return i if i < len(self.vocab) and self.vocab[i] == key else None
+
+    def doc_freq(self, term: str) -> int:
+        row = self.row(term)
+        return 0 if row is None else int(self.indptr[row + 1] - self.indptr[row])
+
+    def postings(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return np.asarray(self.indices[start:end]), np.asarray(self.data[start:end])
+
+    def locate(self, ids: List[str]) -> List[Tuple[str, int]]:
+        """(ID, position) of every document whose ID is in `ids`, found through the sorted ID hashes."""
+        keys = _id_keys(ids)
+        starts = np.searchsorted(self.id_keys, keys, side="left")
+        ends = np.searchsorted(self.id_keys, keys, side="right")
+        found = []
+        for doc_id, start, end in zip(ids, starts, ends):
+            encoded = doc_id.encode("utf-8")
+            for j in range(start, end):  # More than one only on a hash collision
+                position = int(self.id_order[j])
+                if self.ids[position] == encoded:
+                    found.append((doc_id, position))
+        return found
+
+    def positions_of(self, ids: Iterable[str]) -> List[int]:
+        """Positions of the documents whose IDs are in `ids`."""
+        return [position for _, position in self.locate(list(ids))]
+
+    def document(self, doc_id: int) -> Document:
+        return Document(
+            page_content=self.texts[doc_id].decode("utf-8"),
+            metadata=json.loads(self.metadata[doc_id]),
+        )
+
+def _contains(sorted_values: np.ndarray, value: int) -> bool:
+    i = np.searchsorted(sorted_values, value)
+    return i < len(sorted_values) and sorted_values[i] == value
+
+class BM25Index:
+    """
+    Append-only BM25 (Okapi) keyword index.
+    Each `add_documents` call writes one new segment, so updates cost time proportional to the batch;
+    corpus-wide statistics (document count, total length) live in meta.json and document frequencies
+    are summed across segments per query term.
+    Scoring is vectorized over the postings of the query terms, and top-k comes from `argpartition`.
+    Deleted documents are tombstoned per segment and skipped at query time. Once there are more than
+    AppConfig.BM25_MAX_SEGMENTS segments, the smallest ones are merged (dropping tombstoned documents).
+    """
+
+    META_FILE = "meta.json"
+    TOMBSTONE_FILE = "tombstones.json"
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.segments: List[BM25Segment] = []
+        self.segment_dirs: List[str] = []
+        self.next_segment = 0
+        self.n_docs = 0
+        self.total_len = 0
+        self.tombstones: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """True if a BM25 index in the current on-disk format is stored at path."""
+        meta_path = os.path.join(path, BM25Index.META_FILE)
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("version") == FORMAT_VERSION
+
+    @staticmethod
+    def clear(path: str):
+        """Removes any index stored at path (e.g. one in an older format) before a rebuild."""
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+    def __len__(self) -> int:
+        """Number of live (not deleted) documents."""
+        return self.n_docs - sum(len(dead) for dead in self.tombstones.values())
+
+    def add_documents(self, docs: List[Document], ids: Optional[List[str]] = None):
+        """
+        Indexes a new batch of documents and persists it as a new segment.
+        IDs default to each document's chunk_id and are what `delete` matches against.
+        """
+        if not docs:
+            return
+        self._append_segment(docs, ids or [chunk_id(d) for d in docs])
+        self._persist()
+        self.maybe_merge()
+
+    def _append_segment(self, docs: List[Document], ids: List[str]):
+        segment = BM25Segment.from_documents(docs, ids)
+        dir_name = f"segment_{self.next_segment:05d}"
+        self.next_segment += 1
+
+        if self.path:
+            segment_path = os.path.join(self.path, dir_name)
+            segment.save(segment_path)
+            # Serve the persisted copy, so the in-memory arrays can be released
+            segment = BM25Segment.load(segment_path)
+
+        self.segments.append(segment)
+        self.segment_dirs.append(dir_name)
+        self.n_docs += len(segment)
+        self.total_len += int(segment.doc_lens.sum())
+
+    def live_ids_among(self, ids: Iterable[str]) -> set:
+        """The IDs among `ids` that belong to live documents; costs a bisection per ID and segment, not a scan."""
+        ids = list(set(ids))
+        found = set()
+        if not ids:
+            return found
+        for name, segment in zip(self.segment_dirs, self.segments):
+            dead = self.tombstones.get(name)
+            for doc_id, position in segment.locate(ids):
+                if dead is None or not _contains(dead, position):
+                    found.add(doc_id)
+        return found
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstones the documents with the given IDs. Returns how many were deleted."""
+        targets = set(ids)
+        if not targets:
+            return 0
+        deleted = 0
+        for name, segment in zip(self.segment_dirs, self.segments):
+            positions = segment.positions_of(targets)
+            if not positions:
+                continue
+            previous = self.tombstones.get(name, np.zeros(0, dtype=np.int64))
+            dead = np.union1d(previous, positions).astype(np.int64)
+            deleted += len(dead) - len(previous)
+            self.tombstones[name] = dead
+        if deleted:
+            self._persist()
+        return deleted
+
+    def maybe_merge(self):
+        """Merges the smallest segments while there are more than AppConfig.BM25_MAX_SEGMENTS."""
+        while len(self.segments) > AppConfig.BM25_MAX_SEGMENTS:
+            by_size = sorted(self.segment_dirs, key=lambda name: len(self.segments[self.segment_dirs.index(name)]))
+            self.merge_segments(by_size[:max(2, AppConfig.BM25_MERGE_FACTOR)])
+
+    def merge_segments(self, names: List[str]):
+        """Rewrites the named segments as one segment holding only their live documents."""
+        docs, ids = [], []
+        for name in names:
+            segment = self.segments[self.segment_dirs.index(name)]
+            dead = set(self.tombstones.get(name, np.zeros(0, dtype=np.int64)).tolist())
+            for i in range(len(segment)):
+                if i not in dead:
+                    docs.append(segment.document(i))
+                    ids.append(segment.ids[i].decode("utf-8"))
+
+        for name in names:
+            pos = self.segment_dirs.index(name)
+            segment = self.segments.pop(pos)
+            self.segment_dirs.pop(pos)
+            self.n_docs -= len(segment)
+            self.total_len -= int(segment.doc_lens.sum())
+            self.tombstones.pop(name, None)
+
+        if docs:
+            self._append_segment(docs, ids)
+        self._persist()
+
+        # Safe once meta.json no longer lists them; open mmaps keep working on POSIX
+        if self.path:
+            for name in names:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def save(self):
+        """Writes the index metadata; segments are written as they are added."""
+        self._persist()
+
+    def compact(self):
+        """Rewrites every segment holding deleted documents, so their postings and text are dropped."""
+        names = [name for name in self.segment_dirs if len(self.tombstones.get(name, ()))]
+        if names:
+            self.merge_segments(names)
+
+    def _persist(self):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        meta = {
+            "version": FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "segments": self.segment_dirs,
+            "next_segment": self.next_segment,
+            "n_docs": self.n_docs,
+            "total_len": self.total_len,
+        }
+        # Segments are written before the meta file points at them, so a crash never exposes a partial segment.
+        # Tombstones of segments no longer in meta are ignored on load.
+        self._write_json(self.META_FILE, meta)
+        self._write_json(self.TOMBSTONE_FILE, {name: dead.tolist() for name, dead in self.tombstones.items()})
+
+    def _write_json(self, file_name: str, payload: Dict[str, Any]):
+        tmp_path = os.path.join(self.path, file_name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, os.path.join(self.path, file_name))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Opens a persisted index; segment files are memory-mapped, not read."""
+        with open(os.path.join(path, cls.META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(path, k1=meta["k1"], b=meta["b"])
+        index.segments = [BM25Segment.load(os.path.join(path, d)) for d in meta["segments"]]
+        index.segment_dirs = list(meta["segments"])
+        index.next_segment = meta["next_segment"]
+        index.n_docs = meta["n_docs"]
+        index.total_len = meta["total_len"]
+        tombstone_path = os.path.join(path, cls.TOMBSTONE_FILE)
+        if os.path.exists(tombstone_path):
+            with open(tombstone_path, "r", encoding="utf-8") as f:
+                index.tombstones = {
+                    name: np.asarray(dead, dtype=np.int64)
+                    for name, dead in json.load(f).items() if name in index.segment_dirs
+                }
+        return index
+
+    def doc_freq(self, term: str) -> int:
+        return sum(segment.doc_freq(term) for segment in self.segments)
+
+    def search(self, query: str, k: int = 10) -> List[Document]:
+        """Returns the top-k documents for the query, best first."""
+        if not self.n_docs or k <= 0:
+            return []
+        avgdl = self.total_len / self.n_docs
+        terms = list(dict.fromkeys(tokenize(query)))
+        seg_rows = [[segment.row(t) for t in terms] for segment in self.segments]
+
+        doc_freqs = np.zeros(len(terms), dtype=np.float64)
+        for segment, rows in zip(self.segments, seg_rows):
+            for j, row in enumerate(rows):
+                if row is not None:
+                    doc_freqs[j] += segment.indptr[row + 1] - segment.indptr[row]
+        idf = np.log1p((self.n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+        candidate_scores, candidate_refs = [], []
+        for seg_id, (name, segment, rows) in enumerate(zip(self.segment_dirs, self.segments, seg_rows)):
+            doc_parts, weight_parts = [], []
+            for term_idf, row in zip(idf, rows):
+                if row is None:
+                    continue
+                doc_ids, tf = segment.postings(row)
+                norm = self.k1 * (1 - self.b + self.b * segment.doc_lens[doc_ids] / avgdl)
+                doc_parts.append(doc_ids)
+                weight_parts.append(term_idf * tf * (self.k1 + 1) / (tf + norm))
+            if not doc_parts:
+                continue
+
+            # Sum contributions per document over the touched postings only
+            matched, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(weight_parts))
+            if name in self.tombstones:
+                live = ~np.isin(matched, self.tombstones[name])
+                matched, scores = matched[live], scores[live]
+                if not len(matched):
+                    continue
+            top = top_k_indices(scores, k)
+            candidate_scores.append(scores[top])
+            candidate_refs.extend((seg_id, int(doc_id)) for doc_id in matched[top])
+
+        if not candidate_refs:
+            return []
+        all_scores = np.concatenate(candidate_scores)
+        return [self.segments[candidate_refs[i][0]].document(candidate_refs[i][1]) for i in top_k_indices(all_scores, k)]
+
+class BM25IndexRetriever(BaseRetriever):
+    """LangChain retriever over a BM25Index, usable inside an EnsembleRetriever."""
+
+    index: Any
+    k: int = 10
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.index.search(query, k=self.k)
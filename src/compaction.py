@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from src.config import AppConfig
+from src.retrieval_engine import RetrievalEngine
+from src.snapshots import StaleGenerationError
+
+class Compactor:
+    """
+    Rewrites knowledgebases whose share of deleted (tombstoned) chunks reaches AppConfig.COMPACTION_TOMBSTONE_RATIO.
+    Compactions run one at a time on a background thread and publish a new generation like any other write,
+    so readers are never blocked. If the knowledgebase is updated meanwhile, the compaction is abandoned
+    and runs again the next time one is scheduled.
+    """
+
+    def __init__(self, threshold: float = None):
+        self.threshold = AppConfig.COMPACTION_TOMBSTONE_RATIO if threshold is None else threshold
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-compaction")
+        self._lock = threading.Lock()
+        self._scheduled = set()
+        self.completed = 0
+        self.conflicts = 0
+        self.last_error: Optional[str] = None
+
+    def maybe_schedule(self, db_path: str, engine: RetrievalEngine) -> Optional[Future]:
+        """Schedules a compaction if the knowledgebase `engine` has just written is over the threshold."""
+        if engine.tombstone_ratio() < self.threshold:
+            return None
+        return self.schedule(db_path)
+
+    def schedule(self, db_path: str) -> Optional[Future]:
+        """Queues a background compaction, unless one is already queued for this knowledgebase."""
+        path = os.path.abspath(db_path)
+        with self._lock:
+            if path in self._scheduled:
+                return None
+            self._scheduled.add(path)
+        return self._executor.submit(self._run, path)
+
+    def _run(self, path: str) -> bool:
+        try:
+            return self.compact(path)
+        except Exception as e:
+            self.last_error = f"{os.path.basename(path)}: {e}"
+            return False
+        finally:
+            with self._lock:
+                self._scheduled.discard(path)
+
+    def compact(self, db_path: str, force: bool = False) -> bool:
+        """
+        Compacts the knowledgebase now if it is over the threshold (or `force`).
+        Returns whether a compacted generation was published.
+        """
+        engine = RetrievalEngine()
+        engine.open_store(db_path)
+        try:
+            base = engine.generation
+            if base is None or (not force and engine.tombstone_ratio() < self.threshold):
+                return False
+            engine.compact()
+            engine.flush(db_path, expected_generation=base)
+        except StaleGenerationError:
+            with self._lock:
+                self.conflicts += 1
+            return False
+        finally:
+            engine.close()
+        with self._lock:
+            self.completed += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "scheduled": len(self._scheduled),
+                "completed": self.completed,
+                "conflicts": self.conflicts,
+                "last_error": self.last_error,
+            }
+
+_compactor = Compactor()
+
+def get_compactor() -> Compactor:
+    """Returns the process-wide background compactor."""
+    return _compactor
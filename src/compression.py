@@ -0,0 +1,115 @@
+import re
+from typing import List, Optional
+import numpy as np
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.cache import LRUCache
+from src.embedding_service import EmbeddingService
+from src.model_registry import get_embeddings, get_reranker
+
+# Sentence ends: terminal punctuation followed by whitespace, or a line break (lists, table rows, headings)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+
+def split_sentences(text: str, min_chars: int = None) -> List[str]:
+    """Splits text into sentences, gluing fragments shorter than min_chars onto the previous sentence."""
+    min_chars = min_chars if min_chars is not None else AppConfig.COMPRESSION_MIN_SENTENCE_CHARS
+    sentences: List[str] = []
+    for part in _SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and len(part) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+class ExtractiveCompressor:
+    """
+    Shrinks graded chunks to the sentences most relevant to the question before generation.
+    All sentences of all chunks are scored in one batch, either by cosine similarity of their embeddings
+    to the question's ('embeddings', the shared embedding model; sentence vectors are kept in a bounded
+    in-memory LRU, not the on-disk embedding cache, which would grow with every query) or by the
+    cross-encoder ('cross_encoder', slower, more precise).
+    The top_n sentences are kept in their original order, in a copy of their chunk so source/page
+    citations and the rerank score are preserved; chunks left without sentences are dropped.
+    """
+
+    def __init__(self, method: str = None, top_n: int = None, embeddings=None, reranker=None):
+        self.method = method or AppConfig.COMPRESSION_METHOD
+        if self.method not in ("embeddings", "cross_encoder"):
+            raise ValueError(f"Unknown compression method '{self.method}'.")
+        self.top_n = top_n or AppConfig.COMPRESSION_TOP_SENTENCES
+        self._embeddings = embeddings
+        self._reranker = reranker
+        self._sentence_vectors = LRUCache(AppConfig.COMPRESSION_CACHE_SIZE)
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            shared = get_embeddings()
+            # The loaded model without the persistent cache (a handful of sentences is encoded in-process)
+            self._embeddings = EmbeddingService(shared.model_name, workers=1, model=shared.model)
+        return self._embeddings
+
+    @property
+    def reranker(self):
+        return self._reranker or get_reranker()
+
+    def compress(self, question: str, documents: List[Document]) -> List[Document]:
+        sentences: List[str] = []
+        owners: List[int] = []  # Index of the document each sentence came from
+        seen = set()
+        for i, doc in enumerate(documents):
+            page = (doc.metadata.get("source"), doc.metadata.get("page", doc.metadata.get("sheet")))
+            for sentence in split_sentences(doc.page_content):
+                # Overlapping chunks of the same page repeat sentences; score each once
+                if (page, sentence) in seen:
+                    continue
+                seen.add((page, sentence))
+                sentences.append(sentence)
+                owners.append(i)
+        if len(sentences) <= self.top_n:
+            return documents
+
+        scores = self.score(question, sentences)
+        keep = set(np.argsort(-scores, kind="stable")[:self.top_n].tolist())
+
+        compressed = []
+        for i, doc in enumerate(documents):
+            kept = [sentences[j] for j in range(len(sentences)) if owners[j] == i and j in keep]
+            if kept:
+                compressed.append(Document(page_content=" ".join(kept), metadata=dict(doc.metadata)))
+        return compressed
+
+    def score(self, question: str, sentences: List[str]) -> np.ndarray:
+        """Relevance of each sentence to the question (higher is better), computed in one batch."""
+        if self.method == "cross_encoder":
+            pairs = [[question, s] for s in sentences]
+            return np.asarray(self.reranker.predict(pairs, batch_size=AppConfig.RERANK_BATCH_SIZE), dtype=np.float32)
+
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        matrix = self._embed_sentences(sentences)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        return matrix @ query / np.where(norms == 0, 1.0, norms)
+
+    def _embed_sentences(self, sentences: List[str]) -> np.ndarray:
+        vectors = [self._sentence_vectors.get(s) for s in sentences]
+        missing = list(dict.fromkeys(s for s, v in zip(sentences, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, np.asarray(self.embeddings.embed_documents(missing), dtype=np.float32)))
+            for sentence, vector in fresh.items():
+                self._sentence_vectors.put(sentence, vector)
+            vectors = [fresh[s] if v is None else v for s, v in zip(sentences, vectors)]
+        return np.vstack(vectors)
+
+_compressor: Optional[ExtractiveCompressor] = None
+
+def get_compressor() -> Optional[ExtractiveCompressor]:
+    """Returns the shared compressor, or None when compression is disabled."""
+    global _compressor
+    if not AppConfig.COMPRESSION_ENABLED:
+        return None
+    if _compressor is None:
+        _compressor = ExtractiveCompressor()
+    return _compressor
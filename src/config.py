@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from dataclasses import dataclass
+from typing import Optional
 
 load_dotenv()
 
@@ -13,6 +14,68 @@ class AppConfig:
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 100
     VECTOR_DB_DIR: str = "vector_dbs"
+    FAISS_INDEX_TYPE: str = "flat"  # Default for new knowledgebases: 'flat', 'hnsw' or 'ivfpq'
+    HNSW_M: int = 32  # Graph links per vector
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64  # Candidates explored per query (recall vs. latency)
+    IVF_NLIST: int = 1024  # Inverted lists; IVF-PQ is trained once a KB holds ~39x this many chunks
+    IVF_NPROBE: int = 16  # Lists scanned per query (recall vs. latency)
+    PQ_M: int = 48  # Bytes per vector (at 8 bits); 384-dim float32 vectors take 1536 bytes in a flat index
+    PQ_BITS: int = 8
+    KB_POOL_MEMORY_MB: float = 2048  # Budget for knowledgebases kept open across sessions (LRU-evicted)
+    KB_PREWARM_COUNT: int = 0  # Most-used knowledgebases opened at startup (0 = off)
+    EXTRACTION_WORKERS: int = min(4, os.cpu_count() or 1)  # Extraction processes (1 = serial, in-process)
+    PDF_PAGES_PER_TASK: int = 50  # Larger PDFs are split into page ranges across workers
+    EXTRACTION_POOL_MIN_BYTES: int = 8 * 1024 * 1024  # Smaller uploads are extracted in-process (split PDFs still fan out)
+    EMBED_BATCH_SIZE: int = 256  # Chunks embedded and appended to the index at a time
+    EMBED_ENCODE_BATCH_SIZE: int = 64  # Texts per model forward pass
+    EMBED_WORKERS: int = min(4, os.cpu_count() or 1)  # Encoding processes for large batches (1 = in-process)
+    EMBED_CACHE_ENABLED: bool = True  # Reuse vectors of chunk text embedded before (re-ingestion, rebuilds)
+    EMBED_CACHE_PATH: str = os.path.join("cache", "embeddings.sqlite")
+    EMBED_CACHE_MAX_ENTRIES: int = 2000000  # ~1.5 KB each for 384-dim vectors
+    INGEST_CHECKPOINT_CHUNKS: int = 5000  # Persist indexes + manifest after this many chunks
+    SPECULATIVE_RETRIEVAL: bool = True  # Retrieve + rerank concurrently with routing
+    SPECULATIVE_WORKERS: int = 8  # Threads shared by all sessions for speculative retrieval
+    ROUTER_MARGIN: float = 0.05  # Min prototype-similarity margin to route without the LLM
+    GRADER_MAX_CONCURRENCY: int = 8  # Parallel grading calls in flight
+    GRADER_BATCH_SIZE: int = 1  # Chunks per grading prompt (1 = one prompt per chunk)
+    GRADER_CACHE_ENABLED: bool = True  # Reuse verdicts for (question, chunk) pairs graded before
+    GRADER_CACHE_PATH: str = os.path.join("cache", "grader_verdicts.sqlite")
+    GRADER_CACHE_MAX_ENTRIES: int = 200000
+    BM25_MAX_SEGMENTS: int = 16  # Above this, the smallest BM25 segments are merged
+    BM25_MERGE_FACTOR: int = 8  # Segments merged at a time
+    COMPACTION_TOMBSTONE_RATIO: float = 0.2  # Rewrite a knowledgebase's indexes once this share of its chunks is deleted
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # Min cosine similarity to reuse a cached answer
+    ANSWER_CACHE_TTL_SECONDS: float = 24 * 3600  # 0 = never expire
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000  # Per knowledgebase, least recently used evicted first
+    ANSWER_CACHE_TOUCH_INTERVAL_SECONDS: float = 60  # Hit recency (for LRU) is written back at most this often, and on every put
+    NIM_MAX_CONNECTIONS: int = 100  # Pooled HTTP connections to the NIM endpoint, shared by all conversations
+    NIM_MAX_KEEPALIVE: int = 20  # Idle connections kept open for reuse
+    NIM_KEEPALIVE_SECONDS: float = 30.0
+    NIM_TIMEOUT_SECONDS: float = 60.0
+    NIM_RATE_LIMIT_PER_SECOND: float = 20.0  # Token bucket for NIM requests per process (0 = unlimited)
+    NIM_RATE_LIMIT_BURST: int = 40
+    NIM_MAX_RETRIES: int = 4  # For throttled (429/503), 5xx and connection failures
+    NIM_BACKOFF_BASE_SECONDS: float = 0.5  # Exponential backoff with full jitter
+    NIM_BACKOFF_MAX_SECONDS: float = 20.0
+    NIM_CONCURRENCY_INITIAL: int = 16  # Adaptive cap on NIM requests in flight (AIMD on latency and 429s)
+    NIM_CONCURRENCY_MIN: int = 1
+    NIM_CONCURRENCY_MAX: int = 64
+    NIM_LATENCY_TOLERANCE: float = 3.0  # Shrink the cap when a response takes this multiple of the best latency
+    API_HOST: str = "0.0.0.0"  # Headless HTTP API (python -m src.api)
+    API_PORT: int = 8000
+    API_WORKERS: int = 1  # Server processes, each with its own models and knowledgebase pool
+    RERANK_TOP_K: int = 5
+    RERANK_SCORE_THRESHOLD: Optional[float] = None  # Drop chunks scoring below this (cross-encoder logits)
+    RERANK_BATCH_SIZE: int = 32
+    RERANK_CACHE_SIZE: int = 10000  # (query, chunk_id) scores kept in memory
+    CONTEXT_TOKEN_BUDGET: int = 2000  # Max retrieved-context tokens in the generation prompt
+    COMPRESSION_ENABLED: bool = False  # Keep only the sentences of graded chunks most relevant to the question
+    COMPRESSION_METHOD: str = "embeddings"  # Sentence scoring: 'embeddings' (cosine) or 'cross_encoder'
+    COMPRESSION_TOP_SENTENCES: int = 12  # Sentences kept across all chunks
+    COMPRESSION_MIN_SENTENCE_CHARS: int = 20  # Shorter fragments are joined to the previous sentence
+    COMPRESSION_CACHE_SIZE: int = 20000  # Sentence vectors kept in memory (never written to the embedding cache)
+    CONTEXT_CHARS_PER_TOKEN: float = 4.0  # Token estimate (the hosted model's tokenizer is not available locally)
 
 @dataclass
 class ModelConfig:
@@ -0,0 +1,123 @@
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.hashing import chunk_id
+
+MIN_OVERLAP_CHARS = 16  # Shorter shared prefixes/suffixes are coincidences, not splitter overlap
+
+@dataclass
+class PackedContext:
+    """Context for the generator prompt: merged passages in priority order, within the token budget."""
+    text: str = ""
+    passages: List[Document] = field(default_factory=list)
+    tokens: int = 0
+    chunks_in: int = 0
+    chunks_merged: int = 0  # Chunks folded into an adjacent one (same source/page)
+    duplicates_dropped: int = 0  # Repeated chunks, or chunks whose text another passage already holds
+    passages_dropped: int = 0  # Passages that did not fit the budget
+
+def estimate_tokens(text: str, chars_per_token: float = None) -> int:
+    """Approximate token count; the hosted model's tokenizer is not available locally."""
+    return math.ceil(len(text) / (chars_per_token or AppConfig.CONTEXT_CHARS_PER_TOKEN))
+
+def overlap_length(first: str, second: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `first` that starts `second` (the text splitter's chunk overlap)."""
+    for size in range(min(len(first), len(second), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+def pack_context(documents: List[Document], token_budget: int = None, chunk_overlap: int = None) -> PackedContext:
+    """
+    Packs documents into a context string of at most `token_budget` (estimated) tokens.
+    - Documents are taken best first: by rerank `score` when present, else in the order given.
+    - Chunks from the same source and page that overlap (consecutive splitter output) are merged into one
+      passage, stitching out the repeated CHUNK_OVERLAP text; chunks whose text another passage already
+      contains are dropped.
+    - Passages are added in priority order while they fit; one that does not fit is skipped in favour of
+      smaller, lower-ranked ones. If even the best passage is too long, it is truncated to the budget.
+    """
+    token_budget = token_budget or AppConfig.CONTEXT_TOKEN_BUDGET
+    # The splitter's overlap can be slightly longer than configured once separators are re-joined
+    max_overlap = 2 * (chunk_overlap if chunk_overlap is not None else AppConfig.CHUNK_OVERLAP)
+    packed = PackedContext(chunks_in=len(documents))
+
+    seen = set()
+    ranked = []
+    for rank, doc in enumerate(documents):
+        cid = chunk_id(doc)
+        if cid in seen:
+            packed.duplicates_dropped += 1
+            continue
+        seen.add(cid)
+        ranked.append((-doc.metadata.get("score", 0.0), rank, doc))
+    ranked.sort(key=lambda item: (item[0], item[1]))
+
+    # Passages keep the priority of their best chunk
+    passages: List[Document] = []
+    for _, _, doc in ranked:
+        key = _page_key(doc)
+        text = doc.page_content.strip()
+        for i, passage in enumerate(passages):
+            if _page_key(passage) != key:
+                continue
+            if text in passage.page_content:
+                packed.duplicates_dropped += 1
+                break
+            merged = _merge(passage.page_content, text, max_overlap)
+            if merged is not None:
+                packed.chunks_merged += 1
+                # The chunk may also bridge to a lower-ranked passage (e.g. chunks 1 and 3, then 2)
+                for j in range(len(passages) - 1, i, -1):
+                    if _page_key(passages[j]) == key:
+                        bridged = _merge(merged, passages[j].page_content, max_overlap)
+                        if bridged is not None:
+                            merged = bridged
+                            del passages[j]
+                            packed.chunks_merged += 1
+                passages[i] = Document(page_content=merged, metadata=passage.metadata)
+                break
+        else:
+            passages.append(Document(page_content=text, metadata=dict(doc.metadata)))
+
+    blocks = []
+    used = 0
+    for passage in passages:
+        block = f"[{_citation(passage)}]\n{passage.page_content}"
+        tokens = estimate_tokens(block) + (1 if blocks else 0)
+        if used + tokens <= token_budget:
+            blocks.append(block)
+            packed.passages.append(passage)
+            used += tokens
+        elif not blocks and not packed.passages_dropped:
+            # The best passage alone exceeds the budget: keep its beginning rather than nothing
+            block = block[:int(token_budget * AppConfig.CONTEXT_CHARS_PER_TOKEN)]
+            blocks.append(block)
+            packed.passages.append(passage)
+            used += estimate_tokens(block)
+        else:
+            packed.passages_dropped += 1
+
+    packed.text = "\n\n".join(blocks)
+    packed.tokens = used
+    return packed
+
+def _merge(existing: str, text: str, max_overlap: int) -> Optional[str]:
+    """Stitches two overlapping chunks in reading order, or returns None if they are not adjacent."""
+    size = overlap_length(existing, text, max_overlap)
+    if size:
+        return existing + text[size:]
+    size = overlap_length(text, existing, max_overlap)
+    if size:
+        return text + existing[size:]
+    return None
+
+def _page_key(doc: Document):
+    return doc.metadata.get("source"), doc.metadata.get("page", doc.metadata.get("sheet"))
+
+def _citation(doc: Document) -> str:
+    source, page = _page_key(doc)
+    source = source or "unknown source"
+    return f"{source}, page {page}" if page is not None else source
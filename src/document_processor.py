@@ -5,13 +5,80 @@ except ImportError:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from langchain.docstore.document import Document
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
 from src.config import AppConfig
+from src.hashing import chunk_id, content_hash
 import io
+import os
+import atexit
+import tempfile
+import threading
+import multiprocessing
 import pandas as pd
 from docx import Document as DocxDocument
 from pptx import Presentation
 
+SUPPORTED_EXTENSIONS = {'pdf', 'docx', 'doc', 'pptx', 'ppt', 'xlsx', 'xls', 'txt'}
+
+@dataclass
+class ExtractionTask:
+    """A unit of work for the extraction pool: a whole file, or a page range of a large PDF."""
+    file_idx: int
+    file_name: str
+    file_ext: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    page_range: Optional[Tuple[int, int]] = None
+
+def _pdf_page_count(pdf_bytes: bytes) -> int:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_workers = 0
+_extraction_pool_lock = threading.Lock()
+
+def _get_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """The process-wide extraction pool, started on first use and reused by every later ingestion."""
+    global _extraction_pool, _extraction_pool_workers
+    with _extraction_pool_lock:
+        if _extraction_pool is None or _extraction_pool_workers != workers:
+            if _extraction_pool is None:
+                atexit.register(_shutdown_extraction_pool)
+            else:
+                _extraction_pool.shutdown(wait=False)
+            context = multiprocessing.get_context("spawn")  # fork is unsafe in a threaded server
+            _extraction_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _extraction_pool_workers = workers
+        return _extraction_pool
+
+def _shutdown_extraction_pool():
+    global _extraction_pool
+    with _extraction_pool_lock:
+        pool, _extraction_pool = _extraction_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+def _completed(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+def _run_extraction_task(task: "ExtractionTask") -> Tuple[List[Document], Optional[str]]:
+    """Process-pool entry point. Returns (documents, error message)."""
+    try:
+        if task.page_range is not None:
+            with fitz.open(task.path) as doc:
+                return DocumentProcessor._extract_pdf_pages(doc, task.file_name, task.page_range), None
+        file = io.BytesIO(task.data)
+        file.name = task.file_name
+        return DocumentProcessor()._extract(file, task.file_ext), None
+    except Exception as e:
+        return [], str(e)
+
 class ProcessingLogger:
     """Tracks document processing stats for user visibility."""
     
@@ -41,53 +108,153 @@ class DocumentProcessor:
     def process_files(self, uploaded_files) -> List[Document]:
         """
         Main dispatcher for processing uploaded files.
+        With AppConfig.EXTRACTION_WORKERS > 1, files (and page ranges of large PDFs) are extracted
+        in a process pool; documents and logs come back in the same order as serial processing.
         """
         all_documents = []
-        
+        for _, docs in self.iter_files(uploaded_files):
+            all_documents.extend(docs)
+        return all_documents
+
+    def iter_files(self, uploaded_files) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Yields (file_name, documents) one file at a time, in upload order, so callers can chunk and
+        index each file before holding the next. Files that fail are logged and skipped.
+        """
+        if AppConfig.EXTRACTION_WORKERS > 1:
+            yield from self._iter_files_parallel(uploaded_files, AppConfig.EXTRACTION_WORKERS)
+            return
+
         for file in uploaded_files:
             file_name = file.name
             file_ext = file_name.split('.')[-1].lower()
             self.logger.log(file_name, "Ingestion", f"Started processing. Size: {file.size / 1024:.2f} KB")
 
             try:
-                docs = []
-                if file_ext == 'pdf':
-                    docs = self._process_pdf(file)
-                elif file_ext in ['docx', 'doc']:
-                    docs = self._process_docx(file)
-                elif file_ext in ['pptx', 'ppt']:
-                    docs = self._process_pptx(file)
-                elif file_ext in ['xlsx', 'xls']:
-                    docs = self._process_excel(file)
-                elif file_ext == 'txt':
-                    docs = self._process_txt(file)
-                else:
+                if file_ext not in SUPPORTED_EXTENSIONS:
                     self.logger.log(file_name, "Error", f"Unsupported format: {file_ext}")
                     continue
-                
-                if docs:
-                    self.logger.log(file_name, "Extraction", f"Extracted {len(docs)} pages/sections.")
-                    all_documents.extend(docs)
-                else:
-                    self.logger.log(file_name, "Warning", "No text extracted.")
+                docs = self._extract(file, file_ext)
+                self._log_extraction(file_name, docs)
 
             except Exception as e:
                 self.logger.log(file_name, "Error", f"Processing failed: {str(e)}")
-        
-        return all_documents
+                continue
+            yield file_name, docs
+
+    def _extract(self, file, file_ext: str) -> List[Document]:
+        if file_ext == 'pdf':
+            return self._process_pdf(file)
+        elif file_ext in ['docx', 'doc']:
+            return self._process_docx(file)
+        elif file_ext in ['pptx', 'ppt']:
+            return self._process_pptx(file)
+        elif file_ext in ['xlsx', 'xls']:
+            return self._process_excel(file)
+        return self._process_txt(file)
+
+    def _log_extraction(self, file_name: str, docs: List[Document]):
+        if docs:
+            self.logger.log(file_name, "Extraction", f"Extracted {len(docs)} pages/sections.")
+        else:
+            self.logger.log(file_name, "Warning", "No text extracted.")
 
-    def _process_pdf(self, file) -> List[Document]:
+    def _iter_files_parallel(self, uploaded_files, workers: int) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Fans extraction out over the shared process pool: one task per file, or per page range of a large PDF.
+        Uploads smaller than AppConfig.EXTRACTION_POOL_MIN_BYTES stay in-process (only a PDF split into page
+        ranges goes to the pool), since shipping them to a worker costs more than extracting them.
+        At most ~2 tasks per worker are in flight ahead of the file being yielded, which bounds memory.
+        """
+        window = workers * 2
+        fan_out = sum(getattr(file, "size", 0) for file in uploaded_files) >= AppConfig.EXTRACTION_POOL_MIN_BYTES
+        pending = deque()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            try:
+                for file_idx, file in enumerate(uploaded_files):
+                    tasks, error = self._plan_tasks(file_idx, file, tmp_dir)
+                    if fan_out or len(tasks) > 1:
+                        pool = _get_extraction_pool(workers)
+                        futures = [pool.submit(_run_extraction_task, t) for t in tasks]
+                    else:
+                        futures = [_completed(_run_extraction_task(t)) for t in tasks]
+                    pending.append((file, tasks, futures, error))
+
+                    while sum(len(entry[2]) for entry in pending) > window:
+                        yield from self._collect_file(*pending.popleft())
+                while pending:
+                    yield from self._collect_file(*pending.popleft())
+            finally:
+                # The pool outlives this run: drop the work nobody will collect
+                for _, _, futures, _ in pending:
+                    for future in futures:
+                        future.cancel()
+
+    def _plan_tasks(self, file_idx: int, file, tmp_dir: str) -> Tuple[List[ExtractionTask], Optional[str]]:
+        file_name = file.name
+        file_ext = file_name.split('.')[-1].lower()
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            return [], None
+        try:
+            file.seek(0)
+            data = file.read()
+            page_count = _pdf_page_count(data) if file_ext == 'pdf' else 0
+            if page_count <= AppConfig.PDF_PAGES_PER_TASK:
+                return [ExtractionTask(file_idx, file_name, file_ext, data=data)], None
+
+            # Workers open the PDF from disk instead of each receiving a copy of its bytes
+            pdf_path = os.path.join(tmp_dir, f"{file_idx}.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(data)
+            return [
+                ExtractionTask(file_idx, file_name, file_ext, path=pdf_path,
+                               page_range=(start, min(start + AppConfig.PDF_PAGES_PER_TASK, page_count)))
+                for start in range(0, page_count, AppConfig.PDF_PAGES_PER_TASK)
+            ], None
+        except Exception as e:
+            return [], str(e)
+
+    def _collect_file(self, file, tasks: List[ExtractionTask], futures: List[Future], error: Optional[str]):
+        """Waits for one file's tasks and logs/yields it exactly as the serial path does."""
+        file_name = file.name
+        file_ext = file_name.split('.')[-1].lower()
+        self.logger.log(file_name, "Ingestion", f"Started processing. Size: {file.size / 1024:.2f} KB")
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            self.logger.log(file_name, "Error", f"Unsupported format: {file_ext}")
+            return
+
+        docs = []
+        for future in futures:
+            task_docs, task_error = future.result()
+            error = error or task_error
+            docs.extend(task_docs)
+        for path in {t.path for t in tasks if t.path}:
+            os.remove(path)
+
+        if error:
+            self.logger.log(file_name, "Error", f"Processing failed: {error}")
+            return
+        self._log_extraction(file_name, docs)
+        yield file_name, docs
+
+    def _process_pdf(self, file, page_range: Optional[Tuple[int, int]] = None) -> List[Document]:
         file.seek(0)
         pdf_bytes = file.read()
-        documents = []
         with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
-                if text.strip():
-                    documents.append(Document(
-                        page_content=text,
-                        metadata={"source": file.name, "page": page_num + 1, "type": "pdf"}
-                    ))
+            return self._extract_pdf_pages(doc, file.name, page_range)
+
+    @staticmethod
+    def _extract_pdf_pages(doc, file_name: str, page_range: Optional[Tuple[int, int]] = None) -> List[Document]:
+        start, end = page_range or (0, doc.page_count)
+        documents = []
+        for page_num in range(start, end):
+            text = doc.load_page(page_num).get_text()
+            if text.strip():
+                documents.append(Document(
+                    page_content=text,
+                    metadata={"source": file_name, "page": page_num + 1, "type": "pdf"}
+                ))
         return documents
 
     def _process_docx(self, file) -> List[Document]:
@@ -151,10 +318,19 @@ class DocumentProcessor:
 
     def chunk_documents(self, documents: List[Document]) -> List[Document]:
         """
-        Splits documents into smaller chunks.
+        Splits documents into smaller chunks, each tagged with a `chunk_id` in its metadata.
         """
         chunks = self.text_splitter.split_documents(documents)
         
+        # Stable, content-derived IDs: unchanged chunks keep their ID across re-ingestion.
+        # Identical chunks on the same page are disambiguated by occurrence.
+        seen = {}
+        for chunk in chunks:
+            base_id = chunk_id(chunk)
+            occurrence = seen.get(base_id, 0)
+            seen[base_id] = occurrence + 1
+            chunk.metadata["chunk_id"] = base_id if occurrence == 0 else content_hash(f"{base_id}:{occurrence}")
+        
         # Log chunking stats if possible (would need refactoring to pass logger here or make logger global/singleton)
         # For now, we assume the caller will log the result size.
         return chunks
@@ -0,0 +1,172 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.config import AppConfig, ModelConfig
+from src.hashing import content_hash
+
+class EmbeddingCache:
+    """
+    Disk-backed (SQLite) store of embedding vectors keyed by (model name, chunk text hash).
+    Vectors are stored as raw float32 bytes, so a hit returns exactly what the model produced.
+    Size is bounded: past max_entries the least recently used vectors are evicted.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or AppConfig.EMBED_CACHE_PATH
+        self.max_entries = max_entries or AppConfig.EMBED_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared across threads, serialized by the lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, model: str, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for the hashes that are present and counts hits/misses."""
+        unique = list(dict.fromkeys(text_hashes))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(unique), 500):  # Stay below SQLite's bound-parameter limit
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                )
+                found.update((text_hash, np.frombuffer(vector, dtype=np.float32)) for text_hash, vector in rows)
+            if found:
+                with self._conn:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, h) for h in found],
+                    )
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        """Stores text hash -> vector pairs, evicting the least recently used entries beyond max_entries."""
+        if not vectors:
+            return
+        now = time.time()
+        rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes(), now) for h, v in vectors.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC, rowid ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class EmbeddingService(Embeddings):
+    """
+    Sentence-transformers embeddings with tunable batching, a persistent CPU process pool and an on-disk cache.
+    Document texts already embedded by the same model (in any earlier ingestion or rebuild) are served from
+    the cache; the rest are encoded in batches of `batch_size`, spread across `workers` processes when there
+    are enough of them to pay for the hand-off. Vectors match `HuggingFaceEmbeddings` with default settings.
+    Queries are short and latency-bound, so they are encoded in-process and not cached.
+    """
+
+    def __init__(
+        self,
+        model_name: str = None,
+        batch_size: int = None,
+        workers: int = None,
+        cache: Optional[EmbeddingCache] = None,
+        model: Any = None,
+    ):
+        self.model_name = model_name or ModelConfig.EMBEDDING_MODEL
+        self.batch_size = batch_size or AppConfig.EMBED_ENCODE_BATCH_SIZE
+        self.workers = workers or AppConfig.EMBED_WORKERS
+        self.cache = cache
+        self._model = model
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self.encoded = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        if not texts:
+            return []
+        hashes = [content_hash(t) for t in texts]
+        vectors = self.cache.get_many(self.model_name, hashes) if self.cache is not None else {}
+
+        missing: Dict[str, str] = {}  # hash -> text, deduplicated
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            fresh = dict(zip(missing, encoded))
+            if self.cache is not None:
+                self.cache.put_many(self.model_name, fresh)
+            vectors.update(fresh)
+        return [vectors[h].tolist() for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.encode([text.replace("\n", " ")], batch_size=1, show_progress_bar=False)[0].tolist()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        self.encoded += len(texts)
+        # Starting a batch in another process costs a pickle round trip; only worth it for several batches per worker
+        if self.workers > 1 and len(texts) >= self.workers * self.batch_size:
+            return np.asarray(self.model.encode(texts, batch_size=self.batch_size, pool=self._get_pool(), show_progress_bar=False), dtype=np.float32)
+        return np.asarray(self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False), dtype=np.float32)
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+                atexit.register(self.close)
+            return self._pool
+
+    def close(self):
+        """Stops the encoding processes (they are restarted on the next large batch)."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            self.model.stop_multi_process_pool(pool)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"encoded": self.encoded, "workers": self.workers, "batch_size": self.batch_size}
+        if self.cache is not None:
+            stats.update({f"cache_{k}": v for k, v in self.cache.stats().items()})
+        return stats
@@ -0,0 +1,173 @@
+from typing import List, Dict, Any, Optional
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.hashing import content_hash
+from src.nim_client import NIMError
+
+GRADE_PROMPT = PromptTemplate(
+    template="""You are a grader assessing relevance of a retrieved document to a user question. \n
+    Here is the retrieved document: \n\n {document} \n\n
+    Here is the user question: {question} \n
+    If the document contains keywords or semantic meaning related to the question, grade it as relevant. \n
+    Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question. \n
+    Provide the binary score as a JSON with a single key 'score' and no premable or explanation.""",
+    input_variables=["question", "document"],
+)
+
+BATCH_GRADE_PROMPT = PromptTemplate(
+    template="""You are a grader assessing relevance of retrieved documents to a user question. \n
+    Here are the retrieved documents, each prefixed with its number: \n\n {documents} \n\n
+    Here is the user question: {question} \n
+    If a document contains keywords or semantic meaning related to the question, grade it as relevant. \n
+    Give a binary score 'yes' or 'no' for every document, in the same order as the documents. \n
+    Provide the scores as a JSON with a single key 'scores' holding a list of {count} values and no premable or explanation.""",
+    input_variables=["question", "documents", "count"],
+)
+
+
+def _normalize_grade(value: Any) -> str:
+    return "yes" if str(value).strip().lower() == "yes" else "no"
+
+def _raise_request_errors(results: List[Any]):
+    # A NIM failure (after the client's retries) is not a verdict: surface it instead of keeping every document
+    for result in results:
+        if isinstance(result, NIMError):
+            raise result
+
+
+class DocumentGrader:
+    """
+    Grades retrieved documents for relevance with concurrent (and optionally batched) LLM calls.
+    With a verdict cache, (question, chunk) pairs graded before are answered without an LLM call.
+    """
+
+    def __init__(self, llm, max_concurrency: int = None, batch_size: int = None, verdict_cache=None):
+        self.llm = llm
+        self.max_concurrency = max_concurrency or AppConfig.GRADER_MAX_CONCURRENCY
+        self.batch_size = batch_size or AppConfig.GRADER_BATCH_SIZE
+        self.verdict_cache = verdict_cache
+        self.chain = GRADE_PROMPT | self.llm | JsonOutputParser()
+        self.batch_chain = BATCH_GRADE_PROMPT | self.llm | JsonOutputParser()
+        # Cached verdicts are only valid for the same prompts and model
+        model = getattr(llm, "model", None) or getattr(llm, "model_name", "")
+        self.version = content_hash(f"{GRADE_PROMPT.template}\x00{BATCH_GRADE_PROMPT.template}\x00{model}")
+
+    def grade(self, question: str, documents: List[Document], stats: Optional[Dict[str, int]] = None) -> List[str]:
+        """
+        Returns a 'yes'/'no' verdict per document, in the same order as the input.
+        If `stats` is given, it receives the verdict cache 'hits' and 'misses' for this call.
+        """
+        verdicts, pending, keys = self._lookup(question, documents, stats)
+        if pending:
+            pending_docs = [documents[i] for i in pending]
+            if self.batch_size > 1:
+                graded = self._grade_batched(question, pending_docs)
+            else:
+                graded = self._grade_single(question, pending_docs)
+            self._record(verdicts, pending, keys, graded)
+        return [v if v is not None else "yes" for v in verdicts] # Fallback to keeping it if parsing fails
+
+    async def agrade(self, question: str, documents: List[Document], stats: Optional[Dict[str, int]] = None) -> List[str]:
+        """Async `grade`: the grading calls are awaited concurrently instead of run on worker threads."""
+        verdicts, pending, keys = self._lookup(question, documents, stats)
+        if pending:
+            pending_docs = [documents[i] for i in pending]
+            if self.batch_size > 1:
+                graded = await self._agrade_batched(question, pending_docs)
+            else:
+                graded = await self._agrade_single(question, pending_docs)
+            self._record(verdicts, pending, keys, graded)
+        return [v if v is not None else "yes" for v in verdicts]
+
+    def filter(self, question: str, documents: List[Document], stats: Optional[Dict[str, int]] = None) -> List[Document]:
+        """Returns only the documents graded as relevant, preserving input order."""
+        verdicts = self.grade(question, documents, stats=stats)
+        return [d for d, grade in zip(documents, verdicts) if grade == "yes"]
+
+    async def afilter(self, question: str, documents: List[Document], stats: Optional[Dict[str, int]] = None) -> List[Document]:
+        verdicts = await self.agrade(question, documents, stats=stats)
+        return [d for d, grade in zip(documents, verdicts) if grade == "yes"]
+
+    def _lookup(self, question: str, documents: List[Document], stats: Optional[Dict[str, int]]):
+        """Returns (verdicts with cached ones filled in, indexes still to grade, cache keys)."""
+        verdicts: List[Optional[str]] = [None] * len(documents)
+        pending = list(range(len(documents)))
+        keys = []
+        if self.verdict_cache is not None and documents:
+            keys = [self.verdict_cache.make_key(question, d.page_content, self.version) for d in documents]
+            cached = self.verdict_cache.get_many(keys)
+            for i, key in enumerate(keys):
+                verdicts[i] = cached.get(key)
+            pending = [i for i, v in enumerate(verdicts) if v is None]
+        if stats is not None:
+            stats["hits"] = len(documents) - len(pending)
+            stats["misses"] = len(pending)
+        return verdicts, pending, keys
+
+    def _record(self, verdicts: List[Optional[str]], pending: List[int], keys: List[str], graded: List[Optional[str]]):
+        for i, verdict in zip(pending, graded):
+            verdicts[i] = verdict
+        if self.verdict_cache is not None:
+            # Failed calls are not cached, so they are retried next time
+            self.verdict_cache.put_many((keys[i], v) for i, v in zip(pending, graded) if v is not None)
+
+    def _grade_single(self, question: str, documents: List[Document]) -> List[Optional[str]]:
+        inputs = [{"question": question, "document": d.page_content} for d in documents]
+        results = self.chain.batch(inputs, config={"max_concurrency": self.max_concurrency}, return_exceptions=True)
+        _raise_request_errors(results)
+        return self._single_verdicts(results)
+
+    async def _agrade_single(self, question: str, documents: List[Document]) -> List[Optional[str]]:
+        inputs = [{"question": question, "document": d.page_content} for d in documents]
+        results = await self.chain.abatch(inputs, config={"max_concurrency": self.max_concurrency}, return_exceptions=True)
+        _raise_request_errors(results)
+        return self._single_verdicts(results)
+
+    def _grade_batched(self, question: str, documents: List[Document]) -> List[Optional[str]]:
+        groups = [documents[i:i + self.batch_size] for i in range(0, len(documents), self.batch_size)]
+        inputs = [self._batch_input(question, group) for group in groups]
+        results = self.batch_chain.batch(inputs, config={"max_concurrency": self.max_concurrency}, return_exceptions=True)
+        _raise_request_errors(results)
+
+        verdicts = []
+        for group, result in zip(groups, results):
+            scores = self._batch_verdicts(group, result)
+            # If the model did not return one verdict per document, grade this group one by one
+            verdicts.extend(scores if scores is not None else self._grade_single(question, group))
+        return verdicts
+
+    async def _agrade_batched(self, question: str, documents: List[Document]) -> List[Optional[str]]:
+        groups = [documents[i:i + self.batch_size] for i in range(0, len(documents), self.batch_size)]
+        inputs = [self._batch_input(question, group) for group in groups]
+        results = await self.batch_chain.abatch(inputs, config={"max_concurrency": self.max_concurrency}, return_exceptions=True)
+        _raise_request_errors(results)
+
+        verdicts = []
+        for group, result in zip(groups, results):
+            scores = self._batch_verdicts(group, result)
+            verdicts.extend(scores if scores is not None else await self._agrade_single(question, group))
+        return verdicts
+
+    @staticmethod
+    def _single_verdicts(results: List[Any]) -> List[Optional[str]]:
+        verdicts = []
+        for result in results:
+            if isinstance(result, dict):
+                verdicts.append(_normalize_grade(result.get("score", "no")))
+            else:
+                verdicts.append(None) # Parsing failed
+        return verdicts
+
+    @staticmethod
+    def _batch_verdicts(group: List[Document], result: Any) -> Optional[List[str]]:
+        scores = result.get("scores") if isinstance(result, dict) else None
+        if isinstance(scores, list) and len(scores) == len(group):
+            return [_normalize_grade(s) for s in scores]
+        return None
+
+    @staticmethod
+    def _batch_input(question: str, group: List[Document]) -> Dict[str, Any]:
+        documents = "\n\n".join(f"[{i + 1}] {d.page_content}" for i, d in enumerate(group))
+        return {"question": question, "documents": documents, "count": len(group)}
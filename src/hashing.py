@@ -0,0 +1,30 @@
+import hashlib
+from typing import Union
+from langchain.docstore.document import Document
+
+def content_hash(data: Union[str, bytes]) -> str:
+    """Returns a stable SHA-256 hex digest for text or raw bytes."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def chunk_id(doc: Document) -> str:
+    """
+    Returns a stable identifier for a chunk.
+    Uses the `chunk_id` assigned at ingestion if present, otherwise derives one from source, page and content.
+    """
+    existing = doc.metadata.get("chunk_id")
+    if existing:
+        return existing
+    source = doc.metadata.get("source", "")
+    page = doc.metadata.get("page", doc.metadata.get("sheet", ""))
+    return content_hash(f"{source}\x00{page}\x00{doc.page_content}")
+
+def file_hash(file, block_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 of an uploaded file's raw bytes (read in blocks), leaving the stream rewound."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(block_size), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Callable
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.document_processor import DocumentProcessor
+from src.retrieval_engine import RetrievalEngine
+from src.vector_manager import VectorStoreManager, IngestionPlan
+from src.ann_index import IndexSpec
+from src.compaction import get_compactor
+
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+
+@dataclass
+class IngestionResult:
+    """Summary of one ingestion run."""
+    files_processed: List[str] = field(default_factory=list)
+    unchanged_files: List[str] = field(default_factory=list)
+    chunks_total: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    resumed: bool = False
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: extract -> chunk -> embed in fixed-size batches -> append to the index.
+    Files are pulled one at a time from DocumentProcessor.iter_files and embedded in batches of
+    AppConfig.EMBED_BATCH_SIZE, so peak memory is bounded by one file plus the unflushed chunks,
+    not by the whole upload. Every AppConfig.INGEST_CHECKPOINT_CHUNKS chunks the indexes and the
+    manifest are persisted; after a crash, re-running the same upload skips finished files by hash
+    and already-indexed chunks by ID.
+    """
+
+    def __init__(self, doc_processor: DocumentProcessor, retrieval_engine: RetrievalEngine, vector_manager: VectorStoreManager):
+        self.doc_processor = doc_processor
+        self.retrieval_engine = retrieval_engine
+        self.vector_manager = vector_manager
+
+    def run(
+        self,
+        db_name: str,
+        uploaded_files,
+        progress_callback: Optional[Callable[[float, str], None]] = None,
+        index_spec: Optional[IndexSpec] = None,
+    ) -> IngestionResult:
+        """
+        Ingests the uploads into `db_name`. `index_spec` selects the FAISS index layout;
+        by default an existing knowledgebase keeps its own and a new one uses the AppConfig defaults.
+        """
+        plan = self.vector_manager.plan_ingestion(db_name, uploaded_files)
+        result = IngestionResult(unchanged_files=list(plan.unchanged_files))
+        for file_name in plan.unchanged_files:
+            self.doc_processor.logger.log(file_name, "Skipped", "Unchanged since last ingestion.")
+        if not plan.files_to_process:
+            return result
+
+        db_path = self.vector_manager.create_db_dir(db_name)
+        result.resumed = self._read_checkpoint(db_path) is not None
+        if result.resumed:
+            self.doc_processor.logger.log(db_name, "Checkpoint", "Resuming an interrupted ingestion; finished work is skipped.")
+        self._write_checkpoint(db_path, self._progress(plan, result))
+        manifest = self.vector_manager.load_manifest(db_name)
+        self.retrieval_engine.open_store(db_path, index_spec=index_spec)
+
+        total_files = len(plan.files_to_process)
+        unflushed: List[Document] = []
+        unflushed_files: List[str] = []
+        for file_name, docs in self.doc_processor.iter_files(plan.files_to_process):
+            chunks = self.doc_processor.chunk_documents(docs)
+            del docs
+            new_chunks, stale_ids = self.vector_manager.reconcile_chunks(db_name, chunks, manifest=manifest, file_names=[file_name])
+
+            added = 0
+            for start in range(0, len(new_chunks), AppConfig.EMBED_BATCH_SIZE):
+                added += self.retrieval_engine.add_chunks(new_chunks[start:start + AppConfig.EMBED_BATCH_SIZE])
+            self.retrieval_engine.remove_chunks(stale_ids)
+            self.doc_processor.logger.log(
+                file_name, "Indexing",
+                f"{len(chunks)} chunks: {added} embedded, {len(stale_ids)} outdated removed."
+            )
+
+            result.files_processed.append(file_name)
+            result.chunks_total += len(chunks)
+            result.chunks_added += added
+            result.chunks_removed += len(stale_ids)
+            unflushed.extend(chunks)
+            unflushed_files.append(file_name)
+
+            if len(unflushed) >= AppConfig.INGEST_CHECKPOINT_CHUNKS:
+                self._checkpoint(db_name, db_path, plan, unflushed, unflushed_files, manifest, result)
+                unflushed, unflushed_files = [], []
+            if progress_callback:
+                progress_callback(len(result.files_processed) / total_files, f"Indexed {file_name}")
+
+        self._checkpoint(db_name, db_path, plan, unflushed, unflushed_files, manifest, result)
+        os.remove(os.path.join(db_path, CHECKPOINT_FILE))
+        if result.chunks_removed:
+            get_compactor().maybe_schedule(db_path, self.retrieval_engine)
+        self.retrieval_engine.close()  # Lets the generation it wrote be collected once superseded
+        if not os.listdir(db_path):
+            os.rmdir(db_path)  # Nothing could be extracted into a new knowledgebase
+        if progress_callback:
+            progress_callback(1.0, "Ingestion complete.")
+        return result
+
+    def _checkpoint(self, db_name: str, db_path: str, plan: IngestionPlan, chunks: List[Document], file_names: List[str], manifest, result: IngestionResult):
+        """Persists indexes first and the manifest second, so the manifest never lists unsaved chunks."""
+        self.retrieval_engine.flush(db_path)
+        if file_names:
+            self.vector_manager.commit_ingestion(db_name, plan, chunks, manifest=manifest, file_names=file_names)
+        self._write_checkpoint(db_path, self._progress(plan, result))
+
+    @staticmethod
+    def _progress(plan: IngestionPlan, result: IngestionResult) -> dict:
+        done = set(result.files_processed)
+        return {
+            "updated_at": time.time(),
+            "files_done": result.files_processed,
+            "files_pending": [f.name for f in plan.files_to_process if f.name not in done],
+            "chunks_added": result.chunks_added,
+        }
+
+    @staticmethod
+    def _read_checkpoint(db_path: str) -> Optional[dict]:
+        path = os.path.join(db_path, CHECKPOINT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_checkpoint(db_path: str, payload: dict):
+        path = os.path.join(db_path, CHECKPOINT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
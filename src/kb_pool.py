@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List
+from src.config import AppConfig
+from src.snapshots import current_dir, current_generation, collect_garbage
+from src.retrieval_engine import RetrievalEngine
+
+class Knowledgebase:
+    """One opened, read-only generation of a knowledgebase, shared by every session that acquires it."""
+
+    def __init__(self, path: str, version: str, engine: RetrievalEngine, load_seconds: float, size_bytes: int):
+        self.path = path
+        self.version = version
+        self.engine = engine
+        self.load_seconds = load_seconds
+        self.size_bytes = size_bytes
+        self.refcount = 0
+
+class KnowledgebaseLease:
+    """
+    A session's hold on a shared Knowledgebase. Call `release` when done; a lease dropped without
+    releasing (e.g. an expired Streamlit session) is released when it is garbage collected.
+    """
+
+    def __init__(self, pool: "KnowledgebasePool", knowledgebase: Knowledgebase):
+        self.knowledgebase = knowledgebase
+        self._finalizer = weakref.finalize(self, pool._release, knowledgebase)
+
+    @property
+    def engine(self) -> RetrievalEngine:
+        return self.knowledgebase.engine
+
+    def is_stale(self) -> bool:
+        """True once a newer generation of the knowledgebase has been published."""
+        return (current_generation(self.knowledgebase.path) or "") != self.knowledgebase.version
+
+    def release(self):
+        self._finalizer()
+
+class KnowledgebasePool:
+    """
+    Process-wide cache of read-only knowledgebases. Each generation is loaded once (FAISS index memory-mapped)
+    and shared by reference-counted leases. When ingestion publishes a new generation, the next `acquire`
+    loads it while sessions holding the previous one keep using it until they release it; the old
+    generation is then closed so its files can be collected.
+
+    Cached knowledgebases are kept in LRU order under a memory budget (estimated from their index and
+    docstore sizes on disk). Past the budget, the least recently used ones without open leases are
+    evicted; knowledgebases in use are never evicted, so the budget can be exceeded while they are held.
+    """
+
+    def __init__(self, memory_budget_mb: float = None):
+        self.memory_budget_bytes = (memory_budget_mb or AppConfig.KB_POOL_MEMORY_MB) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._current: "OrderedDict[str, Knowledgebase]" = OrderedDict()
+        self._prewarmed = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds_total = 0.0
+
+    def acquire(self, db_path: str) -> KnowledgebaseLease:
+        path = os.path.abspath(db_path)
+        lease = self._acquire_current(path)
+        if lease is not None:
+            return lease
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(path, threading.Lock())
+        # Per-path lock: concurrent sessions opening the same new version wait for a single load
+        with load_lock:
+            lease = self._acquire_current(path)
+            if lease is not None:
+                return lease
+
+            start = time.perf_counter()
+            engine = RetrievalEngine()
+            engine.open_readonly(path)
+            load_seconds = time.perf_counter() - start
+            # The version is the generation the engine actually holds, even if a newer one was published meanwhile
+            knowledgebase = Knowledgebase(path, engine.generation or "", engine, load_seconds, _footprint(engine.snapshot.path))
+            with self._lock:
+                self.misses += 1
+                self.load_seconds_total += load_seconds
+                # A replaced generation stays open for as long as leases reference it
+                replaced = self._current.pop(path, None)
+                self._current[path] = knowledgebase
+                knowledgebase.refcount += 1
+                lease = KnowledgebaseLease(self, knowledgebase)
+                closed = self._evict()
+                if replaced is not None and replaced.refcount == 0:
+                    closed.append(replaced)
+            self._close(closed)
+            return lease
+
+    def _acquire_current(self, path: str):
+        version = current_generation(path) or ""
+        with self._lock:
+            knowledgebase = self._current.get(path)
+            if knowledgebase is None or knowledgebase.version != version:
+                return None
+            self.hits += 1
+            self._current.move_to_end(path)
+            knowledgebase.refcount += 1
+            return KnowledgebaseLease(self, knowledgebase)
+
+    def _evict(self) -> List[Knowledgebase]:
+        # Caller holds self._lock; returns the evicted knowledgebases for `_close`
+        evicted = []
+        resident = sum(kb.size_bytes for kb in self._current.values())
+        for path in list(self._current):
+            if resident <= self.memory_budget_bytes:
+                break
+            knowledgebase = self._current[path]
+            if knowledgebase.refcount == 0:
+                del self._current[path]
+                resident -= knowledgebase.size_bytes
+                self.evictions += 1
+                evicted.append(knowledgebase)
+        return evicted
+
+    @staticmethod
+    def _close(knowledgebases: List[Knowledgebase]):
+        """Releases the generations of knowledgebases no longer cached or leased, collecting superseded ones."""
+        for knowledgebase in knowledgebases:
+            knowledgebase.engine.close()
+            if os.path.isdir(knowledgebase.path):
+                collect_garbage(knowledgebase.path)
+
+    def prewarm(self, db_paths: Iterable[str]):
+        """Loads the given knowledgebases (most important first) as far as the memory budget allows, once per process."""
+        with self._lock:
+            if self._prewarmed:
+                return
+            self._prewarmed = True
+        for db_path in db_paths:
+            size = _footprint(current_dir(os.path.abspath(db_path)))
+            with self._lock:
+                resident = sum(kb.size_bytes for kb in self._current.values())
+            if resident + size > self.memory_budget_bytes:
+                break
+            self.acquire(db_path).release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit rate, load times, evictions and estimated resident size of the pool."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "avg_load_seconds": self.load_seconds_total / self.misses if self.misses else 0.0,
+                "cached": len(self._current),
+                "resident_mb": sum(kb.size_bytes for kb in self._current.values()) / (1024 * 1024),
+                "budget_mb": self.memory_budget_bytes / (1024 * 1024),
+            }
+
+    def _release(self, knowledgebase: Knowledgebase):
+        with self._lock:
+            knowledgebase.refcount -= 1
+            # Replaced or discarded generations are closed by their last lease
+            orphaned = knowledgebase.refcount == 0 and self._current.get(knowledgebase.path) is not knowledgebase
+            # Knowledgebases that were leased when the pool went over budget become evictable now
+            closed = self._evict() if knowledgebase.refcount == 0 else []
+        if orphaned:
+            closed.append(knowledgebase)
+        self._close(closed)
+
+    def discard(self, db_path: str):
+        """Forgets the cached generation of a deleted knowledgebase (open leases keep working)."""
+        with self._lock:
+            knowledgebase = self._current.pop(os.path.abspath(db_path), None)
+        if knowledgebase is not None and knowledgebase.refcount == 0:
+            self._close([knowledgebase])
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per cached knowledgebase (least recently used first): generation, open leases, load time and size."""
+        with self._lock:
+            return {
+                path: {
+                    "version": kb.version,
+                    "refcount": kb.refcount,
+                    "load_seconds": kb.load_seconds,
+                    "size_mb": kb.size_bytes / (1024 * 1024),
+                }
+                for path, kb in self._current.items()
+            }
+
+def _footprint(path: str) -> int:
+    """Estimated memory of an opened generation: its FAISS index, docstore and BM25 files."""
+    files = [os.path.join(path, "index.faiss"), os.path.join(path, "index.pkl")]
+    for root, _, names in os.walk(os.path.join(path, "bm25")):
+        files.extend(os.path.join(root, name) for name in names)
+    total = 0
+    for file_path in files:
+        try:
+            total += os.path.getsize(file_path)
+        except OSError:
+            pass  # Missing, or replaced by a concurrent ingestion
+    return total
+
+_pool = KnowledgebasePool()
+
+def get_knowledgebase_pool() -> KnowledgebasePool:
+    """Returns the process-wide knowledgebase pool."""
+    return _pool
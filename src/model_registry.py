@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+import psutil
+from sentence_transformers import CrossEncoder
+from src.config import AppConfig, ModelConfig
+from src.embedding_service import EmbeddingCache, EmbeddingService
+
+class ModelRegistry:
+    """Process-wide registry that lazily loads each model once and shares it across sessions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Registers a loader. The model itself is only built on the first `get`."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Returns the shared model instance, loading it on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"No model registered under '{name}'.")
+            load_lock = self._load_locks[name]
+
+        # Per-model lock: concurrent callers wait for one load instead of each loading a copy,
+        # while other models can still load in parallel.
+        with load_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            process = psutil.Process()
+            rss_before = process.memory_info().rss
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            load_seconds = time.perf_counter() - start
+            rss_after = process.memory_info().rss
+
+            self._stats[name] = {
+                "load_seconds": load_seconds,
+                # Approximate: other threads allocating during the load are counted too
+                "rss_mb": max(rss_after - rss_before, 0) / (1024 * 1024),
+            }
+            self._models[name] = model
+        return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns load time (seconds) and resident memory growth (MB) for each loaded model."""
+        return {name: dict(stat) for name, stat in self._stats.items()}
+
+    def unload(self, name: str):
+        """Drops a loaded model so the next `get` reloads it."""
+        with self._lock:
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+_registry = ModelRegistry()
+_registry.register(
+    "embeddings",
+    lambda: EmbeddingService(ModelConfig.EMBEDDING_MODEL, cache=EmbeddingCache() if AppConfig.EMBED_CACHE_ENABLED else None),
+)
+_registry.register("reranker", lambda: CrossEncoder(ModelConfig.RERANKER_MODEL))
+
+def get_registry() -> ModelRegistry:
+    """Returns the process-wide model registry."""
+    return _registry
+
+def get_embeddings() -> EmbeddingService:
+    return _registry.get("embeddings")
+
+def get_reranker() -> CrossEncoder:
+    return _registry.get("reranker")
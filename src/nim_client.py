@@ -0,0 +1,381 @@
+import json
+import time
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import httpx
+from pydantic import Field
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.config import AppConfig, ModelConfig
+from src.hashing import content_hash
+from src.rate_limiting import AdaptiveConcurrencyLimiter, TokenBucket, backoff_delay
+
+_ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+
+class NIMError(RuntimeError):
+    """A NIM request failed (after retries, where the failure was transient)."""
+
+class NIMRateLimitError(NIMError):
+    """The endpoint kept throttling (429/503) through every retry."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_THROTTLED_STATUS = {429, 503}
+
+class NIMClient:
+    """
+    Process-wide HTTP client for NIM's OpenAI-compatible chat completions API, shared by the router,
+    grader and generator of every conversation.
+    - Connections are pooled and kept alive. Sync calls share one httpx.Client; async calls share one
+      httpx.AsyncClient per event loop (an async connection belongs to the loop that opened it).
+    - Every request takes a token from a TokenBucket and a slot from an AdaptiveConcurrencyLimiter,
+      so bursts queue here (back-pressure) instead of being rejected by the endpoint.
+    - Throttled (429/503), 5xx and connection failures are retried with exponential backoff and jitter,
+      honouring Retry-After; streams are only retried before their first token.
+    - Identical non-streaming requests in flight at the same time are sent once and share the response.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = None,
+        max_keepalive: int = None,
+        keepalive_expiry: float = None,
+        timeout: float = None,
+        rate_limiter: TokenBucket = None,
+        concurrency: AdaptiveConcurrencyLimiter = None,
+        max_retries: int = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections or AppConfig.NIM_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive or AppConfig.NIM_MAX_KEEPALIVE,
+            keepalive_expiry=keepalive_expiry or AppConfig.NIM_KEEPALIVE_SECONDS,
+        )
+        self.timeout = httpx.Timeout(timeout or AppConfig.NIM_TIMEOUT_SECONDS, connect=10.0)
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.concurrency = concurrency or AdaptiveConcurrencyLimiter()
+        self.max_retries = AppConfig.NIM_MAX_RETRIES if max_retries is None else max_retries
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_clients = weakref.WeakKeyDictionary()  # Event loop -> httpx.AsyncClient
+        self._in_flight: Dict[str, Future] = {}  # Request key -> shared response, for coalescing
+        self._stats = {"requests": 0, "retries": 0, "throttled": 0, "coalesced": 0, "failed": 0}
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+                self._async_clients[loop] = client
+        return client
+
+    def chat(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        key, shared, leader = self._join(url, payload)
+        if not leader:
+            return shared.result()
+        try:
+            result = self._send(url, payload, headers)
+        except BaseException as e:
+            self._finish(key, shared, error=e)
+            raise
+        self._finish(key, shared, result=result)
+        return result
+
+    async def achat(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        key, shared, leader = self._join(url, payload)
+        if not leader:
+            return await asyncio.wrap_future(shared)
+        try:
+            result = await self._asend(url, payload, headers)
+        except BaseException as e:
+            self._finish(key, shared, error=e)
+            raise
+        self._finish(key, shared, result=result)
+        return result
+
+    def stream_chat(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Iterator[str]:
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            self.concurrency.acquire()
+            start = time.monotonic()
+            latency, throttled, retry_after, started = None, False, None, False
+            try:
+                with self.client.stream("POST", url, json=payload, headers=headers) as response:
+                    latency = time.monotonic() - start
+                    throttled, retry_after = self._check(response, attempt)
+                    if not throttled and response.status_code not in _RETRYABLE_STATUS:
+                        for line in response.iter_lines():
+                            token = _parse_event(line)
+                            if token is None:
+                                break
+                            if token:
+                                started = True
+                                yield token
+                        return
+            except httpx.TransportError as e:
+                if started:
+                    # Part of the answer was already delivered; a retry would repeat it
+                    raise NIMError(f"NIM stream interrupted: {e}") from e
+                self._check_transport(e, attempt)
+            finally:
+                self.concurrency.release(latency, throttled)
+            time.sleep(self._backoff(attempt, retry_after))
+
+    async def astream_chat(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> AsyncIterator[str]:
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.aacquire()
+            await self.concurrency.aacquire()
+            start = time.monotonic()
+            latency, throttled, retry_after, started = None, False, None, False
+            try:
+                async with self.async_client.stream("POST", url, json=payload, headers=headers) as response:
+                    latency = time.monotonic() - start
+                    throttled, retry_after = self._check(response, attempt)
+                    if not throttled and response.status_code not in _RETRYABLE_STATUS:
+                        async for line in response.aiter_lines():
+                            token = _parse_event(line)
+                            if token is None:
+                                break
+                            if token:
+                                started = True
+                                yield token
+                        return
+            except httpx.TransportError as e:
+                if started:
+                    # Part of the answer was already delivered; a retry would repeat it
+                    raise NIMError(f"NIM stream interrupted: {e}") from e
+                self._check_transport(e, attempt)
+            finally:
+                self.concurrency.release(latency, throttled)
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    def _send(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            self.concurrency.acquire()
+            start = time.monotonic()
+            latency, throttled, retry_after = None, False, None
+            try:
+                response = self.client.post(url, json=payload, headers=headers)
+                latency = time.monotonic() - start
+                throttled, retry_after = self._check(response, attempt)
+                if not throttled and response.status_code not in _RETRYABLE_STATUS:
+                    data = self._decode(response, attempt)
+                    if data is not None:
+                        return data
+            except httpx.TransportError as e:
+                self._check_transport(e, attempt)
+            finally:
+                self.concurrency.release(latency, throttled)
+            time.sleep(self._backoff(attempt, retry_after))
+
+    async def _asend(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.aacquire()
+            await self.concurrency.aacquire()
+            start = time.monotonic()
+            latency, throttled, retry_after = None, False, None
+            try:
+                response = await self.async_client.post(url, json=payload, headers=headers)
+                latency = time.monotonic() - start
+                throttled, retry_after = self._check(response, attempt)
+                if not throttled and response.status_code not in _RETRYABLE_STATUS:
+                    data = self._decode(response, attempt)
+                    if data is not None:
+                        return data
+            except httpx.TransportError as e:
+                self._check_transport(e, attempt)
+            finally:
+                self.concurrency.release(latency, throttled)
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    def _check(self, response: httpx.Response, attempt: int):
+        """
+        Returns (throttled, Retry-After seconds) for a response worth retrying, raises NIMError when it is
+        not retryable or retries are used up, and returns (False, None) for a success.
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+        status = response.status_code
+        if status < 400:
+            return False, None
+        throttled = status in _THROTTLED_STATUS
+        retry_after = _retry_after(response)
+        if throttled:
+            with self._lock:
+                self._stats["throttled"] += 1
+        if status not in _RETRYABLE_STATUS or attempt >= self.max_retries:
+            with self._lock:
+                self._stats["failed"] += 1
+            message = f"NIM request failed with HTTP {status} after {attempt + 1} attempts."
+            if throttled:
+                raise NIMRateLimitError(message, retry_after=retry_after)
+            raise NIMError(message)
+        return throttled, retry_after
+
+    def _check_transport(self, error: httpx.TransportError, attempt: int):
+        with self._lock:
+            self._stats["requests"] += 1
+            if attempt >= self.max_retries:
+                self._stats["failed"] += 1
+        if attempt >= self.max_retries:
+            raise NIMError(f"NIM request failed after {attempt + 1} attempts: {error}") from error
+
+    def _decode(self, response: httpx.Response, attempt: int) -> Optional[Dict[str, Any]]:
+        """Parses a successful response; returns None to retry a truncated or garbled body."""
+        try:
+            return response.json()
+        except ValueError as e:
+            with self._lock:
+                if attempt >= self.max_retries:
+                    self._stats["failed"] += 1
+            if attempt >= self.max_retries:
+                raise NIMError(f"NIM returned invalid JSON after {attempt + 1} attempts: {e}") from e
+            return None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        with self._lock:
+            self._stats["retries"] += 1
+        return backoff_delay(attempt, retry_after=retry_after)
+
+    def _join(self, url: str, payload: Dict[str, Any]):
+        """Returns (key, shared future, whether this caller sends the request) for request coalescing."""
+        key = content_hash(f"{url}\x00{json.dumps(payload, sort_keys=True)}")
+        with self._lock:
+            shared = self._in_flight.get(key)
+            if shared is not None:
+                self._stats["coalesced"] += 1
+                return key, shared, False
+            shared = Future()
+            self._in_flight[key] = shared
+        return key, shared, True
+
+    def _finish(self, key: str, shared: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            shared.set_exception(error if isinstance(error, Exception) else NIMError("Request cancelled."))
+        else:
+            shared.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({"concurrency_limit": int(self.concurrency.limit), "in_flight": self.concurrency.in_flight})
+        return stats
+
+    def close(self):
+        """Closes the sync connection pool (reopened on the next call)."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self):
+        """Closes the current event loop's async connection pool."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+def _parse_event(line: str) -> Optional[str]:
+    """Returns the content delta of a server-sent chunk ("" for other lines), or None at the end of the stream."""
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+_client = NIMClient()
+
+def get_nim_client() -> NIMClient:
+    """Returns the process-wide pooled NIM client."""
+    return _client
+
+class ChatNIM(BaseChatModel):
+    """
+    LangChain chat model for NIM endpoints on top of the shared NIMClient, with native sync and async
+    calls and token streaming (so graph.astream(stream_mode="messages") receives tokens as they arrive).
+    """
+
+    model: str = Field(default_factory=lambda: ModelConfig.LLM_MODEL)
+    base_url: str = Field(default_factory=lambda: ModelConfig.NVIDIA_BASE_URL)
+    api_key: Optional[str] = Field(default_factory=lambda: ModelConfig.NVIDIA_API_KEY, repr=False)
+    temperature: float = 0.0
+    top_p: Optional[float] = None
+    max_tokens: int = 1024
+    client: Any = Field(default=None, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "nvidia-nim"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "base_url": self.base_url, "temperature": self.temperature, "top_p": self.top_p, "max_tokens": self.max_tokens}
+
+    @property
+    def nim_client(self) -> NIMClient:
+        return self.client or get_nim_client()
+
+    def _request(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool, **kwargs):
+        payload = {
+            "model": self.model,
+            "messages": [{"role": _ROLES.get(m.type, "user"), "content": m.content} for m in messages],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": stream,
+        }
+        if self.top_p is not None:
+            payload["top_p"] = self.top_p
+        if stop:
+            payload["stop"] = stop
+        payload.update(kwargs)
+        headers = {"Accept": "text/event-stream" if stream else "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return f"{self.base_url.rstrip('/')}/chat/completions", payload, headers
+
+    @staticmethod
+    def _result(data: Dict[str, Any]) -> ChatResult:
+        content = data["choices"][0]["message"].get("content") or ""
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))], llm_output={"model": data.get("model")})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        return self._result(self.nim_client.chat(*self._request(messages, stop, False, **kwargs)))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        return self._result(await self.nim_client.achat(*self._request(messages, stop, False, **kwargs)))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for token in self.nim_client.stream_chat(*self._request(messages, stop, True, **kwargs)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        async for token in self.nim_client.astream_chat(*self._request(messages, stop, True, **kwargs)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,132 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Optional
+from src.config import AppConfig
+
+class TokenBucket:
+    """
+    Request rate limiter: `rate` requests per second on average, bursts of up to `burst`.
+    Callers reserve a token and sleep until it is due, so waiting requests are spread out in arrival order.
+    Shared by threads and event loops (the reservation is taken under a lock, the wait happens outside it).
+    """
+
+    def __init__(self, rate: float = None, burst: int = None):
+        self.rate = AppConfig.NIM_RATE_LIMIT_PER_SECOND if rate is None else rate
+        self.burst = burst or AppConfig.NIM_RATE_LIMIT_BURST
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how many seconds to wait before using it (0 when unlimited)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+class _Waiter:
+    """A caller queued for a concurrency slot: a thread (Event) or a coroutine (future on its loop)."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Caps the requests in flight and adapts the cap to what the endpoint sustains (AIMD):
+    - a throttled response (429/503) halves the cap;
+    - a response slower than `latency_tolerance` x the best latency seen shrinks it by 10%;
+    - otherwise it grows by about one slot per window of `limit` requests.
+    Slots are handed to waiters in arrival order, threads and coroutines alike.
+    """
+
+    def __init__(self, initial: int = None, minimum: int = None, maximum: int = None, latency_tolerance: float = None):
+        self.minimum = minimum or AppConfig.NIM_CONCURRENCY_MIN
+        self.maximum = maximum or AppConfig.NIM_CONCURRENCY_MAX
+        self.limit = float(min(max(initial or AppConfig.NIM_CONCURRENCY_INITIAL, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance or AppConfig.NIM_LATENCY_TOLERANCE
+        self.best_latency: Optional[float] = None
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._has_room():
+                self.in_flight += 1
+                return
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+        waiter.event.wait()  # The slot is handed over by `release`
+
+    async def aacquire(self):
+        with self._lock:
+            if self._has_room():
+                self.in_flight += 1
+                return
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release()  # Cancelled after the slot was handed over: pass it on
+            raise
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False):
+        """Frees a slot. `latency` (seconds to the response) and `throttled` feed the cap."""
+        with self._lock:
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                # The best latency decays slowly, so a permanently slower endpoint becomes the new normal
+                self.best_latency = latency if self.best_latency is None else min(latency, self.best_latency * 1.01)
+                if latency > self.best_latency * self.latency_tolerance:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.in_flight -= 1
+            while self._waiters and self._has_room():
+                self.in_flight += 1
+                self._waiters.popleft().wake()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter for retry `attempt` (0-based), never shorter than a server's Retry-After."""
+    base = base or AppConfig.NIM_BACKOFF_BASE_SECONDS
+    cap = cap or AppConfig.NIM_BACKOFF_MAX_SECONDS
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
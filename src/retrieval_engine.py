@@ -1,60 +1,383 @@
 import os
-import pickle
-from typing import List, Optional
+import json
+from typing import Any, List, Optional, Tuple
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.retrievers import BM25Retriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
 from langchain.retrievers import EnsembleRetriever
 from langchain.docstore.document import Document
-from sentence_transformers import CrossEncoder
 from src.config import AppConfig, ModelConfig
+from src.model_registry import get_embeddings, get_reranker
+from src.cache import LRUCache
+from src.hashing import chunk_id
+from src.bm25_index import BM25Index, BM25IndexRetriever
+from src.answer_cache import bump_kb_version
+from src.ann_index import (
+    IndexSpec, load_index_spec, save_index_spec, index_type_of, matches_spec, is_ready, apply_search_params, rebuild_store,
+    load_store_readonly,
+)
+from src.snapshots import (
+    SnapshotHold, StaleGenerationError, current_dir, current_generation, hold_current, begin_generation, publish, discard_generation,
+    collect_garbage,
+)
+
+TOMBSTONE_FILE = "faiss_tombstones.json"  # IDs deleted from a generation's FAISS index and docstore, not yet compacted
+PUBLISH_ATTEMPTS = 5  # Flushes replayed onto a newer generation before giving up to concurrent writers
+
+# Shared across engines/sessions: (query, chunk_id) -> cross-encoder score
+_rerank_score_cache = LRUCache(AppConfig.RERANK_CACHE_SIZE)
+
+class TombstoneFilteredRetriever(BaseRetriever):
+    """
+    LangChain retriever over a FAISS store that skips tombstoned chunks.
+    Over-fetches (doubling) until k live chunks are found or the whole index has been searched.
+    """
+
+    store: Any
+    tombstones: Any
+    k: int = 10
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if not self.tombstones:
+            return self.store.similarity_search(query, k=self.k)
+        ntotal = self.store.index.ntotal
+        vector = np.asarray([self.store.embeddings.embed_query(query)], dtype=np.float32)
+        fetch_k = self.k
+        while True:
+            fetch_k = min(2 * fetch_k, ntotal)
+            _, positions = self.store.index.search(vector, fetch_k)
+            ids = [self.store.index_to_docstore_id[p] for p in positions[0] if p != -1]
+            live = [i for i in ids if i not in self.tombstones]
+            if len(live) >= self.k or fetch_k >= ntotal:
+                return [self.store.docstore.search(i) for i in live[:self.k]]
 
 class RetrievalEngine:
     """Handles Hybrid Search and Reranking."""
 
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name=ModelConfig.EMBEDDING_MODEL)
         self.vector_store: Optional[FAISS] = None
-        self.reranker = CrossEncoder(ModelConfig.RERANKER_MODEL)
-        self.bm25_retriever: Optional[BM25Retriever] = None
+        self.bm25_index: Optional[BM25Index] = None
+        self.bm25_retriever: Optional[BM25IndexRetriever] = None
+        self.snapshot: Optional[SnapshotHold] = None
+        self.tombstones: set = set()
+
+    @property
+    def embeddings(self):
+        """Shared embedding model, loaded once per process."""
+        return get_embeddings()
 
-    def initialize_vector_store(self, text_chunks: List[Document], save_path: str):
+    @property
+    def reranker(self):
+        """Shared cross-encoder, loaded once per process."""
+        return get_reranker()
+
+    def initialize_vector_store(self, text_chunks: List[Document], save_path: str, removed_ids: Optional[List[str]] = None):
         """
         Initializes or upgrades variables for the vector store.
+        Chunks are stored under their chunk_id; chunks already stored are skipped and
+        `removed_ids` (e.g. chunks of a changed file that no longer exist) are deleted.
         """
-        # Create FAISS Vector Store
-        if os.path.exists(os.path.join(save_path, "index.faiss")):
-             self.vector_store = FAISS.load_local(save_path, self.embeddings, allow_dangerous_deserialization=True)
-             if text_chunks:
-                 new_store = FAISS.from_documents(text_chunks, embedding=self.embeddings)
-                 self.vector_store.merge_from(new_store)
-                 self.vector_store.save_local(save_path)
-        else:
-             if text_chunks:
-                self.vector_store = FAISS.from_documents(text_chunks, embedding=self.embeddings)
-                self.vector_store.save_local(save_path)
-        
-        # Handle BM25 Retriever Persistence
-        bm25_path = os.path.join(save_path, "bm25.pkl")
-        
+        self.open_store(save_path)
+        if removed_ids:
+            self.remove_chunks(removed_ids)
         if text_chunks:
-             # Create and Save BM25
-             self.bm25_retriever = BM25Retriever.from_documents(text_chunks)
-             self.bm25_retriever.k = 10
-             with open(bm25_path, "wb") as f:
-                 pickle.dump(self.bm25_retriever, f)
-        elif os.path.exists(bm25_path):
-             # Load BM25
-             with open(bm25_path, "rb") as f:
-                 self.bm25_retriever = pickle.load(f)
-             self.bm25_retriever.k = 10
+            self.add_chunks(text_chunks)
+        self.flush(save_path)
+
+    def open_store(self, save_path: str, index_spec: Optional[IndexSpec] = None):
+        """
+        Loads the published FAISS store and BM25 index at save_path (if any) for querying or appending.
+        The FAISS index layout is `index_spec` if given, else the one saved with the knowledgebase,
+        else the AppConfig defaults. A changed layout is applied (rebuilt) on the next `flush`.
+        """
+        self._release_snapshot()
+        self.snapshot = hold_current(save_path)
+        source = self.snapshot.path
+        stored_spec = load_index_spec(source)
+        self.index_spec = index_spec or stored_spec or IndexSpec.from_config()
+        self._spec_changed = self.index_spec != stored_spec
+        self._pending_bm25: List[Document] = []
+        self._pending_bm25_ids: List[str] = []
+        self._pending_removals: List[str] = []
+        # Sets over the two pending lists above, so a batch is checked without scanning them
+        self._queued_ids: set = set()
+        self._removed_ids: set = set()
+        self._dirty = False
+        self._content_changed = False
+        self._compact_bm25 = False
+        self._requested_spec = index_spec
+        # Changes since the last flush, replayed onto a newer generation if another writer publishes first
+        self._pending_ops: List[Tuple[str, Any]] = []
+        self.tombstones = _load_tombstones(source)
+        # Knowledgebases written before generations existed are republished as one on the next flush
+        self._migrate = self.snapshot.generation is None and os.path.exists(os.path.join(source, "index.faiss"))
+
+        if os.path.exists(os.path.join(source, "index.faiss")):
+             self.vector_store = FAISS.load_local(source, self.embeddings, allow_dangerous_deserialization=True)
+             apply_search_params(self.vector_store.index, self.index_spec)
+        else:
+             self.vector_store = None
+
+        # BM25 Index Persistence (append-only segments under <generation>/bm25)
+        bm25_path = os.path.join(source, "bm25")
+        self._bm25_rebuild = not BM25Index.exists(bm25_path)
+        if not self._bm25_rebuild:
+             self.bm25_index = BM25Index.load(bm25_path)
+        else:
+             # No keyword index yet (new DB, or a legacy bm25.pkl built from a single upload):
+             # index every chunk in the FAISS docstore. An index in an older on-disk format is rebuilt the same way.
+             self.bm25_index = BM25Index()
+             if self.vector_store is not None:
+                 self._pending_bm25_ids = self._live_docstore_ids()
+                 self._pending_bm25 = self._docstore_documents()
+                 self._queued_ids = set(self._pending_bm25_ids)
+
+        self.bm25_retriever = BM25IndexRetriever(index=self.bm25_index, k=10) if len(self.bm25_index) else None
+
+    def open_readonly(self, save_path: str):
+        """
+        Opens the published generation of the knowledgebase at save_path for querying only, holding it
+        until `close`. The FAISS index and BM25 segments are memory-mapped, so the engine can be shared
+        across sessions.
+        """
+        source = current_dir(save_path)
+        if os.path.exists(os.path.join(source, "index.faiss")) and (
+            current_generation(save_path) is None or not BM25Index.exists(os.path.join(source, "bm25"))
+        ):
+            # Pre-generations layout, or a BM25 index in an older format: upgrade it once through the writable path
+            self.initialize_vector_store(None, save_path)
+
+        self._release_snapshot()
+        self.snapshot = hold_current(save_path)
+        source = self.snapshot.path
+        if os.path.exists(os.path.join(source, "index.faiss")):
+            self.vector_store = load_store_readonly(source, self.embeddings)
+        else:
+            self.vector_store = None
+        self.tombstones = _load_tombstones(source)
+        bm25_path = os.path.join(source, "bm25")
+        self.bm25_index = BM25Index.load(bm25_path) if BM25Index.exists(bm25_path) else None
+        self.bm25_retriever = BM25IndexRetriever(index=self.bm25_index, k=10) if self.bm25_index is not None and len(self.bm25_index) else None
+
+    @property
+    def generation(self) -> Optional[str]:
+        """Name of the generation this engine has open (None before the first publish)."""
+        return self.snapshot.generation if self.snapshot is not None else None
+
+    def close(self):
+        """Releases the held generation so it can be collected once superseded."""
+        self._release_snapshot()
+
+    def _release_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.release()
+            self.snapshot = None
+
+    def add_chunks(self, text_chunks: List[Document]) -> int:
+        """
+        Embeds chunks into the in-memory FAISS store and queues them for BM25, skipping chunks already stored.
+        Nothing is written until `flush`. Returns the number of chunks embedded.
+        """
+        self._pending_ops.append(("add", list(text_chunks)))
+        batch_ids = {chunk_id(c) for c in text_chunks}
+
+        # A chunk may already be in BM25 but not FAISS (or vice versa) after an interrupted run.
+        queued = self._unique_chunks(text_chunks, exclude=self._in_bm25(batch_ids))
+        self._pending_bm25.extend(queued)
+        self._pending_bm25_ids.extend(chunk_id(c) for c in queued)
+        self._queued_ids.update(chunk_id(c) for c in queued)
+        self._content_changed = self._content_changed or bool(queued)
+        new_chunks = self._unique_chunks(text_chunks, exclude=self._stored_among(batch_ids))
+        # Deleted but not yet compacted: IDs are content hashes, so the stored vector is still valid
+        revived = {chunk_id(c) for c in new_chunks} & self.tombstones
+        if revived:
+            self.tombstones.difference_update(revived)
+            new_chunks = [c for c in new_chunks if chunk_id(c) not in revived]
+            self._dirty = self._content_changed = True
+        if not new_chunks:
+            return 0
+
+        ids = [chunk_id(c) for c in new_chunks]
+        if self.vector_store is None:
+            self.vector_store = FAISS.from_documents(new_chunks, embedding=self.embeddings, ids=ids)
+        else:
+            self.vector_store.add_documents(new_chunks, ids=ids)
+        self._dirty = self._content_changed = True
+        return len(new_chunks)
+
+    def remove_chunks(self, ids: List[str]):
+        """
+        Deletes chunks by ID. FAISS entries and their docstore documents are tombstoned and filtered out at
+        query time until `compact`; BM25 deletions (also tombstones) are queued for `flush`.
+        """
+        targets = set(ids)
+        if not targets:
+            return
+        self._pending_ops.append(("remove", list(ids)))
+        stale_ids = self._stored_among(targets)
+        if stale_ids:
+            self.tombstones.update(stale_ids)
+            self._dirty = True
+        if targets & self._queued_ids:
+            queued = [(doc, i) for doc, i in zip(self._pending_bm25, self._pending_bm25_ids) if i not in targets]
+            self._pending_bm25 = [doc for doc, _ in queued]
+            self._pending_bm25_ids = [i for _, i in queued]
+            self._queued_ids.difference_update(targets)
+        self._pending_removals.extend(ids)
+        self._removed_ids.update(targets)
+        self._content_changed = True
+
+    def tombstone_ratio(self) -> float:
+        """Share of stored chunks that are deleted but still take space in the FAISS index or BM25 segments."""
+        ratios = [0.0]
+        if self.vector_store is not None and self.vector_store.index.ntotal:
+            ratios.append(len(self.tombstones) / self.vector_store.index.ntotal)
+        if self.bm25_index is not None and self.bm25_index.n_docs:
+            ratios.append(1 - len(self.bm25_index) / self.bm25_index.n_docs)
+        return max(ratios)
+
+    def compact(self):
+        """
+        Physically drops deleted chunks: the FAISS index and docstore are rebuilt without tombstoned chunks
+        now, and BM25 segments holding deleted documents are rewritten on the next `flush`.
+        """
+        self._pending_ops.append(("compact", None))
+        if self.vector_store is not None and self.tombstones:
+            if index_type_of(self.vector_store.index) == "flat":
+                self.vector_store.delete(list(self.tombstones & set(self.vector_store.index_to_docstore_id.values())))
+            else:
+                # HNSW cannot remove vectors, and IVF removal leaves gaps in the position -> id mapping
+                rebuild_store(self.vector_store, self.index_spec, exclude_ids=self.tombstones)
+            self.tombstones = set()
+            self._dirty = True
+        self._compact_bm25 = True
+
+    def flush(self, save_path: str, expected_generation: Optional[str] = None):
+        """
+        Publishes pending changes as a new generation: the BM25 segments of the opened one are linked in,
+        pending BM25 changes applied, the FAISS store saved, and CURRENT switched over in one rename.
+        Readers keep the generation they hold; superseded generations are collected once released.
+        Does nothing when there are no changes. A generation only replaces the one this store was opened
+        from: if another writer published first, the store is reopened at the newer generation and the
+        pending changes are replayed onto it (their embeddings come back from the embedding cache).
+        With `expected_generation`, raises StaleGenerationError (publishing nothing) instead of replaying.
+        """
+        for attempt in range(PUBLISH_ATTEMPTS):
+            try:
+                self._publish(save_path, expected_generation)
+                return
+            except StaleGenerationError:
+                if expected_generation is not None or attempt == PUBLISH_ATTEMPTS - 1:
+                    raise
+                self._rebase(save_path)
+
+    def _publish(self, save_path: str, expected_generation: Optional[str]):
+        if self.vector_store is not None and self._needs_rebuild():
+            # New chunks always land in the current index; switch to the configured layout once it can be built
+            rebuild_store(self.vector_store, self.index_spec, exclude_ids=self.tombstones)
+            self.tombstones = set()
+            self._dirty = True
+        compact_bm25 = self._compact_bm25 and self.bm25_index is not None and len(self.bm25_index) < self.bm25_index.n_docs
+        changed = bool(
+            self._pending_bm25 or self._pending_removals or self._dirty or self._migrate or compact_bm25
+            or (self._spec_changed and self.vector_store is not None)
+        )
+        if not changed:
+            self._pending_ops = []
+            return
+
+        base = self.generation or ""
+        staging = begin_generation(save_path, link_bm25=not self._bm25_rebuild, base=self.snapshot.path)
+        try:
+            bm25_path = os.path.join(staging.path, "bm25")
+            bm25_index = BM25Index.load(bm25_path) if BM25Index.exists(bm25_path) else BM25Index(bm25_path)
+            # Deletes first: a chunk removed and then re-added before this flush is queued again
+            if self._pending_removals:
+                bm25_index.delete(self._pending_removals)
+            if self._pending_bm25:
+                bm25_index.add_documents(self._pending_bm25, ids=self._pending_bm25_ids)
+            if compact_bm25:
+                bm25_index.compact()
+            bm25_index.save()  # An empty index still gets its meta file
+            if self.vector_store is not None:
+                self.vector_store.save_local(staging.path)
+                _save_tombstones(staging.path, self.tombstones)
+            save_index_spec(staging.path, self.index_spec)
+            publish(save_path, staging, expected=base if expected_generation is None else expected_generation)
+        except BaseException:
+            discard_generation(staging)
+            raise
+
+        self._release_snapshot()
+        self.snapshot = staging
+        collect_garbage(save_path)
+        if self._content_changed or self._pending_bm25 or self._pending_removals:
+            bump_kb_version(save_path)  # Invalidates cached answers for this knowledgebase
+
+        self.bm25_index = BM25Index.load(os.path.join(staging.path, "bm25"))  # Renamed when published
+        self._pending_bm25, self._pending_bm25_ids, self._pending_removals, self._pending_ops = [], [], [], []
+        self._queued_ids, self._removed_ids = set(), set()
+        self._dirty = self._content_changed = self._compact_bm25 = False
+        self._spec_changed = self._migrate = self._bm25_rebuild = False
+        self.bm25_retriever = BM25IndexRetriever(index=self.bm25_index, k=10) if len(self.bm25_index) else None
+
+    def _rebase(self, save_path: str):
+        """Reopens the latest published generation and replays the changes made since the last flush."""
+        ops = self._pending_ops
+        self.open_store(save_path, index_spec=self._requested_spec)
+        for op, arg in ops:
+            if op == "add":
+                self.add_chunks(arg)
+            elif op == "remove":
+                self.remove_chunks(arg)
+            else:
+                self.compact()
+
+    def _needs_rebuild(self) -> bool:
+        index = self.vector_store.index
+        if index_type_of(index) == self.index_spec.index_type:
+            return not matches_spec(index, self.index_spec)
+        return is_ready(self.index_spec, index.ntotal)
+
+    @staticmethod
+    def _unique_chunks(text_chunks: Optional[List[Document]], exclude: Optional[set] = None) -> List[Document]:
+        """Drops chunks whose ID is already stored (or repeated within the batch)."""
+        seen = set(exclude or ())
+        unique = []
+        for chunk in text_chunks or []:
+            cid = chunk_id(chunk)
+            if cid not in seen:
+                seen.add(cid)
+                unique.append(chunk)
+        return unique
+
+    def _stored_among(self, ids: set) -> set:
+        """The IDs among `ids` stored in FAISS and not deleted (docstore lookups, proportional to the batch)."""
+        if self.vector_store is None:
+            return set()
+        docstore = self.vector_store.docstore
+        return {i for i in ids if i not in self.tombstones and isinstance(docstore.search(i), Document)}
+
+    def _in_bm25(self, ids: set) -> set:
+        """The IDs among `ids` that BM25 will hold after the next flush (indexed and not removed, or queued)."""
+        return (self.bm25_index.live_ids_among(ids) - self._removed_ids) | (ids & self._queued_ids)
+
+    def _live_docstore_ids(self) -> List[str]:
+        """IDs of the chunks held by the FAISS docstore and not deleted, in index order."""
+        return [i for i in self.vector_store.index_to_docstore_id.values() if i not in self.tombstones]
+
+    def _docstore_documents(self) -> List[Document]:
+        """Returns the chunks held by the FAISS docstore and not deleted, in index order."""
+        docstore = self.vector_store.docstore
+        return [docstore.search(doc_id) for doc_id in self._live_docstore_ids()]
 
     def get_hybrid_retriever(self):
         """Returns an EnsembleRetriever (BM25 + FAISS)."""
         if not self.vector_store or not self.bm25_retriever:
             raise ValueError("Retrievers not initialized. Please process documents first.")
         
-        faiss_retriever = self.vector_store.as_retriever(search_kwargs={"k": 10})
+        faiss_retriever = TombstoneFilteredRetriever(store=self.vector_store, tombstones=self.tombstones, k=10)
         
         ensemble_retriever = EnsembleRetriever(
             retrievers=[self.bm25_retriever, faiss_retriever],
@@ -62,22 +385,58 @@ class RetrievalEngine:
         )
         return ensemble_retriever
 
-    def rerank_documents(self, query: str, documents: List[Document], top_k: int = 5) -> List[Document]:
+    def rerank_documents(
+        self,
+        query: str,
+        documents: List[Document],
+        top_k: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+    ) -> List[Document]:
         """
         Reranks retrieved documents using a Cross-Encoder.
+        Scores are cached per (query, chunk_id), so only unseen pairs reach the model,
+        and those are scored in batches of AppConfig.RERANK_BATCH_SIZE.
+        Keeps the top_k documents, optionally dropping those scoring below score_threshold.
         """
         if not documents:
             return []
 
-        # Prepare pairs for cross-encoder
-        pairs = [[query, doc.page_content] for doc in documents]
-        scores = self.reranker.predict(pairs)
-        
-        # Attach scores to documents for debugging/sorting
-        for doc, score in zip(documents, scores):
-            doc.metadata["score"] = score
+        top_k = top_k if top_k is not None else AppConfig.RERANK_TOP_K
+        if score_threshold is None:
+            score_threshold = AppConfig.RERANK_SCORE_THRESHOLD
+
+        keys = [(query, chunk_id(doc)) for doc in documents]
+        scores = [_rerank_score_cache.get(key) for key in keys]
+
+        # Prepare pairs for cross-encoder (cache misses only)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [[query, documents[i].page_content] for i in missing]
+            predicted = self.reranker.predict(pairs, batch_size=AppConfig.RERANK_BATCH_SIZE)
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                _rerank_score_cache.put(keys[i], scores[i])
+
+        # Attach scores to copies so shared docstore objects are not mutated
+        scored_docs = [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "score": score})
+            for doc, score in zip(documents, scores)
+        ]
 
         # Sort by score descending
-        sorted_docs = sorted(documents, key=lambda x: x.metadata["score"], reverse=True)
+        sorted_docs = sorted(scored_docs, key=lambda x: x.metadata["score"], reverse=True)
+        if score_threshold is not None:
+            sorted_docs = [d for d in sorted_docs if d.metadata["score"] >= score_threshold]
         
         return sorted_docs[:top_k]
+
+def _load_tombstones(path: str) -> set:
+    try:
+        with open(os.path.join(path, TOMBSTONE_FILE), "r", encoding="utf-8") as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+
+def _save_tombstones(path: str, ids: set):
+    with open(os.path.join(path, TOMBSTONE_FILE), "w", encoding="utf-8") as f:
+        json.dump(sorted(ids), f)
@@ -0,0 +1,174 @@
+import re
+import time
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from langchain_core.prompts import PromptTemplate
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from src.config import AppConfig
+
+ROUTE_PROMPT = PromptTemplate(
+    template="""You are an expert at routing a user question to a vectorstore or general chat. \n
+    Use the vectorstore for questions on specific topics or documents. \n
+    Query: {question} \n
+    Return a JSON with a single key 'datasource' and value 'vectorstore' or 'chat'.""",
+    input_variables=["question"]
+)
+
+# Labelled prototype queries for the embedding classifier
+PROTOTYPES: Dict[str, List[str]] = {
+    "vectorstore": [
+        "What does the document say about the project timeline?",
+        "Summarize the main findings of the report.",
+        "According to the uploaded file, what is the total revenue?",
+        "Which section describes the installation steps?",
+        "List the requirements mentioned in the specification.",
+        "Who is responsible for the budget in the contract?",
+        "Explain the methodology used in the paper.",
+        "What are the key risks identified in the analysis?",
+        "Find the figures reported for the last quarter.",
+        "What is the definition of the term used on page 3?",
+    ],
+    "chat": [
+        "Hi there!",
+        "Hello, how are you?",
+        "Thanks a lot!",
+        "Good morning",
+        "Who are you?",
+        "What can you do?",
+        "Tell me a joke.",
+        "Bye, see you later.",
+        "Nice, that was helpful.",
+        "How is your day going?",
+    ],
+}
+
+_CHAT_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|great|bye|goodbye|good (morning|afternoon|evening|night))\b([\s,!]+\w+){0,2}[\s!.?]*$",
+    re.IGNORECASE,
+)
+_RAG_PATTERN = re.compile(
+    r"\b(document|documents|file|files|pdf|report|page|section|table|sheet|requirements?|according to|uploaded|summari[sz]e|explain|describe|list|knowledge ?base)\b",
+    re.IGNORECASE,
+)
+
+@dataclass
+class RouteDecision:
+    """Outcome of routing one question."""
+    datasource: str  # 'vectorstore' or 'chat'
+    method: str  # 'rules', 'embedding' or 'llm'
+    latency_ms: float
+    margin: Optional[float] = None  # Similarity margin (vectorstore - chat) for embedding decisions
+
+class QueryRouter:
+    """
+    Routes a question to the vectorstore or to general chat, cheapest signal first:
+    1. Rules: greetings/thanks go to chat, explicit references to documents go to the vectorstore.
+    2. Embeddings: cosine similarity to labelled prototype queries, using the shared MiniLM model.
+    3. LLM: only when the embedding margin is below AppConfig.ROUTER_MARGIN.
+    An unusable embedding or LLM answer falls back to the vectorstore, as most traffic is document
+    questions; NIM request failures (after the client's retries) propagate to the caller.
+    """
+
+    def __init__(self, embeddings_provider: Callable[[], object], llm=None, margin: float = None):
+        self.embeddings_provider = embeddings_provider
+        self.llm = llm
+        self.margin = AppConfig.ROUTER_MARGIN if margin is None else margin
+        self._lock = threading.Lock()
+        self._prototypes: Optional[Dict[str, np.ndarray]] = None
+
+    def route(self, question: str) -> RouteDecision:
+        start = time.perf_counter()
+        datasource, method, margin = self._route(question)
+        return RouteDecision(datasource, method, (time.perf_counter() - start) * 1000, margin)
+
+    async def aroute(self, question: str) -> RouteDecision:
+        """Async `route`: the embedding runs on a worker thread and the LLM call is awaited."""
+        start = time.perf_counter()
+        decision = self._route_by_rules(question)
+        if decision is None:
+            margin = await asyncio.to_thread(self._margin, question)
+            decision = self._route_by_margin(margin)
+            if decision is None:
+                decision = (await self._aroute_with_llm(question), "llm", margin)
+        datasource, method, margin = decision
+        return RouteDecision(datasource, method, (time.perf_counter() - start) * 1000, margin)
+
+    def _route(self, question: str):
+        decision = self._route_by_rules(question)
+        if decision is None:
+            margin = self._margin(question)
+            decision = self._route_by_margin(margin)
+            if decision is None:
+                decision = (self._route_with_llm(question), "llm", margin)
+        return decision
+
+    @staticmethod
+    def _route_by_rules(question: str):
+        # An explicit document reference wins over a greeting prefix ("Hi, summarize the report")
+        if _RAG_PATTERN.search(question):
+            return "vectorstore", "rules", None
+        if _CHAT_PATTERN.match(question):
+            return "chat", "rules", None
+        return None
+
+    def _margin(self, question: str) -> Optional[float]:
+        try:
+            return self.similarity_margin(question)
+        except Exception:
+            return None
+
+    def _route_by_margin(self, margin: Optional[float]):
+        """Decides from the embedding margin, or returns None when the LLM should decide."""
+        if margin is not None and abs(margin) >= self.margin:
+            return ("vectorstore" if margin > 0 else "chat"), "embedding", margin
+        if self.llm is None:
+            return ("chat" if margin is not None and margin < 0 else "vectorstore"), "embedding", margin
+        return None
+
+    def similarity_margin(self, question: str) -> float:
+        """Best vectorstore-prototype similarity minus best chat-prototype similarity."""
+        prototypes = self._prototype_vectors()
+        query = self._normalize(np.asarray([self.embeddings_provider().embed_query(question)], dtype=np.float32))[0]
+        scores = {label: float(np.max(vectors @ query)) for label, vectors in prototypes.items()}
+        return scores["vectorstore"] - scores["chat"]
+
+    def _prototype_vectors(self) -> Dict[str, np.ndarray]:
+        # Embedded once per router and reused for every question
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    embeddings = self.embeddings_provider()
+                    self._prototypes = {
+                        label: self._normalize(np.asarray(embeddings.embed_documents(queries), dtype=np.float32))
+                        for label, queries in PROTOTYPES.items()
+                    }
+        return self._prototypes
+
+    def _route_with_llm(self, question: str) -> str:
+        chain = ROUTE_PROMPT | self.llm | JsonOutputParser()
+        try:
+            source = chain.invoke({"question": question})
+        except OutputParserException:
+            return "vectorstore"
+        return _llm_decision(source)
+
+    async def _aroute_with_llm(self, question: str) -> str:
+        chain = ROUTE_PROMPT | self.llm | JsonOutputParser()
+        try:
+            source = await chain.ainvoke({"question": question})
+        except OutputParserException:
+            return "vectorstore"
+        return _llm_decision(source)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+def _llm_decision(source) -> str:
+    """Reads the LLM router's JSON; anything but an explicit 'chat' goes to the vectorstore."""
+    return "chat" if isinstance(source, dict) and source.get("datasource") == "chat" else "vectorstore"
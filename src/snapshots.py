@@ -0,0 +1,224 @@
+import os
+import re
+import uuid
+import shutil
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishing stays atomic, but held generations are not protected from collection
+    fcntl = None
+
+# Every write to a knowledgebase goes into a fresh generations/gen-NNNNNN directory. Once it is complete,
+# CURRENT is atomically replaced to name it, so readers always open one whole generation (FAISS index,
+# docstore and BM25 segments that belong together). Readers hold a shared lock on their generation;
+# older generations are deleted once nobody holds them.
+CURRENT_FILE = "CURRENT"
+GENERATIONS_DIR = "generations"
+LOCK_FILE = ".lock"
+# Index files of a knowledgebase written before generations existed (kept at the KB root)
+LEGACY_ENTRIES = ("index.faiss", "index.pkl", "index_config.json", "bm25", "bm25.pkl")
+
+WRITER_LOCK_FILE = ".writer.lock"
+_GENERATION_PATTERN = re.compile(r"^gen-(\d{6})$")
+_STAGING_PATTERN = re.compile(r"^staging-[0-9a-f]{32}$")
+
+class SnapshotHold:
+    """
+    A reader's shared lock on one generation; `collect_garbage` skips generations that are held.
+    Locks are advisory `flock`s, so they also protect readers in other processes.
+    """
+
+    def __init__(self, path: str, lock_file=None):
+        self.path = path
+        self._lock_file = lock_file
+
+    @property
+    def generation(self) -> Optional[str]:
+        """The held generation's name, or None for a staging directory or a pre-generations knowledgebase root."""
+        name = os.path.basename(self.path)
+        return name if _GENERATION_PATTERN.match(name) else None
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()  # Closing the file drops the flock
+            self._lock_file = None
+
+def current_generation(db_path: str) -> Optional[str]:
+    """Name of the published generation, or None for an empty or pre-generations knowledgebase."""
+    try:
+        with open(os.path.join(db_path, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def current_dir(db_path: str) -> str:
+    """Directory holding the published index files (the KB root for pre-generations knowledgebases)."""
+    generation = current_generation(db_path)
+    return os.path.join(db_path, GENERATIONS_DIR, generation) if generation else db_path
+
+def hold_current(db_path: str, retries: int = 3) -> SnapshotHold:
+    """Holds the published generation (or the KB root of a pre-generations knowledgebase)."""
+    for _ in range(retries):
+        generation = current_generation(db_path)
+        if generation is None:
+            return SnapshotHold(db_path)
+        hold = hold_generation(os.path.join(db_path, GENERATIONS_DIR, generation))
+        if hold is not None:
+            return hold
+        # Superseded and collected between reading CURRENT and locking it: read CURRENT again
+    raise RuntimeError(f"Could not hold a generation of '{db_path}': it is being replaced too quickly.")
+
+def hold_generation(generation_path: str) -> Optional[SnapshotHold]:
+    """Holds a generation directory, or returns None if it has already been collected."""
+    try:
+        lock_file = open(os.path.join(generation_path, LOCK_FILE), "rb")
+    except FileNotFoundError:
+        return None
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH)
+    if not os.path.exists(os.path.join(generation_path, LOCK_FILE)):
+        lock_file.close()  # Collected while we waited for the lock
+        return None
+    return SnapshotHold(generation_path, lock_file)
+
+class StaleGenerationError(RuntimeError):
+    """Raised by `publish` when another write was published since the expected generation."""
+
+def begin_generation(db_path: str, link_bm25: bool = True, base: Optional[str] = None) -> SnapshotHold:
+    """
+    Creates an unpublished staging directory for the next generation and returns the writer's hold on it.
+    The BM25 segments of `base` (the directory the writer opened; the current generation by default) are
+    hard-linked into it rather than copied: segments are immutable, and the BM25 meta and tombstone files
+    are only ever replaced by rename, never rewritten in place.
+    """
+    generations_dir = os.path.join(db_path, GENERATIONS_DIR)
+    # Locked before `collect_garbage` can see it and take it for an abandoned staging directory
+    with writer_lock(db_path):
+        path = os.path.join(generations_dir, f"staging-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        open(os.path.join(path, LOCK_FILE), "w").close()
+        staging = hold_generation(path)
+
+    source = os.path.join(base or current_dir(db_path), "bm25")
+    if link_bm25 and os.path.isdir(source):
+        _link_tree(source, os.path.join(path, "bm25"))
+    return staging
+
+def publish(db_path: str, staging: SnapshotHold, expected: Optional[str] = None) -> str:
+    """
+    Numbers a complete staging directory as the next generation and atomically makes it the current one.
+    With `expected`, fails with StaleGenerationError unless that generation is still current ("" for a
+    knowledgebase with no generation yet), so a staging directory built from an older base never replaces
+    another writer's work. Follow with `collect_garbage`.
+    """
+    with writer_lock(db_path):
+        if expected is not None and (current_generation(db_path) or "") != expected:
+            raise StaleGenerationError(f"'{db_path}' was updated since generation {expected}.")
+        numbers = [number for number, _ in _generations(db_path)]
+        name = f"gen-{(max(numbers) + 1 if numbers else 1):06d}"
+        path = os.path.join(db_path, GENERATIONS_DIR, name)
+        os.rename(staging.path, path)  # The writer's lock follows the directory
+        staging.path = path
+
+        tmp_path = os.path.join(db_path, CURRENT_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(db_path, CURRENT_FILE))
+    return name
+
+def discard_generation(staging: SnapshotHold):
+    """Deletes an unpublished staging directory (a write that failed or lost to a newer one)."""
+    staging.release()
+    shutil.rmtree(staging.path, ignore_errors=True)
+
+def collect_garbage(db_path: str) -> List[str]:
+    """
+    Deletes generations older than the current one and abandoned staging directories that nobody holds,
+    plus pre-generations index files at the KB root. Returns the names of the deleted directories.
+    """
+    current = current_generation(db_path)
+    if current is None:
+        return []
+    current_number = int(_GENERATION_PATTERN.match(current).group(1))
+
+    deleted = []
+    generations_dir = os.path.join(db_path, GENERATIONS_DIR)
+    with writer_lock(db_path):
+        candidates = [name for number, name in _generations(db_path) if number < current_number]
+        if fcntl is not None:  # Without locks, an abandoned staging directory looks like one in use
+            candidates += sorted(n for n in os.listdir(generations_dir) if _STAGING_PATTERN.match(n))
+        for name in candidates:
+            path = os.path.join(generations_dir, name)
+            lock_file = _try_lock_exclusive(path)
+            if lock_file is None:
+                continue  # Still held by a reader or writer
+            try:
+                # The lock file goes first, so a reader racing for it sees the generation as collected
+                os.remove(os.path.join(path, LOCK_FILE))
+                shutil.rmtree(path, ignore_errors=True)
+            finally:
+                lock_file.close()
+            deleted.append(name)
+
+    for entry in LEGACY_ENTRIES:
+        path = os.path.join(db_path, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    return deleted
+
+def _generations(db_path: str) -> List[Tuple[int, str]]:
+    generations_dir = os.path.join(db_path, GENERATIONS_DIR)
+    if not os.path.isdir(generations_dir):
+        return []
+    found = []
+    for name in os.listdir(generations_dir):
+        match = _GENERATION_PATTERN.match(name)
+        if match:
+            found.append((int(match.group(1)), name))
+    return sorted(found)
+
+def _try_lock_exclusive(path: str):
+    """Returns the directory's lock file locked exclusively, or None if someone holds it."""
+    lock_path = os.path.join(path, LOCK_FILE)
+    if not os.path.exists(lock_path):
+        open(lock_path, "w").close()  # Left by an interrupted write; nobody can be holding it
+    lock_file = open(lock_path, "rb")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+@contextmanager
+def writer_lock(db_path: str):
+    """
+    Serializes numbering, publishing and collecting generations (and manifest updates) across threads
+    and processes. Held briefly; never across embedding or index building.
+    """
+    generations_dir = os.path.join(db_path, GENERATIONS_DIR)
+    os.makedirs(generations_dir, exist_ok=True)
+    with open(os.path.join(generations_dir, WRITER_LOCK_FILE), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield  # Closing the file releases the lock
+
+def _link_tree(source: str, destination: str):
+    for root, _, names in os.walk(source):
+        target_root = os.path.join(destination, os.path.relpath(root, source))
+        os.makedirs(target_root, exist_ok=True)
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            try:
+                os.link(os.path.join(root, name), os.path.join(target_root, name))
+            except OSError:  # No hard links on this filesystem
+                shutil.copy2(os.path.join(root, name), os.path.join(target_root, name))
@@ -0,0 +1,19 @@
+import streamlit as st
+from src.model_registry import get_registry, get_embeddings
+
+def render_loaded_models():
+    """Sidebar expander with the models loaded in this process and the embedding cache counters."""
+    with st.expander("🧩 Loaded Models"):
+        model_stats = get_registry().get_stats()
+        if model_stats:
+            for name, stat in model_stats.items():
+                st.caption(f"**{name}**: loaded in {stat['load_seconds']:.2f}s, +{stat['rss_mb']:.0f} MB RSS")
+        else:
+            st.caption("No models loaded yet.")
+        if get_registry().is_loaded("embeddings"):
+            embed_stats = get_embeddings().stats()
+            st.caption(
+                f"**Embedding cache**: {embed_stats.get('cache_entries', 0)} vectors, "
+                f"{embed_stats.get('cache_hits', 0)} reused, {embed_stats['encoded']} encoded "
+                f"({embed_stats['workers']} processes, batches of {embed_stats['batch_size']})"
+            )
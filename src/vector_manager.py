@@ -1,7 +1,26 @@
 import os
+import json
 import shutil
-from typing import List
+import threading
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Tuple, Optional
+from langchain.docstore.document import Document
 from src.config import AppConfig
+from src.hashing import file_hash
+from src.kb_pool import KnowledgebaseLease, get_knowledgebase_pool
+from src.retrieval_engine import RetrievalEngine
+from src.compaction import get_compactor
+from src.snapshots import writer_lock
+
+MANIFEST_FILE = "manifest.json"
+USAGE_FILE = "kb_usage.json"  # Per-knowledgebase open counts, used to pick what to pre-warm
+
+@dataclass
+class IngestionPlan:
+    """Which uploaded files need processing, based on their content hashes."""
+    files_to_process: List[Any] = field(default_factory=list)  # new or changed uploads
+    unchanged_files: List[str] = field(default_factory=list)
+    file_hashes: Dict[str, str] = field(default_factory=dict)
 
 class VectorStoreManager:
     """Manages multiple Vector Databases."""
@@ -38,3 +57,153 @@ class VectorStoreManager:
         path = self.get_db_path(db_name)
         if os.path.exists(path):
             shutil.rmtree(path)
+        get_knowledgebase_pool().discard(path)
+
+    def list_sources(self, db_name: str) -> List[str]:
+        """Returns the names of the files ingested into a database."""
+        return sorted(self.load_manifest(db_name)["files"])
+
+    def delete_sources(self, db_name: str, file_names: List[str]) -> int:
+        """
+        Removes ingested files from a database without rebuilding it. Their chunks are tombstoned in FAISS,
+        BM25 and the docstore (filtered out at query time), and a background compaction is scheduled once
+        enough of the database is deleted. Returns the number of chunks removed.
+        """
+        db_path = self.get_db_path(db_name)
+        if not os.path.isdir(db_path):
+            return 0
+        files = self.load_manifest(db_name)["files"]
+        removed = {name: files[name] for name in file_names if files.get(name)}
+        chunk_ids = [cid for entry in removed.values() for cid in entry["chunks"]]
+        if not chunk_ids:
+            return 0
+        # Tombstones are published first: if that fails the manifest still lists the files, and deleting
+        # them again only re-tombstones chunks that are already gone
+        engine = RetrievalEngine()
+        engine.open_store(db_path)
+        try:
+            engine.remove_chunks(chunk_ids)
+            engine.flush(db_path)
+            get_compactor().maybe_schedule(db_path, engine)
+        finally:
+            engine.close()
+        with writer_lock(db_path):
+            manifest = self.load_manifest(db_name)
+            for file_name, entry in removed.items():
+                # A file re-ingested meanwhile keeps its new entry
+                if manifest["files"].get(file_name) == entry:
+                    del manifest["files"][file_name]
+            self.save_manifest(db_name, manifest)
+        return len(chunk_ids)
+
+    def open_knowledgebase(self, db_name: str) -> KnowledgebaseLease:
+        """
+        Returns a lease on the latest published version of the knowledgebase, opened read-only and
+        shared with every other session in the process. Release it when switching databases.
+        """
+        self._record_usage(db_name)
+        return get_knowledgebase_pool().acquire(self.get_db_path(db_name))
+
+    def prewarm(self, count: int = None):
+        """Opens the most-used knowledgebases ahead of the first request (once per process, within the pool's budget)."""
+        count = AppConfig.KB_PREWARM_COUNT if count is None else count
+        if count <= 0:
+            return
+        usage = self._load_usage()
+        dbs = sorted(self.list_dbs(), key=lambda name: usage.get(name, 0), reverse=True)[:count]
+        get_knowledgebase_pool().prewarm([self.get_db_path(name) for name in dbs])
+
+    def _load_usage(self) -> Dict[str, int]:
+        path = os.path.join(self.base_dir, USAGE_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _record_usage(self, db_name: str):
+        # Best effort: concurrent sessions may lose an increment, which only affects pre-warm order
+        usage = self._load_usage()
+        usage[db_name] = usage.get(db_name, 0) + 1
+        path = os.path.join(self.base_dir, USAGE_FILE)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(usage, f)
+        os.replace(tmp_path, path)
+
+    # --- Manifest (per-file and per-chunk content hashes) ---
+
+    def load_manifest(self, db_name: str) -> Dict[str, Any]:
+        """Returns the DB manifest: {"files": {file_name: {"hash": ..., "chunks": [chunk_id, ...]}}}."""
+        path = os.path.join(self.get_db_path(db_name), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {"files": {}}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self, db_name: str, manifest: Dict[str, Any]):
+        path = os.path.join(self.create_db_dir(db_name), MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def plan_ingestion(self, db_name: str, uploaded_files) -> IngestionPlan:
+        """Splits uploads into files that must be (re)processed and files already ingested unchanged."""
+        manifest = self.load_manifest(db_name)
+        plan = IngestionPlan()
+        for file in uploaded_files:
+            digest = file_hash(file)
+            plan.file_hashes[file.name] = digest
+            known = manifest["files"].get(file.name)
+            if known and known["hash"] == digest:
+                plan.unchanged_files.append(file.name)
+            else:
+                plan.files_to_process.append(file)
+        return plan
+
+    def reconcile_chunks(self, db_name: str, chunks: List[Document], manifest: Optional[Dict[str, Any]] = None, file_names: List[str] = ()) -> Tuple[List[Document], List[str]]:
+        """
+        Compares freshly chunked files against the manifest (loaded from disk unless given).
+        `file_names` lists the re-extracted files, so one that now yields no chunks loses all of its stored ones.
+        Returns (chunks whose IDs are not stored yet, IDs of stored chunks those files no longer produce).
+        """
+        manifest = manifest if manifest is not None else self.load_manifest(db_name)
+        new_ids_by_file: Dict[str, set] = {file_name: set() for file_name in file_names}
+        for chunk in chunks:
+            new_ids_by_file.setdefault(chunk.metadata["source"], set()).add(chunk.metadata["chunk_id"])
+
+        stored_ids = set()
+        stale_ids = []
+        for file_name, new_ids in new_ids_by_file.items():
+            old_ids = manifest["files"].get(file_name, {}).get("chunks", [])
+            stored_ids.update(old_ids)
+            stale_ids.extend(i for i in old_ids if i not in new_ids)
+
+        new_chunks = [c for c in chunks if c.metadata["chunk_id"] not in stored_ids]
+        return new_chunks, stale_ids
+
+    def commit_ingestion(self, db_name: str, plan: IngestionPlan, chunks: List[Document], manifest: Optional[Dict[str, Any]] = None, file_names: List[str] = ()):
+        """
+        Records the hashes and chunk IDs of every file that produced chunks. Files in `file_names` that produced
+        none are dropped from the manifest, like their chunks from the indexes. The manifest is re-read under the
+        knowledgebase's writer lock and only these files' entries change, so concurrent writers keep each other's;
+        `manifest`, if given, is updated in place to the result.
+        """
+        chunk_ids_by_file: Dict[str, List[str]] = {file_name: [] for file_name in file_names}
+        for chunk in chunks:
+            chunk_ids_by_file.setdefault(chunk.metadata["source"], []).append(chunk.metadata["chunk_id"])
+        if not any(chunk_ids_by_file.values()) and not set(chunk_ids_by_file) & set(self.load_manifest(db_name)["files"]):
+            return  # Nothing to record (and no directory to create for an empty new knowledgebase)
+
+        with writer_lock(self.create_db_dir(db_name)):
+            current = self.load_manifest(db_name)
+            for file_name, chunk_ids in chunk_ids_by_file.items():
+                if chunk_ids:
+                    current["files"][file_name] = {"hash": plan.file_hashes[file_name], "chunks": chunk_ids}
+                else:
+                    current["files"].pop(file_name, None)
+            self.save_manifest(db_name, current)
+        if manifest is not None:
+            manifest.clear()
+            manifest.update(current)
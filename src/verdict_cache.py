@@ -0,0 +1,102 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.config import AppConfig
+from src.hashing import content_hash
+
+def normalize_question(question: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivial rephrasings share verdicts."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+class VerdictCache:
+    """
+    Disk-backed (SQLite) cache of grader verdicts keyed by
+    (normalized question, chunk content hash, grader version).
+    The grader version covers the prompt templates and model, so changing either starts a fresh keyspace.
+    Size is bounded: past max_entries the least recently used verdicts are evicted.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or AppConfig.GRADER_CACHE_PATH
+        self.max_entries = max_entries or AppConfig.GRADER_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared across threads, serialized by the lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                " key TEXT PRIMARY KEY, verdict TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+
+    @staticmethod
+    def make_key(question: str, chunk_text: str, grader_version: str) -> str:
+        return content_hash(f"{grader_version}\x00{normalize_question(question)}\x00{content_hash(chunk_text)}")
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Returns the cached verdicts for the keys that are present and counts hits/misses."""
+        if not keys:
+            return {}
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):  # Stay below SQLite's bound-parameter limit
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, verdict FROM verdicts WHERE key IN ({placeholders})", batch)
+                found.update(rows.fetchall())
+            if found:
+                with self._conn:
+                    now = time.time()
+                    self._conn.executemany("UPDATE verdicts SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        """Stores (key, verdict) pairs, evicting the least recently used entries beyond max_entries."""
+        now = time.time()
+        rows = [(key, verdict, now) for key, verdict in items]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO verdicts (key, verdict, last_used) VALUES (?, ?, ?)", rows)
+            count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used ASC, rowid ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM verdicts")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_shared_cache: Optional[VerdictCache] = None
+_shared_lock = threading.Lock()
+
+def get_verdict_cache() -> VerdictCache:
+    """Returns the process-wide verdict cache at AppConfig.GRADER_CACHE_PATH."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = VerdictCache()
+    return _shared_cache
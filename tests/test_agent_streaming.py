@@ -0,0 +1,136 @@
+import unittest
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from langchain_core.runnables import RunnableLambda
+from langchain.docstore.document import Document
+from src.config import AppConfig, ModelConfig
+from src.agent_graph import astream_agent, build_graph, stream_agent
+
+ANSWER_TOKENS = ["Apples ", "are ", "baked ", "at ", "180C."]
+
+class FakeStreamingChatHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat endpoint that streams the answer as server-sent events."""
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_json({"data": [{"id": "fake/model", "object": "model"}]})
+
+    def do_POST(self):
+        cls = FakeStreamingChatHandler
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            self._answer()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _answer(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = request["messages"][-1]["content"]
+        if "routing" in prompt:
+            tokens = [json.dumps({"datasource": "vectorstore"})]
+        elif "grader" in prompt:
+            tokens = [json.dumps({"score": "yes"})]
+        else:
+            tokens = ANSWER_TOKENS
+
+        if not request.get("stream"):
+            self._send_json({
+                "id": "fake",
+                "object": "chat.completion",
+                "model": "fake/model",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            chunk = {
+                "id": "fake",
+                "object": "chat.completion.chunk",
+                "model": "fake/model",
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": "stop" if i == len(tokens) - 1 else None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(0.01)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+class TestAgentStreaming(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStreamingChatHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        for p in [
+            patch.object(ModelConfig, "NVIDIA_BASE_URL", f"http://127.0.0.1:{self.server.server_port}/v1"),
+            patch.object(ModelConfig, "LLM_MODEL", "fake/model"),
+            patch.object(AppConfig, "GRADER_CACHE_ENABLED", False),
+        ]:
+            p.start()
+            self.addCleanup(p.stop)
+        self.documents = [Document(page_content="Bake apples at 180C.", metadata={"source": "a.txt", "page": 1})]
+        self.retriever = RunnableLambda(lambda question: self.documents)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_streams_steps_then_answer_tokens(self):
+        app = build_graph(self.retriever)
+        events = list(stream_agent(app, {"question": "What does the document say about baking apples?"}))
+
+        kinds = [kind for kind, _ in events]
+        tokens = [payload for kind, payload in events if kind == "token"]
+        steps = [payload for kind, payload in events if kind == "step"]
+        final_state = events[-1][1]
+
+        self.assertEqual(tokens, ANSWER_TOKENS)
+        self.assertEqual(kinds[-1], "final")
+        self.assertEqual(final_state["generation"], "".join(ANSWER_TOKENS))
+        self.assertEqual(final_state["documents"], self.documents)
+        self.assertEqual(steps, final_state["steps"])
+        # Progress steps arrive before the first token, and generation completes after the last one
+        self.assertLess(kinds.index("step"), kinds.index("token"))
+        self.assertEqual(steps[-1], "Generation complete.")
+
+    def test_async_runs_share_one_event_loop(self):
+        app = build_graph(self.retriever)
+        FakeStreamingChatHandler.max_in_flight = 0
+
+        async def ask(question):
+            return [event async for event in astream_agent(app, {"question": question})]
+
+        async def ask_all():
+            return await asyncio.gather(*(ask(f"What does the document say about baking apples? ({i})") for i in range(6)))
+
+        for events in asyncio.run(ask_all()):
+            tokens = [payload for kind, payload in events if kind == "token"]
+            self.assertEqual(tokens, ANSWER_TOKENS)
+            self.assertEqual(events[-1][1]["generation"], "".join(ANSWER_TOKENS))
+            self.assertEqual(events[-1][1]["steps"][-1], "Generation complete.")
+        # Conversations overlapped on the endpoint instead of running one after another
+        self.assertGreater(FakeStreamingChatHandler.max_in_flight, 1)
+
+if __name__ == '__main__':
+    unittest.main()
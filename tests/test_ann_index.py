@@ -0,0 +1,116 @@
+import unittest
+import tempfile
+from unittest.mock import patch
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain.docstore.document import Document
+from src.ann_index import IndexSpec, build_index, index_type_of, load_index_spec, reconstruct_all, rebuild_store
+from src.snapshots import current_dir
+from src.retrieval_engine import RetrievalEngine
+
+class TestAnnIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        p = patch("src.retrieval_engine.get_embeddings", return_value=DeterministicFakeEmbedding(size=16))
+        p.start()
+        self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_chunks(self, n, prefix="chunk"):
+        return [Document(page_content=f"{prefix} {i}", metadata={"source": "a.txt", "chunk_id": f"{prefix}-{i}"}) for i in range(n)]
+
+    def assert_consistent(self, store):
+        ids = list(store.index_to_docstore_id.values())
+        self.assertEqual(store.index.ntotal, len(ids))
+        self.assertEqual(sorted(store.index_to_docstore_id), list(range(len(ids))))
+        self.assertEqual(set(ids), set(store.docstore._dict))
+
+    def test_hnsw_knowledgebase_persists_and_deletes(self):
+        spec = IndexSpec(index_type="hnsw", hnsw_m=8, ef_search=32)
+        engine = RetrievalEngine()
+        engine.open_store(self.tmp_dir.name, index_spec=spec)
+        engine.add_chunks(self.make_chunks(50))
+        engine.flush(self.tmp_dir.name)
+        self.assertEqual(index_type_of(engine.vector_store.index), "hnsw")
+        self.assertEqual(load_index_spec(current_dir(self.tmp_dir.name)), spec)
+
+        reloaded = RetrievalEngine()
+        reloaded.open_store(self.tmp_dir.name)
+        self.assertEqual(reloaded.index_spec, spec)
+        self.assertEqual(reloaded.vector_store.index.hnsw.efSearch, 32)
+        self.assertEqual(reloaded.vector_store.similarity_search("chunk 7", k=1)[0].page_content, "chunk 7")
+
+        reloaded.remove_chunks(["chunk-7", "chunk-8"])
+        reloaded.flush(self.tmp_dir.name)
+        self.assertEqual(reloaded.vector_store.index.ntotal, 50)
+        docs = reloaded.get_hybrid_retriever().invoke("chunk 7")
+        self.assertNotIn("chunk 7", [d.page_content for d in docs])
+
+        reloaded.compact()
+        reloaded.flush(self.tmp_dir.name)
+        self.assertEqual(index_type_of(reloaded.vector_store.index), "hnsw")
+        self.assertEqual(reloaded.vector_store.index.ntotal, 48)
+        self.assert_consistent(reloaded.vector_store)
+        self.assertEqual(reloaded.vector_store.similarity_search("chunk 9", k=1)[0].page_content, "chunk 9")
+
+    def test_ivfpq_stays_flat_until_it_can_be_trained(self):
+        spec = IndexSpec(index_type="ivfpq", nlist=4, pq_m=4, pq_bits=4, nprobe=4)
+        engine = RetrievalEngine()
+        engine.initialize_vector_store(None, self.tmp_dir.name)
+        engine.open_store(self.tmp_dir.name, index_spec=spec)
+        engine.add_chunks(self.make_chunks(100))
+        engine.flush(self.tmp_dir.name)
+        self.assertEqual(index_type_of(engine.vector_store.index), "flat")
+
+        engine.add_chunks(self.make_chunks(600, prefix="more"))
+        engine.flush(self.tmp_dir.name)
+        self.assertEqual(index_type_of(engine.vector_store.index), "ivfpq")
+        self.assertEqual(engine.vector_store.index.nprobe, 4)
+
+        engine.remove_chunks(["chunk-0", "more-5"])
+        engine.add_chunks(self.make_chunks(3, prefix="late"))
+        engine.compact()
+        engine.flush(self.tmp_dir.name)
+        self.assertEqual(engine.vector_store.index.ntotal, 701)
+        self.assert_consistent(engine.vector_store)
+
+    def test_ivfpq_compaction_keeps_the_stored_codes(self):
+        spec = IndexSpec(index_type="ivfpq", nlist=4, pq_m=4, pq_bits=4, nprobe=4)
+        engine = RetrievalEngine()
+        engine.open_store(self.tmp_dir.name, index_spec=spec)
+        engine.add_chunks(self.make_chunks(700))
+        engine.flush(self.tmp_dir.name)
+        store = engine.vector_store
+        self.assertEqual(index_type_of(store.index), "ivfpq")
+
+        def decoded_by_id():
+            vectors = reconstruct_all(store.index)
+            return {doc_id: vectors[p] for p, doc_id in store.index_to_docstore_id.items()}
+
+        before = decoded_by_id()
+        for doc_id in ("chunk-0", "chunk-1"):  # Two compactions: codes must survive more than one round
+            engine.remove_chunks([doc_id])
+            engine.compact()
+        engine.flush(self.tmp_dir.name)
+        after = decoded_by_id()
+        self.assertEqual(len(after), 698)
+        self.assert_consistent(store)
+        for doc_id, vector in after.items():
+            np.testing.assert_array_equal(vector, before[doc_id])  # Not re-quantized from decoded vectors
+
+        rebuild_store(store, IndexSpec(index_type="flat"))  # Leaving IVF-PQ re-embeds at full precision
+        exact = DeterministicFakeEmbedding(size=16).embed_query("chunk 699")
+        np.testing.assert_allclose(reconstruct_all(store.index)[-1], exact, rtol=1e-6)
+
+    def test_build_index_recall_against_flat(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+        queries = vectors[:50] + 0.01 * rng.standard_normal((50, 32)).astype(np.float32)
+        hnsw = build_index(IndexSpec(index_type="hnsw", hnsw_m=16, ef_search=64), vectors)
+        _, found = hnsw.search(queries, 1)
+        self.assertGreaterEqual(float(np.mean(found[:, 0] == np.arange(50))), 0.95)
+
+if __name__ == '__main__':
+    unittest.main()
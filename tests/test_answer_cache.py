@@ -0,0 +1,121 @@
+import unittest
+import tempfile
+import time
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain.docstore.document import Document
+from src.answer_cache import SemanticAnswerCache, get_answer_cache
+from src.agent_graph import stream_agent
+from src.retrieval_engine import RetrievalEngine
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embeddings = DeterministicFakeEmbedding(size=64)
+        self.state = {
+            "generation": "Bake at 180C.",
+            "documents": [Document(page_content="Bake apples at 180C.", metadata={"source": "a.txt", "page": 1})],
+            "steps": ["Generation complete."],
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_cache(self, **kwargs):
+        return SemanticAnswerCache(self.tmp_dir.name, lambda: self.embeddings, threshold=0.95, **kwargs)
+
+    def test_hit_for_same_question_and_miss_for_other(self):
+        cache = self.make_cache()
+        cache.put("How do I bake apples?", self.state)
+        hit = cache.lookup("How do I bake apples?")
+        self.assertEqual(hit["generation"], "Bake at 180C.")
+        self.assertEqual(hit["documents"][0].metadata["source"], "a.txt")
+        self.assertAlmostEqual(hit["similarity"], 1.0, places=5)
+        self.assertIsNone(cache.lookup("What is the quarterly revenue?"))
+        self.assertEqual(cache.stats(), {"entries": 1, "hits": 1, "misses": 1})
+
+    def test_persists_across_instances(self):
+        self.make_cache().put("How do I bake apples?", self.state)
+        self.assertIsNotNone(self.make_cache().lookup("How do I bake apples?"))
+
+    def test_concurrent_instances_share_answers(self):
+        session_a, session_b = self.make_cache(), self.make_cache()
+        self.assertIsNone(session_b.lookup("How do I bake apples?"))
+        session_a.put("How do I bake apples?", self.state)
+        self.assertIsNotNone(session_b.lookup("How do I bake apples?"))
+        session_b.put("How do I poach pears?", {**self.state, "generation": "Poach in wine."})
+        self.assertIsNotNone(session_a.lookup("How do I poach pears?"))
+
+        fresh = self.make_cache()
+        self.assertEqual(len(fresh), 0)  # Loaded on first use
+        self.assertEqual(fresh.lookup("How do I bake apples?")["generation"], "Bake at 180C.")
+        self.assertEqual(fresh.lookup("How do I poach pears?")["generation"], "Poach in wine.")
+
+    def test_one_shared_cache_per_knowledgebase(self):
+        self.assertIs(get_answer_cache(self.tmp_dir.name), get_answer_cache(self.tmp_dir.name + "/"))
+
+    def test_ttl_and_lru_eviction(self):
+        cache = self.make_cache(ttl_seconds=0.05, max_entries=2)
+        for q in ["q1", "q2", "q3"]:
+            cache.put(q, self.state)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup("q1"))
+        time.sleep(0.1)
+        self.assertIsNone(cache.lookup("q3"))
+        cache.put("q4", self.state)  # Expired rows are swept by writers
+        self.assertEqual(len(cache), 1)
+
+    def test_lookups_do_not_write_but_recency_still_counts(self):
+        cache = self.make_cache(max_entries=2)
+        cache.put("q1", self.state)
+        cache.put("q2", self.state)
+        other = self.make_cache()
+        other.lookup("q1")
+        data_version = other._conn.execute("PRAGMA data_version").fetchone()[0]
+        for _ in range(3):
+            self.assertIsNotNone(cache.lookup("q1"))
+        self.assertEqual(other._conn.execute("PRAGMA data_version").fetchone()[0], data_version)
+
+        cache.put("q3", self.state)  # Writes back q1's hits before evicting the least recently used
+        self.assertIsNotNone(cache.lookup("q1"))
+        self.assertIsNone(cache.lookup("q2"))
+
+    def test_ingestion_invalidates_cache(self):
+        cache = self.make_cache()
+        cache.put("How do I bake apples?", self.state)
+        with patch("src.retrieval_engine.get_embeddings", return_value=self.embeddings):
+            RetrievalEngine().initialize_vector_store([Document(page_content="new text", metadata={"source": "b.txt"})], save_path=self.tmp_dir.name)
+        self.assertIsNone(cache.lookup("How do I bake apples?"))
+        self.assertEqual(len(self.make_cache()), 0)
+
+    def test_stream_agent_serves_cached_answer_without_running_graph(self):
+        cache = self.make_cache()
+        cache.put("How do I bake apples?", self.state)
+        events = list(stream_agent(None, {"question": "How do I bake apples?"}, answer_cache=cache))
+        self.assertEqual(events[1], ("token", "Bake at 180C."))
+        kind, state = events[-1]
+        self.assertEqual(kind, "final")
+        self.assertTrue(state["steps"][0].startswith("Answer served from semantic cache"))
+
+    def test_only_answers_from_documents_are_cached(self):
+        class FakeApp:
+            def __init__(self, updates):
+                self.updates = updates
+
+            def stream(self, inputs, stream_mode):
+                for node, update in self.updates:
+                    yield "updates", {node: update}
+
+        cache = self.make_cache()
+        chat = FakeApp([("route", {"route": "generate_no_rag", "documents": [], "steps": ["Routing to chat."]}),
+                        ("generate_no_rag", {"generation": "Hello!", "steps": ["Routing to chat."]})])
+        list(stream_agent(chat, {"question": "hi there"}, answer_cache=cache))
+        self.assertEqual(len(cache), 0)
+
+        grounded = FakeApp([("route", {"route": "retrieve", "documents": self.state["documents"], "steps": []}),
+                            ("generate", {"generation": "Bake at 180C.", "steps": ["Generation complete."]})])
+        list(stream_agent(grounded, {"question": "How do I bake apples?"}, answer_cache=cache))
+        self.assertEqual(len(cache), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import io
+import json
+import tempfile
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import AppConfig
+from src.api import AgentService, create_app
+from src.compaction import Compactor
+from src.nim_client import NIMRateLimitError
+from src.vector_manager import VectorStoreManager
+
+async def fake_astream_agent(app, inputs, answer_cache=None):
+    """Stands in for the agent: echoes the first retrieved document."""
+    if inputs["question"] == "busy":
+        raise NIMRateLimitError("NIM request failed with HTTP 429 after 5 attempts.", retry_after=7.0)
+    documents = (await app.retriever.ainvoke(inputs["question"]))[:1]
+    yield "step", "Retrieved documents."
+    yield "token", "From "
+    yield "token", documents[0].metadata["source"]
+    yield "final", {"question": inputs["question"], "generation": f"From {documents[0].metadata['source']}", "documents": documents, "steps": ["Retrieved documents."]}
+
+class FakeGraph:
+    def __init__(self, retriever, reranker=None):
+        self.retriever = retriever
+
+class TestHttpApi(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.graphs_built = 0
+
+        def build_graph(retriever, reranker=None):
+            self.graphs_built += 1
+            return FakeGraph(retriever, reranker)
+
+        patches = [
+            patch.object(AppConfig, "VECTOR_DB_DIR", self.tmp_dir.name),
+            patch.object(AppConfig, "EXTRACTION_WORKERS", 1),
+            patch("src.retrieval_engine.get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+            patch("src.vector_manager.get_compactor", return_value=Compactor(threshold=1.0)),
+            patch("src.api.build_graph", side_effect=build_graph),
+            patch("src.api.astream_agent", side_effect=fake_astream_agent),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.client = TestClient(create_app(AgentService(VectorStoreManager())))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def ingest(self, name="kb"):
+        files = [
+            ("files", ("apples.txt", b"Bake apples at 180C for forty minutes.", "text/plain")),
+            ("files", ("pears.txt", b"Poach pears in red wine.", "text/plain")),
+        ]
+        return self.client.post(f"/knowledgebases/{name}/documents", files=files, data={"index_type": "flat"})
+
+    def test_ingest_then_list(self):
+        response = self.ingest()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()["files_processed"]), ["apples.txt", "pears.txt"])
+        self.assertEqual(self.ingest().json()["unchanged_files"], ["apples.txt", "pears.txt"])
+
+        kbs = self.client.get("/knowledgebases").json()["knowledgebases"]
+        self.assertEqual([kb["name"] for kb in kbs], ["kb"])
+        self.assertTrue(kbs[0]["generation"].startswith("gen-"))
+        self.assertEqual(self.client.get("/knowledgebases/kb/sources").json()["sources"], ["apples.txt", "pears.txt"])
+
+    def test_uploads_are_spooled_to_disk(self):
+        seen = []
+        original = AgentService.ingest
+
+        def ingest(service, db_name, files, index_type=None):
+            seen.extend(files)
+            return original(service, db_name, files, index_type)
+
+        with patch.object(AgentService, "ingest", autospec=True, side_effect=ingest):
+            self.assertEqual(self.ingest().status_code, 200)
+        self.assertEqual([(type(f), f.name, f.size) for f in seen], [(io.FileIO, "apples.txt", 38), (io.FileIO, "pears.txt", 24)])
+        self.assertTrue(all(f.closed for f in seen))
+
+    def test_query_shares_the_graph_across_requests(self):
+        self.ingest()
+        for _ in range(3):
+            response = self.client.post("/knowledgebases/kb/query", json={"question": "How long do apples bake?", "use_cache": False})
+            self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body["answer"].startswith("From "))
+        self.assertEqual(body["sources"][0]["source"], body["answer"][len("From "):])
+        self.assertEqual(self.graphs_built, 1)
+
+    def test_streaming_query(self):
+        self.ingest()
+        with self.client.stream("POST", "/knowledgebases/kb/query/stream", json={"question": "apples", "use_cache": False}) as response:
+            self.assertEqual(response.headers["content-type"].split(";")[0], "text/event-stream")
+            events = [block for block in response.read().decode("utf-8").split("\n\n") if block]
+        kinds = [block.split("\n")[0][len("event: "):] for block in events]
+        self.assertEqual(kinds, ["step", "token", "token", "answer"])
+        answer = json.loads(events[-1].split("\n")[1][len("data: "):])
+        self.assertEqual(answer["steps"], ["Retrieved documents."])
+
+    def test_throttled_model_returns_service_unavailable(self):
+        self.ingest()
+        response = self.client.post("/knowledgebases/kb/query", json={"question": "busy", "use_cache": False})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "7")
+
+    def test_unknown_or_invalid_knowledgebase(self):
+        self.assertEqual(self.client.post("/knowledgebases/missing/query", json={"question": "x"}).status_code, 404)
+        self.assertEqual(self.client.get("/knowledgebases/..%2Fetc/sources").status_code, 404)
+        self.assertEqual(self.client.get("/knowledgebases/bad.name/sources").status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
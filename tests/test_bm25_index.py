@@ -0,0 +1,121 @@
+import unittest
+import os
+import math
+import random
+import tempfile
+import numpy as np
+from langchain.docstore.document import Document
+from src.bm25_index import BM25Index, BM25IndexRetriever, tokenize
+
+class TestBM25Index(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "bm25")
+        self.first_batch = [
+            Document(page_content="NVIDIA NIM serves Llama models", metadata={"source": "a.pdf"}),
+            Document(page_content="FAISS performs dense vector search", metadata={"source": "a.pdf"}),
+        ]
+        self.second_batch = [
+            Document(page_content="BM25 ranks documents by keyword overlap", metadata={"source": "b.pdf"}),
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_search_ranks_matching_documents(self):
+        index = BM25Index(self.path)
+        index.add_documents(self.first_batch)
+        results = index.search("dense vector search", k=1)
+        self.assertEqual(results[0].page_content, "FAISS performs dense vector search")
+
+    def test_append_keeps_earlier_batches(self):
+        index = BM25Index(self.path)
+        index.add_documents(self.first_batch)
+        index.add_documents(self.second_batch)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.search("llama", k=1)[0].metadata["source"], "a.pdf")
+        self.assertEqual(index.search("keyword", k=1)[0].metadata["source"], "b.pdf")
+
+    def test_persisted_index_reloads_and_appends(self):
+        index = BM25Index(self.path)
+        index.add_documents(self.first_batch)
+        first_segment = os.path.join(self.path, "segment_00000", "indices.npy")
+        mtime = os.path.getmtime(first_segment)
+
+        reloaded = BM25Index.load(self.path)
+        reloaded.add_documents(self.second_batch)
+        self.assertEqual(os.path.getmtime(first_segment), mtime)
+
+        final = BM25Index.load(self.path)
+        self.assertEqual(len(final), 3)
+        self.assertEqual(final.doc_freq("search"), 1)
+        self.assertIsInstance(final.segments[0].indices, np.memmap)
+        self.assertEqual(final.search("llama", k=1)[0].page_content, "NVIDIA NIM serves Llama models")
+
+    def test_vectorized_scores_match_reference(self):
+        rng = random.Random(7)
+        words = [f"w{i}" for i in range(40)]
+        docs = [Document(page_content=" ".join(rng.choices(words, k=rng.randint(3, 30))), metadata={"id": i}) for i in range(200)]
+        index = BM25Index()
+        index.add_documents(docs[:120])
+        index.add_documents(docs[120:])
+
+        # Plain-Python Okapi BM25 over the whole corpus
+        tokenized = [tokenize(d.page_content) for d in docs]
+        avgdl = sum(len(t) for t in tokenized) / len(docs)
+        query = ["w1", "w5", "w17"]
+        df = {q: sum(q in t for t in tokenized) for q in query}
+        reference = []
+        for i, tokens in enumerate(tokenized):
+            score = 0.0
+            for q in query:
+                tf = tokens.count(q)
+                idf = math.log(1 + (len(docs) - df[q] + 0.5) / (df[q] + 0.5))
+                score += idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * len(tokens) / avgdl))
+            reference.append((score, i))
+        expected = [i for score, i in sorted(reference, key=lambda x: (-x[0], x[1]))[:10]]
+
+        results = [d.metadata["id"] for d in index.search(" ".join(query), k=10)]
+        self.assertEqual(results, expected)
+
+    def test_unicode_terms_and_metadata_round_trip(self):
+        index = BM25Index(self.path)
+        index.add_documents([
+            Document(page_content="Zürich café résumé", metadata={"source": "ü.pdf", "page": 3}),
+            Document(page_content="", metadata={"source": "empty.txt"}),
+        ])
+        result = BM25Index.load(self.path).search("CAFÉ", k=5)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].page_content, "Zürich café résumé")
+        self.assertEqual(result[0].metadata, {"source": "ü.pdf", "page": 3})
+
+    def test_delete_tombstones_persist(self):
+        index = BM25Index(self.path)
+        index.add_documents(self.first_batch, ids=["nim", "faiss"])
+        self.assertEqual(index.delete(["faiss", "unknown"]), 1)
+        self.assertEqual(len(index), 1)
+
+        reloaded = BM25Index.load(self.path)
+        self.assertEqual(len(reloaded), 1)
+        self.assertEqual(reloaded.search("dense vector search"), [])
+
+    def test_live_ids_are_found_through_the_persisted_id_index(self):
+        index = BM25Index(self.path)
+        index.add_documents(self.first_batch, ids=["nim", "faiss"])
+        index.add_documents(self.second_batch, ids=["bm25"])
+        index.delete(["nim"])
+
+        reloaded = BM25Index.load(self.path)
+        self.assertIsInstance(reloaded.segments[0].id_keys, np.memmap)
+        self.assertEqual(reloaded.live_ids_among(["nim", "faiss", "bm25", "unknown"]), {"faiss", "bm25"})
+        self.assertEqual(reloaded.segments[1].positions_of(["bm25"]), [0])
+
+    def test_retriever_wraps_index(self):
+        index = BM25Index()
+        index.add_documents(self.first_batch + self.second_batch)
+        retriever = BM25IndexRetriever(index=index, k=2)
+        results = retriever.invoke("vector keyword")
+        self.assertEqual(len(results), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import io
+import os
+import tempfile
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.compaction import Compactor
+from src.document_processor import DocumentProcessor
+from src.ingestion import IngestionPipeline
+from src.retrieval_engine import RetrievalEngine
+from src.snapshots import GENERATIONS_DIR, StaleGenerationError, current_generation
+from src.vector_manager import VectorStoreManager
+
+class TestCompaction(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patches = [
+            patch.object(AppConfig, "VECTOR_DB_DIR", self.tmp_dir.name),
+            patch("src.retrieval_engine.get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+            patch("src.vector_manager.get_compactor", return_value=Compactor(threshold=1.0)),  # Only explicit compactions
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.manager = VectorStoreManager()
+        self.path = self.manager.get_db_path("kb")
+        files = []
+        for name in ("a", "b", "c", "d", "e"):
+            text = f"{name}lpha report about topic {name}"
+            file = io.BytesIO(text.encode("utf-8"))
+            file.name = f"{name}.txt"
+            file.size = len(text)
+            files.append(file)
+        IngestionPipeline(DocumentProcessor(), RetrievalEngine(), self.manager).run("kb", files)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def open_reader(self):
+        engine = RetrievalEngine()
+        engine.open_readonly(self.path)
+        self.addCleanup(engine.close)
+        return engine
+
+    def test_deleted_source_is_filtered_until_compacted(self):
+        compactor = Compactor(threshold=0.5)
+        with patch("src.vector_manager.get_compactor", return_value=compactor):
+            self.assertEqual(self.manager.delete_sources("kb", ["b.txt"]), 1)
+        self.assertEqual(self.manager.list_sources("kb"), ["a.txt", "c.txt", "d.txt", "e.txt"])
+
+        reader = self.open_reader()
+        self.assertEqual(reader.vector_store.index.ntotal, 5)  # Tombstoned, not yet removed
+        self.assertAlmostEqual(reader.tombstone_ratio(), 0.2)
+        docs = reader.get_hybrid_retriever().invoke("blpha report about topic b")
+        self.assertEqual(len(docs), 4)
+        self.assertNotIn("b.txt", {d.metadata["source"] for d in docs})
+
+        self.assertFalse(compactor.compact(self.path))  # Below the threshold
+        self.assertTrue(compactor.compact(self.path, force=True))
+        compacted = self.open_reader()
+        self.assertEqual(compacted.vector_store.index.ntotal, 4)
+        self.assertEqual(compacted.tombstones, set())
+        self.assertEqual(compacted.bm25_index.n_docs, 4)
+        self.assertEqual(compacted.tombstone_ratio(), 0.0)
+
+    def test_failed_delete_keeps_the_file_listed(self):
+        with patch.object(RetrievalEngine, "flush", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.manager.delete_sources("kb", ["b.txt"])
+        self.assertIn("b.txt", self.manager.list_sources("kb"))
+        self.assertEqual(len(self.open_reader().get_hybrid_retriever().invoke("blpha report about topic b")), 5)
+
+        self.assertEqual(self.manager.delete_sources("kb", ["b.txt"]), 1)  # Retrying completes the delete
+        self.assertNotIn("b.txt", self.manager.list_sources("kb"))
+
+    def test_compaction_is_scheduled_past_the_threshold(self):
+        compactor = Compactor(threshold=0.3)
+        with patch("src.vector_manager.get_compactor", return_value=compactor):
+            self.manager.delete_sources("kb", ["a.txt"])
+            self.assertEqual(compactor.stats()["scheduled"], 0)
+            self.manager.delete_sources("kb", ["b.txt"])
+        compactor._executor.shutdown(wait=True)
+        self.assertEqual(compactor.stats()["completed"], 1)
+        self.assertEqual(self.open_reader().vector_store.index.ntotal, 3)
+
+    def test_compaction_loses_to_a_concurrent_write(self):
+        self.manager.delete_sources("kb", ["a.txt"])
+        compaction = RetrievalEngine()
+        compaction.open_store(self.path)
+        base = compaction.generation
+        compaction.compact()
+
+        self.manager.delete_sources("kb", ["c.txt"])
+        published = current_generation(self.path)
+        with self.assertRaises(StaleGenerationError):
+            compaction.flush(self.path, expected_generation=base)
+        compaction.close()
+        self.assertEqual(current_generation(self.path), published)
+        staging = [n for n in os.listdir(os.path.join(self.path, GENERATIONS_DIR)) if n.startswith("staging-")]
+        self.assertEqual(staging, [])
+
+    def test_removed_chunk_can_be_added_back(self):
+        engine = RetrievalEngine()
+        engine.open_store(self.path)
+        doc = engine._docstore_documents()[0]
+        engine.remove_chunks([doc.metadata["chunk_id"]])
+        engine.flush(self.path)
+        self.assertEqual(engine.add_chunks([Document(page_content=doc.page_content, metadata=doc.metadata)]), 0)
+        engine.flush(self.path)
+        engine.close()
+
+        reader = self.open_reader()
+        self.assertEqual(reader.tombstones, set())
+        self.assertEqual(reader.bm25_index.search(doc.page_content, k=1)[0].page_content, doc.page_content)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from src.compression import ExtractiveCompressor, split_sentences
+from src.embedding_service import EmbeddingService
+
+VOCABULARY = ["coolant", "pressure", "valve", "warranty", "invoice", "paint"]
+
+class KeywordEmbeddings(Embeddings):
+    """Bag-of-words vectors over a tiny vocabulary; records how many texts it embedded per call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _vector(self, text):
+        words = text.lower()
+        return [float(words.count(term)) for term in VOCABULARY] + [0.1]
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32):
+        self.calls.append(len(pairs))
+        return [float(sum(word in passage.lower() for word in query.lower().split())) for query, passage in pairs]
+
+MANUAL = (
+    "The warranty covers two years of use. Check the coolant pressure weekly. "
+    "Paint touch-ups are sold separately.\nThe valve releases coolant pressure above 2 bar. Keep every invoice."
+)
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.documents = [
+            Document(page_content=MANUAL, metadata={"source": "manual.pdf", "page": 3, "score": 4.0}),
+            Document(page_content="Invoices are due in 30 days. Paint orders ship weekly.", metadata={"source": "terms.pdf", "page": 1, "score": 1.0}),
+        ]
+
+    def test_split_sentences(self):
+        self.assertEqual(
+            split_sentences("First sentence is here. Second one!\nA list item\nOk.", min_chars=3),
+            ["First sentence is here.", "Second one!", "A list item", "Ok."],
+        )
+        self.assertEqual(split_sentences("A long enough sentence. Short. Another long one.", min_chars=10),
+                         ["A long enough sentence. Short.", "Another long one."])
+
+    def test_keeps_most_similar_sentences_with_citations(self):
+        embeddings = KeywordEmbeddings()
+        compressor = ExtractiveCompressor("embeddings", top_n=2, embeddings=embeddings)
+        compressed = compressor.compress("What coolant pressure opens the valve?", self.documents)
+
+        self.assertEqual(embeddings.calls, [6])  # One batch for every sentence
+        self.assertEqual(len(compressed), 1)
+        self.assertEqual(
+            compressed[0].page_content,
+            "Check the coolant pressure weekly. The valve releases coolant pressure above 2 bar. Keep every invoice.",
+        )
+        self.assertEqual(compressed[0].metadata, self.documents[0].metadata)
+        self.assertEqual(self.documents[0].page_content, MANUAL)  # Inputs are not modified
+
+    def test_cross_encoder_scoring(self):
+        cross_encoder = FakeCrossEncoder()
+        compressor = ExtractiveCompressor("cross_encoder", top_n=2, reranker=cross_encoder)
+        compressed = compressor.compress("invoices paint orders", self.documents)
+        self.assertEqual(cross_encoder.calls, [6])
+        self.assertEqual([d.metadata["source"] for d in compressed], ["manual.pdf", "terms.pdf"])
+        self.assertEqual(compressed[1].page_content, "Paint orders ship weekly.")
+
+    def test_overlapping_chunks_score_shared_sentences_once(self):
+        overlap = Document(page_content="Check the coolant pressure weekly. Returns need the original box.", metadata={"source": "manual.pdf", "page": 3})
+        embeddings = KeywordEmbeddings()
+        compressor = ExtractiveCompressor("embeddings", top_n=3, embeddings=embeddings)
+        compressor.compress("invoice", [self.documents[0], overlap])
+        self.assertEqual(embeddings.calls, [5])
+
+    def test_sentence_vectors_stay_out_of_the_persistent_cache(self):
+        class FakeModel:
+            def encode(self, texts, batch_size=32, show_progress_bar=False, **kwargs):
+                return np.asarray([KeywordEmbeddings()._vector(t) for t in texts], dtype=np.float32)
+
+        class RecordingCache:
+            writes = 0
+            def get_many(self, model_name, hashes):
+                return {}
+            def put_many(self, model_name, vectors):
+                RecordingCache.writes += len(vectors)
+
+        shared = EmbeddingService("fake/model", workers=1, cache=RecordingCache(), model=FakeModel())
+        with patch("src.compression.get_embeddings", return_value=shared):
+            compressor = ExtractiveCompressor("embeddings", top_n=2)
+            compressor.compress("coolant pressure", self.documents)
+            compressor.compress("valve warranty", self.documents)
+        self.assertEqual(RecordingCache.writes, 0)
+        self.assertEqual(compressor.embeddings.encoded, 6)  # The second question reuses the in-memory vectors
+
+    def test_short_context_is_left_alone(self):
+        compressor = ExtractiveCompressor("embeddings", top_n=50, embeddings=KeywordEmbeddings())
+        self.assertIs(compressor.compress("coolant", self.documents), self.documents)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from langchain.docstore.document import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.context_packing import estimate_tokens, pack_context
+
+TEXT = " ".join(f"Sentence number {i} describes part {i} of the cooling system maintenance procedure." for i in range(40))
+
+def split(text, source="manual.pdf", page=0):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=60)
+    return [Document(page_content=chunk, metadata={"source": source, "page": page}) for chunk in splitter.split_text(text)]
+
+class TestContextPacking(unittest.TestCase):
+    def test_adjacent_chunks_are_merged_without_the_overlap(self):
+        chunks = split(TEXT)
+        self.assertGreater(len(chunks), 3)
+        # Out of order, as retrieval returns them
+        packed = pack_context([chunks[2], chunks[0], chunks[1]], token_budget=10000, chunk_overlap=60)
+        self.assertEqual(len(packed.passages), 1)
+        self.assertEqual(packed.chunks_merged, 2)
+        merged = packed.passages[0].page_content
+        self.assertEqual(merged.count("Sentence number 3 "), 1)
+        self.assertTrue(TEXT.startswith(merged))
+        self.assertTrue(packed.text.startswith("[manual.pdf, page 0]\n"))
+
+    def test_chunks_from_other_pages_are_not_merged(self):
+        first, second = split(TEXT)[:2]
+        second.metadata["page"] = 1
+        packed = pack_context([first, second], token_budget=10000, chunk_overlap=60)
+        self.assertEqual(len(packed.passages), 2)
+        self.assertEqual(packed.chunks_merged, 0)
+
+    def test_duplicates_are_dropped(self):
+        chunk = split(TEXT)[0]
+        contained = Document(page_content=chunk.page_content[:100], metadata=dict(chunk.metadata))
+        packed = pack_context([chunk, Document(page_content=chunk.page_content, metadata=dict(chunk.metadata)), contained], token_budget=10000)
+        self.assertEqual(len(packed.passages), 1)
+        self.assertEqual(packed.duplicates_dropped, 2)
+
+    def test_highest_scores_fill_the_budget(self):
+        docs = [
+            Document(page_content="low " * 100, metadata={"source": "a.txt", "score": -2.0}),
+            Document(page_content="best " * 100, metadata={"source": "b.txt", "score": 5.0}),
+            Document(page_content="short", metadata={"source": "c.txt", "score": -5.0}),
+            Document(page_content="good " * 100, metadata={"source": "d.txt", "score": 1.0}),
+        ]
+        budget = estimate_tokens("[b.txt]\n" + docs[1].page_content.strip()) + 10
+        packed = pack_context(docs, token_budget=budget)
+        self.assertEqual([p.metadata["source"] for p in packed.passages], ["b.txt", "c.txt"])
+        self.assertEqual(packed.passages_dropped, 2)
+        self.assertLessEqual(packed.tokens, budget)
+
+    def test_oversized_best_passage_is_truncated(self):
+        packed = pack_context([Document(page_content="word " * 1000, metadata={"source": "big.txt"})], token_budget=50)
+        self.assertEqual(len(packed.passages), 1)
+        self.assertLessEqual(packed.tokens, 50)
+        self.assertLessEqual(estimate_tokens(packed.text), 50)
+
+if __name__ == '__main__':
+    unittest.main()
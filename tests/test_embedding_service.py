@@ -0,0 +1,80 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from src.embedding_service import EmbeddingCache, EmbeddingService
+
+class FakeModel:
+    """Stands in for a SentenceTransformer: deterministic vectors, records what it encoded."""
+
+    def __init__(self):
+        self.calls = []
+        self.pools_started = 0
+
+    def encode(self, texts, batch_size=32, pool=None, show_progress_bar=None):
+        self.calls.append({"texts": list(texts), "batch_size": batch_size, "pool": pool})
+        return np.array([[len(t), sum(map(ord, t)) % 97, 1.0] for t in texts], dtype=np.float32)
+
+    def start_multi_process_pool(self, target_devices=None):
+        self.pools_started += 1
+        return {"processes": target_devices}
+
+    def stop_multi_process_pool(self, pool):
+        pass
+
+class TestEmbeddingService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "embeddings.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_service(self, model_name="model-a", **kwargs):
+        cache = EmbeddingCache(self.cache_path)
+        self.addCleanup(cache.close)
+        return EmbeddingService(model_name, cache=cache, model=FakeModel(), **kwargs)
+
+    def test_cached_texts_are_not_re_embedded(self):
+        first = self.make_service(workers=1)
+        vectors = first.embed_documents(["alpha", "beta", "alpha"])
+        self.assertEqual(first.model.calls[0]["texts"], ["alpha", "beta"])  # Duplicates encoded once
+        self.assertEqual(vectors[0], vectors[2])
+
+        # A new process (e.g. re-ingestion after a restart) reuses the vectors on disk
+        second = self.make_service(workers=1)
+        again = second.embed_documents(["beta", "gamma", "alpha"])
+        self.assertEqual(second.model.calls[0]["texts"], ["gamma"])
+        self.assertEqual(again[0], vectors[1])
+        self.assertEqual(again[2], vectors[0])
+        self.assertEqual(second.stats()["cache_hits"], 2)
+
+    def test_cache_is_keyed_by_model(self):
+        self.make_service("model-a", workers=1).embed_documents(["alpha"])
+        other = self.make_service("model-b", workers=1)
+        other.embed_documents(["alpha"])
+        self.assertEqual(other.model.calls[0]["texts"], ["alpha"])
+
+    def test_large_batches_use_the_process_pool(self):
+        service = self.make_service(workers=2, batch_size=4)
+        service.embed_documents([f"text {i}" for i in range(3)])
+        self.assertIsNone(service.model.calls[-1]["pool"])  # Too few to hand off
+
+        service.embed_documents([f"more {i}" for i in range(8)])
+        service.embed_documents([f"even more {i}" for i in range(8)])
+        self.assertEqual(service.model.pools_started, 1)
+        self.assertIsNotNone(service.model.calls[-1]["pool"])
+        self.assertEqual(service.model.calls[-1]["batch_size"], 4)
+
+    def test_least_recently_used_vectors_are_evicted(self):
+        cache = EmbeddingCache(self.cache_path, max_entries=2)
+        self.addCleanup(cache.close)
+        vector = np.ones(3, dtype=np.float32)
+        cache.put_many("m", {"a": vector})
+        cache.put_many("m", {"b": vector})
+        cache.get_many("m", ["a"])
+        cache.put_many("m", {"c": vector})
+        self.assertEqual(sorted(cache.get_many("m", ["a", "b", "c"])), ["a", "c"])
+
+if __name__ == '__main__':
+    unittest.main()
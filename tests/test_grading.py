@@ -0,0 +1,130 @@
+import unittest
+import json
+import re
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
+from langchain.docstore.document import Document
+from src.grading import DocumentGrader
+from src.verdict_cache import VerdictCache
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat endpoint that grades documents mentioning 'apple' as relevant."""
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_json({"data": [{"id": "fake/model", "object": "model"}]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = request["messages"][-1]["content"]
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(0.05)
+
+        numbered = re.findall(r"\[(\d+)\] (.*)", prompt)
+        if numbered:
+            content = {"scores": ["yes" if "apple" in text else "no" for _, text in numbered]}
+        else:
+            content = {"score": "yes" if "apple" in prompt.split("Here is the user question")[0] else "no"}
+
+        with server.lock:
+            server.in_flight -= 1
+        self._send_json({
+            "id": "fake",
+            "object": "chat.completion",
+            "model": "fake/model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}, "finish_reason": "stop"}],
+        })
+
+class TestDocumentGrader(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = 0
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.llm = ChatNVIDIA(
+            base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+            model="fake/model",
+            api_key="fake-key",
+        )
+        self.documents = [
+            Document(page_content=f"chunk {i} about {'apple pie' if i % 3 == 0 else 'the weather'}")
+            for i in range(10)
+        ]
+        self.expected = ["yes" if i % 3 == 0 else "no" for i in range(10)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_grading_preserves_order(self):
+        grader = DocumentGrader(self.llm, max_concurrency=4, batch_size=1)
+        verdicts = grader.grade("How do I bake fruit?", self.documents)
+        self.assertEqual(verdicts, self.expected)
+        self.assertEqual(self.server.calls, 10)
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLessEqual(self.server.max_in_flight, 4)
+
+    def test_batched_grading_packs_chunks(self):
+        grader = DocumentGrader(self.llm, max_concurrency=4, batch_size=4)
+        verdicts = grader.grade("How do I bake fruit?", self.documents)
+        self.assertEqual(verdicts, self.expected)
+        self.assertEqual(self.server.calls, 3)
+
+    def test_filter_keeps_relevant_documents(self):
+        grader = DocumentGrader(self.llm, max_concurrency=4)
+        kept = grader.filter("How do I bake fruit?", self.documents)
+        self.assertEqual([d.page_content for d in kept], [d.page_content for d, v in zip(self.documents, self.expected) if v == "yes"])
+
+    def test_verdict_cache_skips_graded_pairs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = VerdictCache(os.path.join(tmp_dir, "verdicts.sqlite"), max_entries=100)
+            grader = DocumentGrader(self.llm, max_concurrency=4, verdict_cache=cache)
+
+            stats = {}
+            self.assertEqual(grader.grade("How do I bake fruit?", self.documents[:6], stats=stats), self.expected[:6])
+            self.assertEqual(stats, {"hits": 0, "misses": 6})
+
+            # Same question modulo case/whitespace/punctuation: only the 4 new chunks hit the LLM
+            calls_before = self.server.calls
+            verdicts = grader.grade("  how do I bake   fruit", self.documents, stats=stats)
+            self.assertEqual(verdicts, self.expected)
+            self.assertEqual(stats, {"hits": 6, "misses": 4})
+            self.assertEqual(self.server.calls - calls_before, 4)
+
+            # Verdicts persist across cache instances; a different grader version does not share them
+            reopened = VerdictCache(cache.path)
+            self.assertEqual(len(reopened.get_many([cache.make_key("How do I bake fruit?", self.documents[0].page_content, grader.version)])), 1)
+            self.assertEqual(reopened.get_many([cache.make_key("How do I bake fruit?", self.documents[0].page_content, "other")]), {})
+            cache.close()
+            reopened.close()
+
+    def test_verdict_cache_is_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = VerdictCache(os.path.join(tmp_dir, "verdicts.sqlite"), max_entries=3)
+            cache.put_many((f"key{i}", "yes") for i in range(5))
+            self.assertEqual(cache.stats()["entries"], 3)
+            self.assertEqual(set(cache.get_many([f"key{i}" for i in range(5)])), {"key2", "key3", "key4"})
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import io
+import tempfile
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import AppConfig
+from src.document_processor import DocumentProcessor
+from src.retrieval_engine import RetrievalEngine
+from src.vector_manager import VectorStoreManager
+
+class TestIncrementalIngestion(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patches = [
+            patch.object(AppConfig, "VECTOR_DB_DIR", self.tmp_dir.name),
+            patch("src.retrieval_engine.get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.manager = VectorStoreManager()
+        self.processor = DocumentProcessor()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_file(self, text, filename):
+        file = io.BytesIO(text.encode("utf-8"))
+        file.name = filename
+        file.size = len(text)
+        return file
+
+    def ingest(self, files):
+        """Mirrors the Creating Knowledgebase page flow."""
+        plan = self.manager.plan_ingestion("kb", files)
+        chunks = self.processor.chunk_documents(self.processor.process_files(plan.files_to_process))
+        new_chunks, stale_ids = self.manager.reconcile_chunks("kb", chunks)
+        engine = RetrievalEngine()
+        engine.initialize_vector_store(new_chunks, save_path=self.manager.create_db_dir("kb"), removed_ids=stale_ids)
+        self.manager.commit_ingestion("kb", plan, chunks)
+        return plan, new_chunks, stale_ids, engine
+
+    def test_unchanged_files_are_skipped(self):
+        self.ingest([self.make_file("alpha report", "a.txt"), self.make_file("beta report", "b.txt")])
+        plan, new_chunks, stale_ids, engine = self.ingest([self.make_file("alpha report", "a.txt"), self.make_file("beta report", "b.txt")])
+        self.assertEqual(sorted(plan.unchanged_files), ["a.txt", "b.txt"])
+        self.assertEqual(plan.files_to_process, [])
+        self.assertEqual(engine.vector_store.index.ntotal, 2)
+
+    def test_changed_file_replaces_its_chunks(self):
+        self.ingest([self.make_file("alpha report", "a.txt"), self.make_file("beta report", "b.txt")])
+        plan, new_chunks, stale_ids, engine = self.ingest([self.make_file("gamma revision", "b.txt")])
+        self.assertEqual(len(new_chunks), 1)
+        self.assertEqual(len(stale_ids), 1)
+
+        # The outdated chunk is tombstoned until the knowledgebase is compacted
+        self.assertEqual(engine.vector_store.index.ntotal, 3)
+        self.assertEqual(engine.tombstones, set(stale_ids))
+        contents = sorted(d.page_content for d in engine._docstore_documents())
+        self.assertEqual(contents, ["alpha report", "gamma revision"])
+        self.assertEqual(engine.bm25_index.search("beta"), [])
+        self.assertEqual(engine.bm25_index.search("gamma")[0].page_content, "gamma revision")
+
+        manifest = self.manager.load_manifest("kb")
+        self.assertEqual(manifest["files"]["b.txt"]["chunks"], [new_chunks[0].metadata["chunk_id"]])
+
+    def test_concurrent_manifest_commits_keep_each_others_files(self):
+        self.ingest([self.make_file("alpha report", "a.txt")])
+        stale_a, stale_b = self.manager.load_manifest("kb"), self.manager.load_manifest("kb")
+        for manifest, file in ((stale_a, self.make_file("beta report", "b.txt")), (stale_b, self.make_file("gamma report", "c.txt"))):
+            plan = self.manager.plan_ingestion("kb", [file])
+            chunks = self.processor.chunk_documents(self.processor.process_files(plan.files_to_process))
+            self.manager.commit_ingestion("kb", plan, chunks, manifest=manifest)
+
+        self.assertEqual(self.manager.list_sources("kb"), ["a.txt", "b.txt", "c.txt"])
+        self.assertEqual(sorted(stale_b["files"]), ["a.txt", "b.txt", "c.txt"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,9 @@ from src.document_processor import DocumentProcessor
 from docx import Document as DocxDocument
 from pptx import Presentation
 import pandas as pd
+import fitz
+from unittest.mock import patch
+from src.config import AppConfig
 
 class TestDocumentProcessor(unittest.TestCase):
     def setUp(self):
@@ -51,6 +54,23 @@ class TestDocumentProcessor(unittest.TestCase):
         buffer.size = buffer.getbuffer().nbytes
         return buffer
 
+    def create_pdf_file(self, pages, filename="test.pdf"):
+        pdf = fitz.open()
+        for text in pages:
+            page = pdf.new_page()
+            page.insert_text((72, 72), text)
+        content = pdf.tobytes()
+        pdf.close()
+        return self.create_mock_file(content, filename)
+
+    def create_upload_batch(self):
+        return [
+            self.create_txt_file("First text", "a.txt"),
+            self.create_pdf_file([f"Page number {i}" for i in range(5)], "big.pdf"),
+            self.create_mock_file(b"binary", "image.png"),
+            self.create_docx_file("Hello Docx", "b.docx"),
+        ]
+
     def test_process_txt(self):
         file = self.create_txt_file("Hello World")
         docs = self.processor.process_files([file])
@@ -82,5 +102,28 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertIn("Hello Excel", docs[0].page_content)
         self.assertEqual(docs[0].metadata['type'], 'excel')
 
+    def test_parallel_extraction_matches_serial(self):
+        with patch.object(AppConfig, "EXTRACTION_WORKERS", 1):
+            serial = DocumentProcessor()
+            serial_docs = serial.process_files(self.create_upload_batch())
+
+        with patch.object(AppConfig, "EXTRACTION_WORKERS", 2), patch.object(AppConfig, "PDF_PAGES_PER_TASK", 2), \
+                patch.object(AppConfig, "EXTRACTION_POOL_MIN_BYTES", 0):
+            parallel = DocumentProcessor()
+            parallel_docs = parallel.process_files(self.create_upload_batch())
+
+        self.assertEqual(len(serial_docs), 7)
+        self.assertEqual([d.page_content for d in parallel_docs], [d.page_content for d in serial_docs])
+        self.assertEqual([d.metadata for d in parallel_docs], [d.metadata for d in serial_docs])
+        self.assertEqual([d.metadata.get("page") for d in parallel_docs if d.metadata["type"] == "pdf"], [1, 2, 3, 4, 5])
+        self.assertEqual(parallel.logger.logs, serial.logger.logs)
+
+    def test_small_uploads_are_extracted_in_process(self):
+        with patch.object(AppConfig, "EXTRACTION_WORKERS", 2), \
+                patch("src.document_processor._get_extraction_pool") as get_pool:
+            docs = DocumentProcessor().process_files(self.create_upload_batch())
+        self.assertEqual(len(docs), 7)
+        get_pool.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import gc
+import os
+import tempfile
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain.docstore.document import Document
+from src.config import AppConfig
+from src.kb_pool import KnowledgebasePool
+from src.vector_manager import VectorStoreManager
+from src.retrieval_engine import RetrievalEngine
+
+class TestKnowledgebasePool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        p = patch("src.retrieval_engine.get_embeddings", return_value=DeterministicFakeEmbedding(size=16))
+        p.start()
+        self.addCleanup(p.stop)
+        self.pool = KnowledgebasePool()
+        self.ingest(["alpha report", "beta report"])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def ingest(self, texts, path=None):
+        chunks = [Document(page_content=t, metadata={"source": f"{t}.txt"}) for t in texts]
+        path = path or self.tmp_dir.name
+        os.makedirs(path, exist_ok=True)
+        RetrievalEngine().initialize_vector_store(chunks, save_path=path)
+        return path
+
+    def test_sessions_share_one_loaded_version(self):
+        first = self.pool.acquire(self.tmp_dir.name)
+        second = self.pool.acquire(self.tmp_dir.name)
+        self.assertIs(first.engine, second.engine)
+        self.assertEqual(list(self.pool.stats().values())[0]["refcount"], 2)
+
+        docs = first.engine.get_hybrid_retriever().invoke("alpha")
+        self.assertEqual(docs[0].page_content, "alpha report")
+
+        first.release()
+        second.release()
+        self.assertEqual(list(self.pool.stats().values())[0]["refcount"], 0)
+
+    def test_new_version_does_not_disturb_readers(self):
+        reader = self.pool.acquire(self.tmp_dir.name)
+        self.ingest(["gamma report"])
+
+        self.assertTrue(reader.is_stale())
+        # The old generation stays fully usable while the lease holds it
+        self.assertEqual(reader.engine.vector_store.index.ntotal, 2)
+        self.assertEqual(len(reader.engine.vector_store.similarity_search("alpha report", k=2)), 2)
+
+        latest = self.pool.acquire(self.tmp_dir.name)
+        self.assertIsNot(latest.engine, reader.engine)
+        self.assertFalse(latest.is_stale())
+        self.assertEqual(latest.engine.vector_store.index.ntotal, 3)
+        self.assertEqual(latest.engine.bm25_index.search("gamma")[0].page_content, "gamma report")
+
+    def test_dropped_lease_is_released(self):
+        lease = self.pool.acquire(self.tmp_dir.name)
+        del lease
+        gc.collect()
+        self.assertEqual(list(self.pool.stats().values())[0]["refcount"], 0)
+
+    def test_lru_eviction_under_memory_budget(self):
+        paths = [self.ingest([f"kb{i} report"], path=os.path.join(self.tmp_dir.name, f"kb{i}")) for i in range(3)]
+        size_mb = self.pool.acquire(paths[0]).knowledgebase.size_bytes / (1024 * 1024)
+        pool = KnowledgebasePool(memory_budget_mb=size_mb * 2.5)
+
+        held = pool.acquire(paths[0])
+        pool.acquire(paths[1]).release()
+        pool.acquire(paths[2]).release()  # Over budget: kb1 is the LRU entry without leases
+        self.assertEqual(list(pool.stats()), [os.path.abspath(paths[0]), os.path.abspath(paths[2])])
+
+        pool.acquire(paths[2]).release()
+        metrics = pool.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"], metrics["evictions"]), (1, 3, 1))
+        self.assertAlmostEqual(metrics["hit_rate"], 0.25)
+        self.assertGreater(metrics["avg_load_seconds"], 0)
+        held.release()
+
+    def test_release_evicts_once_leases_are_dropped(self):
+        paths = [self.ingest([f"kb{i} report"], path=os.path.join(self.tmp_dir.name, f"kb{i}")) for i in range(2)]
+        size_mb = self.pool.acquire(paths[0]).knowledgebase.size_bytes / (1024 * 1024)
+        pool = KnowledgebasePool(memory_budget_mb=size_mb * 1.5)
+
+        first, second = pool.acquire(paths[0]), pool.acquire(paths[1])
+        self.assertEqual(len(pool.stats()), 2)  # Both leased: nothing can be evicted yet
+        first.release()
+        self.assertEqual(list(pool.stats()), [os.path.abspath(paths[1])])
+        self.assertIsNone(first.engine.snapshot)  # Its generation was released
+        second.release()
+
+    def test_prewarm_opens_most_used_knowledgebases(self):
+        with patch.object(AppConfig, "VECTOR_DB_DIR", os.path.join(self.tmp_dir.name, "dbs")), \
+             patch("src.vector_manager.get_knowledgebase_pool", return_value=self.pool):
+            manager = VectorStoreManager()
+            for name in ("rare", "popular"):
+                self.ingest([f"{name} report"], path=manager.get_db_path(name))
+            for name in ("popular", "popular", "rare"):
+                manager.open_knowledgebase(name).release()
+
+            pool = KnowledgebasePool()
+            with patch("src.vector_manager.get_knowledgebase_pool", return_value=pool):
+                manager.prewarm(count=1)
+            self.assertEqual(list(pool.stats()), [os.path.abspath(manager.get_db_path("popular"))])
+
+if __name__ == '__main__':
+    unittest.main()
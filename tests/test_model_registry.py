@@ -0,0 +1,43 @@
+import unittest
+import threading
+import time
+from src.model_registry import ModelRegistry
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ModelRegistry()
+        self.load_count = 0
+
+    def slow_loader(self):
+        self.load_count += 1
+        time.sleep(0.05)
+        return object()
+
+    def test_loads_lazily_once_across_threads(self):
+        self.registry.register("model", self.slow_loader)
+        self.assertFalse(self.registry.is_loaded("model"))
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get("model"))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.load_count, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertTrue(self.registry.is_loaded("model"))
+
+    def test_reports_load_stats(self):
+        self.registry.register("model", self.slow_loader)
+        self.registry.get("model")
+        stats = self.registry.get_stats()["model"]
+        self.assertGreaterEqual(stats["load_seconds"], 0.05)
+        self.assertGreaterEqual(stats["rss_mb"], 0)
+
+    def test_unknown_model_raises(self):
+        with self.assertRaises(KeyError):
+            self.registry.get("missing")
+
+if __name__ == '__main__':
+    unittest.main()
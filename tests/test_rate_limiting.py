@@ -0,0 +1,168 @@
+import unittest
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from src.config import AppConfig
+from src.nim_client import NIMClient, NIMError, NIMRateLimitError
+from src.rate_limiting import AdaptiveConcurrencyLimiter, TokenBucket, backoff_delay
+
+class FlakyChatHandler(BaseHTTPRequestHandler):
+    """Chat endpoint that answers the first `server.failures` requests with `server.status` (plus Retry-After)."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            failing = server.calls <= server.failures
+        time.sleep(server.delay)
+        if failing and server.status == 200:
+            body = b'{"choices": [{"index": 0, "mess'  # Truncated body
+            self.send_response(200)
+        elif failing:
+            body = b'{"error": "busy"}'
+            self.send_response(server.status)
+            self.send_header("Retry-After", "0")
+        else:
+            body = json.dumps({
+                "model": "fake/model",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": request["messages"][-1]["content"].upper()}}],
+            }).encode("utf-8")
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class TestRateLimiting(unittest.TestCase):
+    def test_token_bucket_spreads_requests_after_a_burst(self):
+        bucket = TokenBucket(rate=10.0, burst=2)
+        delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays[:2], [0.0, 0.0])
+        self.assertAlmostEqual(delays[2], 0.1, delta=0.02)
+        self.assertAlmostEqual(delays[3], 0.2, delta=0.02)
+        self.assertEqual(TokenBucket(rate=0, burst=1).reserve(), 0.0)
+
+    def test_concurrency_limit_adapts_to_throttling_and_latency(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=1, maximum=10, latency_tolerance=3.0)
+        limiter.acquire()
+        limiter.release(latency=0.1)
+        self.assertAlmostEqual(limiter.limit, 8.125)
+        limiter.acquire()
+        limiter.release(latency=1.0)  # 10x the best latency seen
+        self.assertAlmostEqual(limiter.limit, 8.125 * 0.9)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        self.assertAlmostEqual(limiter.limit, 8.125 * 0.9 / 2)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_waiters_get_slots_in_arrival_order(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+        limiter.acquire()
+        order = []
+
+        def worker(n):
+            limiter.acquire()
+            order.append(n)
+            limiter.release()
+
+        threads = []
+        for n in range(3):
+            thread = threading.Thread(target=worker, args=(n,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)  # Queue them in a known order
+        limiter.release()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(order, [0, 1, 2])
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_backoff_grows_and_honours_retry_after(self):
+        for attempt in range(6):
+            self.assertLessEqual(backoff_delay(attempt, base=0.5, cap=4.0), min(4.0, 0.5 * 2 ** attempt))
+        self.assertGreaterEqual(backoff_delay(0, base=0.5, cap=4.0, retry_after=3.0), 3.0)
+
+class TestNIMClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyChatHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = 0
+        self.server.failures = 0
+        self.server.status = 429
+        self.server.delay = 0.0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+
+        backoff = patch.object(AppConfig, "NIM_BACKOFF_BASE_SECONDS", 0.01)
+        backoff.start()
+        self.addCleanup(backoff.stop)
+        self.client = NIMClient(rate_limiter=TokenBucket(rate=0, burst=1), concurrency=AdaptiveConcurrencyLimiter(initial=8), max_retries=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def payload(self, text="hello"):
+        return {"model": "fake/model", "messages": [{"role": "user", "content": text}], "stream": False}
+
+    def test_throttled_requests_are_retried(self):
+        self.server.failures = 2
+        data = self.client.chat(self.url, self.payload(), {})
+        self.assertEqual(data["choices"][0]["message"]["content"], "HELLO")
+        self.assertEqual(self.server.calls, 3)
+        stats = self.client.stats()
+        self.assertEqual((stats["retries"], stats["throttled"], stats["failed"]), (2, 2, 0))
+        self.assertLess(stats["concurrency_limit"], 8)
+
+    def test_persistent_throttling_raises_rate_limit_error(self):
+        self.server.failures = 10
+        with self.assertRaises(NIMRateLimitError) as caught:
+            self.client.chat(self.url, self.payload(), {})
+        self.assertEqual(caught.exception.retry_after, 0.0)
+        self.assertEqual(self.server.calls, 3)
+        self.assertEqual(self.client.concurrency.in_flight, 0)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.failures, self.server.status = 10, 400
+        with self.assertRaises(NIMError) as caught:
+            self.client.chat(self.url, self.payload(), {})
+        self.assertNotIsInstance(caught.exception, NIMRateLimitError)
+        self.assertEqual(self.server.calls, 1)
+
+    def test_invalid_json_is_retried(self):
+        self.server.failures, self.server.status = 1, 200
+        data = self.client.chat(self.url, self.payload(), {})
+        self.assertEqual(data["choices"][0]["message"]["content"], "HELLO")
+        self.assertEqual(self.server.calls, 2)
+
+        self.server.calls, self.server.failures = 0, 10
+        with self.assertRaises(NIMError):
+            asyncio.run(self.client.achat(self.url, self.payload("other"), {}))
+        self.assertEqual(self.server.calls, 3)
+        self.assertEqual(self.client.stats()["failed"], 1)
+
+    def test_identical_concurrent_requests_are_coalesced(self):
+        self.server.delay = 0.2
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(self.client.chat, self.url, self.payload(), {}) for _ in range(4)]
+            futures.append(pool.submit(self.client.chat, self.url, self.payload("other"), {}))
+            results = [f.result() for f in futures]
+        self.assertEqual([r["choices"][0]["message"]["content"] for r in results], ["HELLO"] * 4 + ["OTHER"])
+        self.assertEqual(self.server.calls, 2)
+        self.assertEqual(self.client.stats()["coalesced"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch
+from langchain.docstore.document import Document
+from src import retrieval_engine
+from src.retrieval_engine import RetrievalEngine
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words appear in the passage."""
+
+    def __init__(self):
+        self.scored_pairs = 0
+
+    def predict(self, pairs, batch_size=32):
+        self.scored_pairs += len(pairs)
+        return [float(sum(word in passage for word in query.split())) for query, passage in pairs]
+
+class TestRerankDocuments(unittest.TestCase):
+    def setUp(self):
+        retrieval_engine._rerank_score_cache.clear()
+        self.cross_encoder = FakeCrossEncoder()
+        patcher = patch("src.retrieval_engine.get_reranker", return_value=self.cross_encoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = RetrievalEngine()
+        self.documents = [
+            Document(page_content="gpu memory", metadata={"source": "a.pdf", "page": 1}),
+            Document(page_content="gpu inference memory latency", metadata={"source": "a.pdf", "page": 2}),
+            Document(page_content="weather report", metadata={"source": "b.pdf", "page": 1}),
+        ]
+
+    def test_sorts_and_cuts_to_top_k(self):
+        reranked = self.engine.rerank_documents("gpu memory latency", self.documents, top_k=2)
+        self.assertEqual([d.metadata["page"] for d in reranked], [2, 1])
+        self.assertEqual(reranked[0].metadata["score"], 3.0)
+        self.assertNotIn("score", self.documents[0].metadata)
+
+    def test_score_threshold(self):
+        reranked = self.engine.rerank_documents("gpu memory latency", self.documents, top_k=10, score_threshold=1.0)
+        self.assertEqual(len(reranked), 2)
+
+    def test_scores_are_cached_per_query_and_chunk(self):
+        self.engine.rerank_documents("gpu memory", self.documents)
+        self.assertEqual(self.cross_encoder.scored_pairs, 3)
+        self.engine.rerank_documents("gpu memory", self.documents[:2])
+        self.assertEqual(self.cross_encoder.scored_pairs, 3)
+        self.engine.rerank_documents("weather", self.documents)
+        self.assertEqual(self.cross_encoder.scored_pairs, 6)
+
+if __name__ == '__main__':
+    unittest.main()
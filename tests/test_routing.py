@@ -0,0 +1,79 @@
+import unittest
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from src.nim_client import NIMRateLimitError
+from src.routing import QueryRouter, PROTOTYPES
+
+class AxisEmbeddings(Embeddings):
+    """Embeds document-style prototypes on one axis and chit-chat prototypes on the other."""
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        if text in PROTOTYPES["vectorstore"]:
+            return [1.0, 0.0]
+        if text in PROTOTYPES["chat"]:
+            return [0.0, 1.0]
+        return self.queries[text]
+
+class TestQueryRouter(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = AxisEmbeddings({
+            "How do vaccines trigger immunity?": [0.9, 0.1],
+            "Is it going well?": [0.1, 0.9],
+            "Tell me about it": [0.5, 0.5],
+        })
+        self.llm_calls = []
+
+        def fake_llm(prompt):
+            self.llm_calls.append(prompt)
+            return AIMessage(content='{"datasource": "chat"}')
+
+        self.router = QueryRouter(lambda: self.embeddings, llm=RunnableLambda(fake_llm), margin=0.2)
+
+    def test_rules_route_without_embeddings(self):
+        self.assertEqual(self.router.route("Hello!").datasource, "chat")
+        self.assertEqual(self.router.route("thanks a lot").method, "rules")
+        decision = self.router.route("Summarize the uploaded report")
+        self.assertEqual((decision.datasource, decision.method), ("vectorstore", "rules"))
+
+    def test_document_request_wins_over_greeting_prefix(self):
+        for question in ("Hi, summarize report", "thanks explain section", "ok list requirements", "cool pdf"):
+            decision = self.router.route(question)
+            self.assertEqual((decision.datasource, decision.method), ("vectorstore", "rules"), question)
+
+    def test_embedding_similarity_decides_clear_cases(self):
+        decision = self.router.route("How do vaccines trigger immunity?")
+        self.assertEqual((decision.datasource, decision.method), ("vectorstore", "embedding"))
+        self.assertGreater(decision.margin, 0)
+        self.assertEqual(self.router.route("Is it going well?").datasource, "chat")
+        self.assertEqual(self.llm_calls, [])
+
+    def test_ambiguous_questions_escalate_to_llm(self):
+        decision = self.router.route("Tell me about it")
+        self.assertEqual((decision.datasource, decision.method), ("chat", "llm"))
+        self.assertEqual(len(self.llm_calls), 1)
+        self.assertGreaterEqual(decision.latency_ms, 0)
+
+    def test_embedding_failure_falls_back_to_vectorstore(self):
+        router = QueryRouter(lambda: self.embeddings, llm=None, margin=0.2)
+        self.assertEqual(router.route("Something nobody has embedded").datasource, "vectorstore")
+
+    def test_unparseable_llm_answer_falls_back_but_request_errors_propagate(self):
+        router = QueryRouter(lambda: self.embeddings, llm=RunnableLambda(lambda _: AIMessage(content="not json")), margin=0.2)
+        self.assertEqual(router.route("Tell me about it").datasource, "vectorstore")
+
+        def throttled(_):
+            raise NIMRateLimitError("NIM request failed with HTTP 429 after 5 attempts.", retry_after=2.0)
+
+        router = QueryRouter(lambda: self.embeddings, llm=RunnableLambda(throttled), margin=0.2)
+        with self.assertRaises(NIMRateLimitError):
+            router.route("Tell me about it")
+
+if __name__ == '__main__':
+    unittest.main()
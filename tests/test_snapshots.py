@@ -0,0 +1,119 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain.docstore.document import Document
+from src.retrieval_engine import RetrievalEngine
+from src.snapshots import (
+    GENERATIONS_DIR, current_generation, current_dir, hold_current, collect_garbage,
+)
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = self.tmp_dir.name
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        p = patch("src.retrieval_engine.get_embeddings", return_value=self.embeddings)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def ingest(self, texts):
+        chunks = [Document(page_content=t, metadata={"source": f"{t}.txt"}) for t in texts]
+        engine = RetrievalEngine()
+        engine.initialize_vector_store(chunks, save_path=self.path)
+        engine.close()
+
+    def generations(self):
+        return sorted(n for n in os.listdir(os.path.join(self.path, GENERATIONS_DIR)) if n.startswith("gen-"))
+
+    def test_each_flush_publishes_a_new_generation(self):
+        self.ingest(["alpha report"])
+        self.assertEqual(current_generation(self.path), "gen-000001")
+        self.ingest(["beta report"])
+        self.assertEqual(current_generation(self.path), "gen-000002")
+        self.ingest([])  # No changes: nothing is published
+        self.assertEqual(current_generation(self.path), "gen-000002")
+        self.assertEqual(self.generations(), ["gen-000002"])
+
+        reader = RetrievalEngine()
+        reader.open_readonly(self.path)
+        self.assertEqual(reader.vector_store.index.ntotal, 2)
+        self.assertEqual(len(reader.bm25_index), 2)
+        reader.close()
+
+    def test_held_generation_survives_until_released(self):
+        self.ingest(["alpha report", "beta report"])
+        reader = RetrievalEngine()
+        reader.open_readonly(self.path)
+        self.assertEqual(reader.generation, "gen-000001")
+
+        self.ingest(["gamma report"])
+        self.assertEqual(current_generation(self.path), "gen-000002")
+        self.assertEqual(self.generations(), ["gen-000001", "gen-000002"])
+        # The reader still sees its whole, unchanged generation
+        self.assertEqual(reader.vector_store.index.ntotal, 2)
+        self.assertEqual(reader.bm25_index.search("gamma"), [])
+        self.assertEqual(reader.bm25_index.search("alpha")[0].page_content, "alpha report")
+
+        reader.close()
+        self.assertEqual(collect_garbage(self.path), ["gen-000001"])
+        self.assertEqual(self.generations(), ["gen-000002"])
+
+        latest = RetrievalEngine()
+        latest.open_readonly(self.path)
+        self.assertEqual(latest.bm25_index.search("gamma")[0].page_content, "gamma report")
+        latest.close()
+
+    def test_interleaved_writers_keep_both_changes(self):
+        self.ingest(["alpha base"])
+        writer_a, writer_b = RetrievalEngine(), RetrievalEngine()
+        writer_a.open_store(self.path)
+        writer_b.open_store(self.path)
+        writer_a.add_chunks([Document(page_content="gamma writer A", metadata={"source": "a.txt"})])
+        writer_a.flush(self.path)
+        writer_b.add_chunks([Document(page_content="delta writer B", metadata={"source": "b.txt"})])
+        writer_b.flush(self.path)  # Based on gen-000001: replayed onto writer A's generation
+        writer_a.close()
+        writer_b.close()
+
+        self.assertEqual(current_generation(self.path), "gen-000003")
+        reader = RetrievalEngine()
+        reader.open_readonly(self.path)
+        expected = ["alpha base", "delta writer B", "gamma writer A"]
+        self.assertEqual(sorted(reader.vector_store.docstore._dict[i].page_content for i in reader.vector_store.index_to_docstore_id.values()), expected)
+        self.assertEqual(len(reader.bm25_index), 3)
+        self.assertEqual(reader.bm25_index.n_docs, 3)
+        self.assertEqual(reader.bm25_index.search("gamma")[0].page_content, "gamma writer A")
+        reader.close()
+
+    def test_bm25_segments_are_shared_between_generations(self):
+        self.ingest(["alpha report"])
+        first = os.path.join(current_dir(self.path), "bm25")
+        hold = hold_current(self.path)
+        self.ingest(["beta report"])
+        second = os.path.join(current_dir(self.path), "bm25")
+
+        segment = sorted(d for d in os.listdir(first) if d.startswith("segment_"))[0]
+        a = os.stat(os.path.join(first, segment, "ids.bin"))
+        b = os.stat(os.path.join(second, segment, "ids.bin"))
+        self.assertEqual((a.st_dev, a.st_ino), (b.st_dev, b.st_ino))
+        hold.release()
+
+    def test_legacy_layout_is_migrated(self):
+        chunks = [Document(page_content=t, metadata={"source": "a.txt"}) for t in ("alpha report", "beta report")]
+        FAISS.from_documents(chunks, self.embeddings).save_local(self.path)
+
+        reader = RetrievalEngine()
+        reader.open_readonly(self.path)
+        self.assertEqual(reader.generation, "gen-000001")
+        self.assertEqual(reader.bm25_index.search("beta")[0].page_content, "beta report")
+        self.assertEqual(sorted(os.listdir(self.path)), ["CURRENT", GENERATIONS_DIR, "kb_version"])
+        reader.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import asyncio
+import time
+import warnings
+from langchain_core.runnables import RunnableLambda
+from langchain.docstore.document import Document
+from unittest.mock import patch
+from src.config import AppConfig
+from src.agent_graph import AgentNodes
+from src.routing import RouteDecision
+
+class SlowRouter:
+    def __init__(self, datasource, delay):
+        self.datasource = datasource
+        self.delay = delay
+
+    def route(self, question):
+        time.sleep(self.delay)
+        return RouteDecision(self.datasource, "llm", self.delay * 1000)
+
+class FailingRouter:
+    async def aroute(self, question):
+        raise RuntimeError("router unavailable")
+
+class TestSpeculativeRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.documents = [Document(page_content=f"chunk {i}") for i in range(4)]
+        self.retrieved = []
+
+        def slow_retrieve(question):
+            time.sleep(0.2)
+            self.retrieved.append(question)
+            return self.documents
+
+        with warnings.catch_warnings(), patch.object(AppConfig, "GRADER_CACHE_ENABLED", False):
+            warnings.simplefilter("ignore")
+            self.nodes = AgentNodes(RunnableLambda(slow_retrieve), reranker=lambda q, docs: docs[:2])
+
+    def test_retrieval_overlaps_routing(self):
+        self.nodes.router = SlowRouter("vectorstore", delay=0.2)
+        start = time.perf_counter()
+        update = self.nodes.route_and_retrieve({"question": "What is in chunk 1?"})
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.35)  # Sequential routing + retrieval would take at least 0.4s
+        self.assertEqual(update["route"], "retrieve")
+        self.assertEqual(update["documents"], self.documents[:2])
+        self.assertIn("Reranking complete. Kept top 2/4 documents.", update["steps"])
+
+    def test_chat_route_discards_retrieval(self):
+        self.nodes.router = SlowRouter("chat", delay=0.0)
+        start = time.perf_counter()
+        update = self.nodes.route_and_retrieve({"question": "hi"})
+
+        self.assertLess(time.perf_counter() - start, 0.15)  # Does not wait for the retrieval
+        self.assertEqual(update["route"], "generate_no_rag")
+        self.assertEqual(update["documents"], [])
+        self.assertEqual(update["steps"][-1], "Speculative retrieval discarded.")
+
+    def test_router_failure_cancels_retrieval(self):
+        self.nodes.router = FailingRouter()
+
+        async def route():
+            with self.assertRaises(RuntimeError):
+                await self.nodes.aroute_and_retrieve({"question": "What is in chunk 1?"})
+            await asyncio.sleep(0.01)
+            return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+        self.assertEqual(asyncio.run(route()), [])  # Nothing left pending on the loop
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import io
+import os
+import tempfile
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import AppConfig
+from src.document_processor import DocumentProcessor
+from src.retrieval_engine import RetrievalEngine
+from src.vector_manager import VectorStoreManager
+from src.ingestion import IngestionPipeline, CHECKPOINT_FILE
+
+class TestStreamingIngestion(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        patches = [
+            patch.object(AppConfig, "VECTOR_DB_DIR", self.tmp_dir.name),
+            patch.object(AppConfig, "EXTRACTION_WORKERS", 1),
+            patch.object(AppConfig, "EMBED_BATCH_SIZE", 2),
+            patch.object(AppConfig, "INGEST_CHECKPOINT_CHUNKS", 1),
+            patch("src.retrieval_engine.get_embeddings", return_value=self.embeddings),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.manager = VectorStoreManager()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_file(self, text, filename):
+        file = io.BytesIO(text.encode("utf-8"))
+        file.name = filename
+        file.size = len(text)
+        return file
+
+    def make_files(self):
+        return [self.make_file(f"{word} report", f"{word}.txt") for word in ("alpha", "beta", "gamma")]
+
+    def pipeline(self, engine=None):
+        return IngestionPipeline(DocumentProcessor(), engine or RetrievalEngine(), self.manager)
+
+    def test_streams_all_files_into_the_index(self):
+        engine = RetrievalEngine()
+        updates = []
+        result = self.pipeline(engine).run("kb", self.make_files(), progress_callback=lambda f, m: updates.append(f))
+
+        self.assertEqual(result.files_processed, ["alpha.txt", "beta.txt", "gamma.txt"])
+        self.assertEqual(result.chunks_added, 3)
+        self.assertFalse(result.resumed)
+        self.assertEqual(engine.vector_store.index.ntotal, 3)
+        self.assertEqual(len(engine.bm25_index), 3)
+        self.assertEqual(updates[-1], 1.0)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "kb", CHECKPOINT_FILE)))
+
+    def test_resumes_after_crash_without_duplicates(self):
+        original_add = RetrievalEngine.add_chunks
+
+        def crash_on_gamma(engine, chunks):
+            if any("gamma" in c.page_content for c in chunks):
+                raise RuntimeError("simulated crash")
+            return original_add(engine, chunks)
+
+        with patch.object(RetrievalEngine, "add_chunks", crash_on_gamma):
+            with self.assertRaises(RuntimeError):
+                self.pipeline().run("kb", self.make_files())
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, "kb", CHECKPOINT_FILE)))
+
+        engine = RetrievalEngine()
+        embedded = []
+        original_embed = DeterministicFakeEmbedding.embed_documents
+
+        def record_embed(embeddings, texts):
+            embedded.extend(texts)
+            return original_embed(embeddings, texts)
+
+        with patch.object(DeterministicFakeEmbedding, "embed_documents", record_embed):
+            result = self.pipeline(engine).run("kb", self.make_files())
+
+        self.assertTrue(result.resumed)
+        self.assertEqual(sorted(result.unchanged_files), ["alpha.txt", "beta.txt"])
+        self.assertEqual(result.files_processed, ["gamma.txt"])
+        self.assertEqual(embedded, ["gamma report"])
+        self.assertEqual(engine.vector_store.index.ntotal, 3)
+        self.assertEqual(len(engine.bm25_index), 3)
+
+    def test_no_extractable_text_leaves_no_knowledgebase(self):
+        result = self.pipeline().run("kb", [self.make_file("", "empty.txt")])
+        self.assertEqual(result.chunks_total, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "kb")))
+
+    def test_file_emptied_by_an_update_loses_its_chunks(self):
+        engine = RetrievalEngine()
+        self.pipeline(engine).run("kb", self.make_files())
+        result = self.pipeline(engine).run("kb", [self.make_file("", "beta.txt")])
+
+        self.assertEqual((result.chunks_total, result.chunks_removed), (0, 1))
+        self.assertEqual(self.manager.list_sources("kb"), ["alpha.txt", "gamma.txt"])
+        engine.open_store(self.manager.get_db_path("kb"))
+        self.assertEqual(engine.bm25_index.search("beta"), [])
+        self.assertEqual(sorted(d.page_content for d in engine._docstore_documents()), ["alpha report", "gamma report"])
+
+if __name__ == '__main__':
+    unittest.main()